@@ -1,30 +1,108 @@
 """FastAPI app for the fitness demo backend."""
-from fastapi import FastAPI, Request, HTTPException, Body, Query, UploadFile, File
+from fastapi import FastAPI, Request, Response, HTTPException, Body, Query
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, PlainTextResponse, StreamingResponse
 from pydantic import ValidationError
+from starlette.formparsers import MultiPartException, MultiPartParser
+from contextlib import aclosing, asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional, Tuple
 import asyncio
+import base64
 import json
-from openai import AsyncAzureOpenAI
+import logging
+import math
+import os
+import sys
+import tempfile
+import urllib.parse
 from datetime import datetime, timezone
 import httpx
-import sys
-import os
-# Ensure the path to 'secret.py' is added only once and before import
-secret_path = os.path.abspath(r'C:/Users/ahmtt/Documents/VS/API KEY')
-if secret_path not in sys.path:
-    sys.path.insert(0, secret_path)
-import openai
-from secret import AZURE_OPENAI_ENDPOINT, AZURE_OPENAI_API_KEY, AZURE_OPENAI_DEPLOYMENT # type: ignore
+import time
 
 import models, store, recovery, secret_loader
-from models import ChatMsg, WorkoutLog, RecoveryScore
-from store import store
-from secret_loader import load_secrets
-from recovery import calc_recovery, recommend_trainable, COMMON_MUSCLES
+from models import ChatMsg, WorkoutLog, RecoveryScore, RecoveryBatch, RecoveryBatchRequest
+from store import AsyncStore, store
+from clients import clients
+from scheduler import UpstreamUnavailable, Lease, scheduler
+from cache import ResponseCache, TTLCache, cache_key, normalize_prompt
+from ingest import ParseError, VALIDATE_CHUNK, iter_json_array, iter_ndjson, validate_chunk
+from streaming import HEARTBEAT_SECONDS, SSE_HEARTBEAT, coalesce, pipelined, split_sentences, sse_event
+from audio import UploadTooLarge, can_downmix, downmix_wav, limit_stream
+from audio_cache import AudioCacheWriter, DiskAudioCache, audio_key, default_cache_dir
+from secret_loader import load_secrets, provider as secret_provider
+from ratelimit import source_endpoint
+from recovery_batch import batch_recovery
+from metrics import (
+    REGISTRY, STREAM_TOKEN_RATE, STREAM_TOKENS, UPSTREAM_TTFB, VOICE_FIRST_AUDIO, Collected, InstrumentedStore,
+    MetricsMiddleware, log_event, record_upstream, start_logging, stop_logging, upstream_timer,
+)
+from recovery import (
+    calc_recovery_from_summary, calc_recovery_decay, recommend_trainable,
+    DEFAULT_RECOVERY_MODEL, RECOVERY_MODELS, MuscleSummary, epoch_micros, next_change_us,
+)
 import io
 
-app = FastAPI()
+SYSTEM_PROMPT = "You are Vitalis, a highly knowledgeable, friendly, and supportive personal AI health companion. Your mission is to help users reach, understand, and maintain their fitness goals through education, motivation, and practical advice. Always keep answers extremely concise (1-2 sentences), but make them packed with value, encouragement, and actionable tips. You specialize in fitness, nutrition, recovery, motivation, and healthy habits. When responding, always:\n- Greet the user warmly and positively.\n- Give advice that is clear, practical, and easy to follow.\n- Motivate and encourage the user to keep going, even if they face setbacks.\n- Educate the user about the science and benefits behind your advice.\n- Use simple, friendly language and avoid jargon.\n- Be empathetic, supportive, and never judgmental.\n- If the user asks about goals, progress, or struggles, offer specific encouragement and a quick tip.\n- If the user asks about workouts, nutrition, or recovery, give a short, science-backed suggestion.\n- Never give medical advice, but always encourage healthy habits and consulting professionals for serious issues.\n- End every reply with a positive, motivational note.\nYou are always super friendly, energetic, and focused on helping the user succeed in their health journey."
+CHAT_MAX_TOKENS = 128
+CHAT_TEMPERATURE = 0.7
+CHAT_CACHE_SIZE = int(os.environ.get("VITALIS_CHAT_CACHE_SIZE", "1024"))
+CHAT_CACHE_TTL = float(os.environ.get("VITALIS_CHAT_CACHE_TTL", "3600"))
+
+# Upper bound on how long clients may reuse a /recovery response without revalidating
+RECOVERY_MAX_AGE = int(os.environ.get("VITALIS_RECOVERY_MAX_AGE", "60"))
+RECOVERY_CACHE_SIZE = int(os.environ.get("VITALIS_RECOVERY_CACHE_SIZE", "10000"))
+RECOVERY_BATCH_MAX = int(os.environ.get("VITALIS_RECOVERY_BATCH_MAX", "100000"))
+INGEST_MAX_RECORDS = int(os.environ.get("VITALIS_INGEST_MAX_RECORDS", "500000"))
+INGEST_MAX_REPORTED_ERRORS = 1000
+STT_MAX_MB = int(os.environ.get("VITALIS_STT_MAX_MB", "25"))
+STT_MAX_BYTES = STT_MAX_MB * 2**20
+TTS_MODEL = "gpt-4o-mini-tts"
+TTS_VOICE = "alloy"
+TTS_CACHE_DIR = os.environ.get("VITALIS_TTS_CACHE_DIR") or default_cache_dir()
+TTS_CACHE_MB = int(os.environ.get("VITALIS_TTS_CACHE_MB", "256"))
+# Sentences synthesized at once by /voice-turn (the one being played plus lookahead)
+VOICE_TTS_PARALLEL = int(os.environ.get("VITALIS_VOICE_TTS_PARALLEL", "2"))
+
+chat_cache = ResponseCache(CHAT_CACHE_SIZE, CHAT_CACHE_TTL)
+# (uid, model) -> (data version, expires_us, etag, body); entries also expire at expires_us
+recovery_cache = TTLCache(RECOVERY_CACHE_SIZE, float("inf"))
+tts_cache = DiskAudioCache(TTS_CACHE_DIR, TTS_CACHE_MB * 2**20)
+
+# Count and time every store operation for /metrics; awaited, off the loop for SQLite
+store = AsyncStore(InstrumentedStore(store))
+
+Collected(
+    "vitalis_chat_cache_events_total", "/chat response cache lookups by outcome", "counter",
+    lambda: {k: v for k, v in chat_cache.snapshot().items() if k != "size"}, ("outcome",),
+)
+Collected("vitalis_chat_cache_entries", "Entries in the /chat response cache", "gauge", lambda: len(chat_cache.cache))
+Collected("vitalis_tts_cache_events_total", "TTS clip cache events", "counter", lambda: tts_cache.stats, ("event",))
+Collected("vitalis_tts_cache_bytes", "Bytes of audio in the TTS clip cache", "gauge", lambda: tts_cache.total)
+for _field, _help in [
+    ("queued", "Upstream calls waiting for a slot"),
+    ("in_flight", "Upstream calls holding a slot"),
+    ("limit", "Current adaptive concurrency limit per upstream"),
+]:
+    Collected(
+        f"vitalis_upstream_{_field}", _help, "gauge",
+        lambda field=_field: {name: s[field] for name, s in scheduler.snapshot().items()}, ("upstream",),
+    )
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Open shared upstream clients, start logging and watch secrets on startup; close everything on shutdown."""
+    start_logging()
+    await clients.start()
+    secret_provider.install_signal_handler()
+    try:
+        yield
+    finally:
+        await clients.close()
+        store.close()
+        stop_logging()
+
+app = FastAPI(lifespan=lifespan)
 
 # Allow localhost frontend ports (5173 for Vite)
 app.add_middleware(
@@ -34,6 +112,46 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+# Outermost, so the timings include CORS handling
+app.add_middleware(MetricsMiddleware, routes=app.routes)
+
+def client_address(request: Request) -> str:
+    return request.client.host if request.client else "anonymous"
+
+async def enforce_rate_limit(endpoint: str, request: Request, uid: str = ""):
+    """Raise 429 with Retry-After if the caller is over its limit for `endpoint`.
+
+    Keyed by the uid when the endpoint has one, else the client address; uid
+    requests are also limited per address, which is checked first so a refused
+    client never adds uid buckets.
+    """
+    address = client_address(request)
+    checks = [(source_endpoint(endpoint), address), (endpoint, uid)] if uid else [(endpoint, address)]
+    for name, key in checks:
+        retry_after = await store.check_rate(name, key)
+        if retry_after > 0:
+            raise HTTPException(
+                status_code=429,
+                detail="Rate limit exceeded. Please wait.",
+                headers={"Retry-After": str(math.ceil(retry_after))},
+            )
+
+def unavailable(e: UpstreamUnavailable) -> HTTPException:
+    """503 (shed) or 504 (timed out) with Retry-After, for an upstream call the scheduler gave up on."""
+    return HTTPException(status_code=e.status, detail=str(e), headers={"Retry-After": str(math.ceil(e.retry_after))})
+
+def admit(*upstreams: str):
+    """Fail fast, before a streamed response starts, if calls to these upstreams would be shed."""
+    try:
+        for upstream in upstreams:
+            scheduler.admit(upstream)
+    except UpstreamUnavailable as e:
+        raise unavailable(e)
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: per-route latency, in-flight requests, upstream timings, store and cache counters."""
+    return PlainTextResponse(REGISTRY.render(), media_type="text/plain; version=0.0.4")
 
 @app.get("/")
 async def root():
@@ -41,25 +159,59 @@ async def root():
     return {"status": "ok"}
 
 # Placeholder endpoints for MVP contract
+async def stream_chat(client, deployment: str, messages: List[dict], **params) -> AsyncIterator[str]:
+    """Content deltas of a streamed chat completion, timed for /metrics."""
+    start = time.perf_counter()
+    first = None
+    tokens = 0
+    outcome = "error"
+    try:
+        stream, lease = await scheduler.open("chat_stream", lambda: client.chat.completions.create(
+            model=deployment,
+            messages=messages,
+            stream=True,
+            **params,
+        ))
+        try:
+            async for chunk in stream:
+                delta = chunk.choices[0].delta.content if chunk.choices and chunk.choices[0].delta else None
+                if delta:
+                    if first is None:
+                        first = time.perf_counter()
+                        UPSTREAM_TTFB.observe(first - start, "chat_stream")
+                    tokens += 1
+                    yield delta
+            outcome = "ok"
+        finally:
+            # Runs on completion and on cancellation, so we stop paying for unread tokens
+            await stream.close()
+            lease.release(None if outcome == "ok" else sys.exc_info()[1])
+    finally:
+        end = time.perf_counter()
+        if outcome == "error" and first is not None:
+            # Stopped early, e.g. because the client disconnected
+            outcome = "closed"
+        record_upstream("chat_stream", start, outcome, tokens=tokens)
+        STREAM_TOKENS.inc(amount=tokens)
+        if tokens > 1 and end > first:
+            STREAM_TOKEN_RATE.observe((tokens - 1) / (end - first))
+
 @app.post("/chat/stream")
 async def chat_stream(request: Request):
-    """Stream chat responses from Azure OpenAI."""
+    """Stream chat responses from Azure OpenAI.
+
+    Deltas are coalesced (see streaming.py) and sent as plain text, or as
+    Server-Sent Events with ?format=sse or Accept: text/event-stream.
+    """
     try:
         data = await request.json()
         msg = ChatMsg(**data)
     except (ValidationError, Exception):
         raise HTTPException(status_code=400, detail="Invalid request body.")
 
-    # Simple rate limit: max 3 requests per 10s per uid
+    # Token-bucket rate limit per uid (default 3 requests per 10s)
     uid = msg.uid
-    rate = store.chat_rate.get(uid, 0)
-    if rate > 2:
-        raise HTTPException(status_code=429, detail="Rate limit exceeded. Please wait.")
-    store.chat_rate[uid] = rate + 1
-    async def reset_rate():
-        await asyncio.sleep(10)
-        store.chat_rate[uid] = max(0, store.chat_rate[uid] - 1)
-    _rate_task = asyncio.create_task(reset_rate())
+    await enforce_rate_limit("chat_stream", request, uid)
 
     # Load secrets
     try:
@@ -67,110 +219,261 @@ async def chat_stream(request: Request):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-    # Prepare OpenAI client
-    client = AsyncAzureOpenAI(
-        api_key=secrets.AZURE_OPENAI_API_KEY,
-        azure_endpoint=secrets.AZURE_OPENAI_ENDPOINT,
-        api_version="2023-07-01-preview",
-    )
+    # Shared OpenAI client (pooled connections, built once per credential set)
+    client = clients.openai(secrets.AZURE_OPENAI_ENDPOINT, secrets.AZURE_OPENAI_API_KEY, "2023-07-01-preview")
     deployment = secrets.AZURE_OPENAI_DEPLOYMENT
 
     # Append user message to history
-    store.append_chat(uid, "user", msg.message)
-    history = store.get_chat_history(uid)[-20:]
+    await store.append_chat(uid, "user", msg.message)
 
-    # Compose messages for OpenAI
-    messages = [{"role": m["role"], "content": m["content"]} for m in history]
+    # Most recent history that fits the prompt token budget, ready to send
+    messages = await store.get_chat_context(uid)
+
+    sse = request.query_params.get("format") == "sse" or "text/event-stream" in request.headers.get("accept", "")
+    admit("chat_stream")
 
     async def token_stream():
-        full_reply = ""
+        reply = []
         try:
-            stream = await client.chat.completions.create(
-                model=deployment,
-                messages=messages,
-                stream=True,
-            )
-            async for chunk in stream:
-                delta = chunk.choices[0].delta.content if chunk.choices and chunk.choices[0].delta else None
-                if delta:
-                    full_reply += delta
-                    yield delta
+            async for text in coalesce(stream_chat(client, deployment, messages), heartbeat=HEARTBEAT_SECONDS if sse else None):
+                if text is None:
+                    if await request.is_disconnected():
+                        return
+                    yield SSE_HEARTBEAT
+                    continue
+                reply.append(text)
+                yield sse_event(text, "token") if sse else text
+            if sse:
+                yield sse_event("", "done")
         except Exception as e:
-            yield f"\n[Error: {str(e)}]"
-        # Append assistant reply to history
-        store.append_chat(uid, "assistant", full_reply)
+            yield sse_event(str(e), "error") if sse else f"\n[Error: {str(e)}]"
+        finally:
+            # Append assistant reply (partial if the client went away) to history
+            await store.append_chat(uid, "assistant", "".join(reply))
 
-    return StreamingResponse(token_stream(), media_type="text/plain")
+    return StreamingResponse(
+        token_stream(),
+        media_type="text/event-stream" if sse else "text/plain",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"} if sse else None,
+    )
 
 @app.post("/log/workout")
 async def log_workout(log: WorkoutLog = Body(...)):
-    """Log a workout for a user."""
+    """Log a workout for a user; acknowledged once it is durable."""
     try:
         entry = log.dict()
         if not entry.get("ts"):
             entry["ts"] = datetime.now(timezone.utc)
-        store.log_workout(log.uid, entry)
-        return {"ok": True}
+        await store.log_workout(log.uid, entry)
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Invalid workout log: {str(e)}")
+    await store.flush()
+    return {"ok": True}
+
+def prepare_chunk(chunk: List[Tuple[int, object]], now: datetime) -> Tuple[List[Tuple[str, dict]], List[Tuple[int, str]]]:
+    """Validate (index, record) pairs into (uid, log) store entries; return (entries, errors)."""
+    logs, errors = validate_chunk(chunk)
+    entries = []
+    for log in logs:
+        entry = log.model_dump()
+        if not entry.get("ts"):
+            entry["ts"] = now
+        entries.append((log.uid, entry))
+    return entries, errors
+
+@app.post("/log/workout/batch")
+async def log_workout_batch(request: Request):
+    """Log many workouts from an NDJSON body or a JSON array, parsed as it streams in.
+
+    Records are validated in chunks on worker threads; invalid ones are reported
+    by index without failing the batch. Once the whole body has parsed, the valid
+    ones are committed in chunks and acknowledged once durable.
+    """
+    content_type = request.headers.get("content-type", "")
+    if "ndjson" in content_type or "jsonl" in content_type:
+        records = iter_ndjson(request.stream())
+    else:
+        records = iter_json_array(request.stream())
+    now = datetime.now(timezone.utc)
+    entries, errors, chunk, count = [], [], [], 0
+    try:
+        async for record in records:
+            if isinstance(record, ParseError):
+                errors.append((count, str(record)))
+            else:
+                chunk.append((count, record))
+            count += 1
+            if count > INGEST_MAX_RECORDS:
+                raise HTTPException(status_code=413, detail=f"Batch exceeds {INGEST_MAX_RECORDS} records")
+            if len(chunk) >= VALIDATE_CHUNK:
+                valid, bad = await run_in_threadpool(prepare_chunk, chunk, now)
+                entries.extend(valid)
+                errors.extend(bad)
+                chunk = []
+        if chunk:
+            valid, bad = await run_in_threadpool(prepare_chunk, chunk, now)
+            entries.extend(valid)
+            errors.extend(bad)
+    except ParseError as e:
+        raise HTTPException(status_code=400, detail=f"Invalid batch body: {str(e)}")
+
+    for i in range(0, len(entries), VALIDATE_CHUNK):
+        await store.log_workouts(entries[i:i + VALIDATE_CHUNK])
+        # The in-memory stores are called inline; let other requests run between chunks
+        await asyncio.sleep(0)
+    await store.flush()
+    errors.sort()
+    return {
+        "accepted": len(entries),
+        "rejected": len(errors),
+        "errors": [{"index": i, "error": msg} for i, msg in errors[:INGEST_MAX_REPORTED_ERRORS]],
+    }
+
+def compute_recovery(summary: MuscleSummary, model: str, now: datetime) -> RecoveryScore:
+    """Score a user's recovery with the chosen model."""
+    ready_at = None
+    if model == "decay":
+        scores, ready_at = calc_recovery_decay(summary, now)
+    else:
+        scores = calc_recovery_from_summary(summary, now)
+    recommended = recommend_trainable(scores, summary.last_trained, now)
+    return RecoveryScore(
+        muscle_scores=scores,
+        recommended=recommended,
+        updated_at=now,
+        model=model,
+        ready_at=ready_at
+    )
+
+def etag_matches(if_none_match: str, etag: str) -> bool:
+    """True if an If-None-Match header matches `etag` (RFC 9110 weak comparison)."""
+    if if_none_match.strip() == "*":
+        return True
+    opaque = etag.removeprefix("W/")
+    return any(tag.strip().removeprefix("W/") == opaque for tag in if_none_match.split(","))
 
 @app.get("/recovery", response_model=RecoveryScore)
-async def get_recovery(uid: str = Query(...)):
-    """Get recovery scores and recommendations for a user."""
+async def get_recovery(request: Request, uid: str = Query(...), model: str = Query(DEFAULT_RECOVERY_MODEL)):
+    """Get recovery scores and recommendations for a user.
+
+    model=step (default) is the original rule-based score; model=decay weights every
+    log by age, effort and duration and adds a per-muscle ready_at forecast.
+    The rendered body is cached until the user's data version changes or the next
+    time the scores would change, and served with an ETag (304 on If-None-Match).
+    """
+    if model not in RECOVERY_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown recovery model: {model}")
     try:
-        logs = store.get_workouts(uid)
         now = datetime.now(timezone.utc)
-        scores = calc_recovery(logs, now)
-        # Find last trained per muscle
-        last_trained = dict.fromkeys(COMMON_MUSCLES, None)
-        for log in logs:
-            ts = log.get("ts")
-            for m in log.get("muscles", []):
-                if ts and (last_trained[m] is None or ts > last_trained[m]):
-                    last_trained[m] = ts
-        recommended = recommend_trainable(scores, last_trained, now)
-        return RecoveryScore(
-            muscle_scores=scores,
-            recommended=recommended,
-            updated_at=now
-        )
+        now_us = epoch_micros(now)
+        version = await store.get_data_version(uid)
+        entry = recovery_cache.get((uid, model))
+        if entry is None or entry[0] != version or (entry[1] is not None and now_us >= entry[1]):
+            summary = await store.get_recovery_summary(uid)
+            expires_us = next_change_us(summary, now, model)
+            body = compute_recovery(summary, model, now).model_dump_json().encode()
+            etag = f'W/"{version}-{expires_us or 0}"'
+            entry = (version, expires_us, etag, body)
+            recovery_cache.set((uid, model), entry)
+        _, expires_us, etag, body = entry
+        max_age = RECOVERY_MAX_AGE
+        if expires_us is not None:
+            max_age = min(max_age, math.ceil((expires_us - now_us) / 10**6))
+        headers = {"ETag": etag, "Cache-Control": f"private, max-age={max_age}"}
+        if etag_matches(request.headers.get("if-none-match", ""), etag):
+            return Response(status_code=304, headers=headers)
+        return Response(content=body, media_type="application/json", headers=headers)
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=f"Failed to calculate recovery: {str(e)}")
+
+@app.post("/recovery/batch", response_model=RecoveryBatch)
+async def get_recovery_batch(body: RecoveryBatchRequest, model: str = Query(DEFAULT_RECOVERY_MODEL)):
+    """Recovery scores and recommendations for many users, as /recovery would return them.
+
+    The step model is computed as one array operation; the decay model is scored per user.
+    """
+    if model not in RECOVERY_MODELS:
+        raise HTTPException(status_code=400, detail=f"Unknown recovery model: {model}")
+    if len(body.uids) > RECOVERY_BATCH_MAX:
+        raise HTTPException(status_code=413, detail=f"At most {RECOVERY_BATCH_MAX} uids per batch")
+    try:
+        now = datetime.now(timezone.utc)
+        uids = list(dict.fromkeys(body.uids))
+        summaries = await store.run(lambda s: [s.get_recovery_summary(uid) for uid in uids])
+        updated_at = now.isoformat()
+        if model == "decay":
+            results = {
+                uid: compute_recovery(summary, model, now).model_dump(mode="json")
+                for uid, summary in zip(uids, summaries)
+            }
+        else:
+            # Built directly as JSON: per-user model validation would dominate at 100k users
+            results = {
+                uid: {
+                    "muscle_scores": scores, "recommended": recommended, "updated_at": updated_at,
+                    "model": model, "ready_at": None,
+                }
+                for uid, (scores, recommended) in zip(uids, batch_recovery(summaries, now))
+            }
+        return JSONResponse({"results": results, "updated_at": updated_at})
     except Exception as e:
         raise HTTPException(status_code=400, detail=f"Failed to calculate recovery: {str(e)}")
 
 @app.post("/chat")
-async def chat(request: Request):
-    """Chat endpoint for Azure OpenAI integration."""
+async def chat(request: Request, response: Response):
+    """Chat endpoint for Azure OpenAI integration.
+
+    Identical prompts (after normalization) are served from a TTL/LRU cache, and
+    concurrent identical requests share one upstream call. Send "cache": false in
+    the body or a Cache-Control: no-cache header to bypass the cache.
+    """
     data = await request.json()
     user_message = data.get("message", "")
     if not user_message:
         raise HTTPException(status_code=400, detail="Message is required.")
+    await enforce_rate_limit("chat", request, data.get("uid", ""))
     try:
         secrets = load_secrets()
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error loading secrets: {str(e)}")
+    use_cache = data.get("cache", True) is not False and "no-cache" not in request.headers.get("cache-control", "")
+    key = cache_key(
+        prompt=normalize_prompt(user_message),
+        model=secrets.AZURE_OPENAI_DEPLOYMENT,
+        system=SYSTEM_PROMPT,
+        max_tokens=CHAT_MAX_TOKENS,
+        temperature=CHAT_TEMPERATURE,
+    )
+
+    async def complete():
+        client = clients.openai(secrets.AZURE_OPENAI_ENDPOINT, secrets.AZURE_OPENAI_API_KEY, "2023-05-15")
+        with upstream_timer("chat"):
+            completion = await scheduler.call("chat", lambda: client.chat.completions.create(
+                model=secrets.AZURE_OPENAI_DEPLOYMENT,
+                messages=[
+                    {"role": "system", "content": SYSTEM_PROMPT},
+                    {"role": "user", "content": user_message}
+                ],
+                max_tokens=CHAT_MAX_TOKENS,
+                temperature=CHAT_TEMPERATURE
+            ))
+        return completion.choices[0].message.content
+
     try:
-        print("Task started with Chat API")
-        client = openai.AzureOpenAI(
-            api_key=secrets.AZURE_OPENAI_API_KEY,
-            api_version="2023-05-15",
-            azure_endpoint=secrets.AZURE_OPENAI_ENDPOINT,
-        )
-        response = client.chat.completions.create(
-            model=secrets.AZURE_OPENAI_DEPLOYMENT,
-            messages=[
-                {"role": "system", "content": "You are Vitalis, a highly knowledgeable, friendly, and supportive personal AI health companion. Your mission is to help users reach, understand, and maintain their fitness goals through education, motivation, and practical advice. Always keep answers extremely concise (1-2 sentences), but make them packed with value, encouragement, and actionable tips. You specialize in fitness, nutrition, recovery, motivation, and healthy habits. When responding, always:\n- Greet the user warmly and positively.\n- Give advice that is clear, practical, and easy to follow.\n- Motivate and encourage the user to keep going, even if they face setbacks.\n- Educate the user about the science and benefits behind your advice.\n- Use simple, friendly language and avoid jargon.\n- Be empathetic, supportive, and never judgmental.\n- If the user asks about goals, progress, or struggles, offer specific encouragement and a quick tip.\n- If the user asks about workouts, nutrition, or recovery, give a short, science-backed suggestion.\n- Never give medical advice, but always encourage healthy habits and consulting professionals for serious issues.\n- End every reply with a positive, motivational note.\nYou are always super friendly, energetic, and focused on helping the user succeed in their health journey."},
-                {"role": "user", "content": user_message}
-            ],
-            max_tokens=128,
-            temperature=0.7
-        )
-        ai_message = response.choices[0].message.content
-        print("Task complete Chat API")
+        ai_message, outcome = await chat_cache.get_or_fetch(key, complete, use_cache)
+        response.headers["X-Cache"] = outcome.upper()
         return {"response": ai_message}
+    except UpstreamUnavailable as e:
+        raise unavailable(e)
     except Exception as e:
-        print("Chat exception:", e)
+        log_event("upstream_error", logging.WARNING, upstream="chat", error=str(e))
         raise HTTPException(status_code=500, detail=f"Error from OpenAI: {str(e)}")
 
+@app.get("/chat/cache/stats")
+async def chat_cache_stats():
+    """Hit/miss/coalesce counters for the /chat response cache."""
+    return chat_cache.snapshot()
+
 @app.get("/voice-assistant")
 async def voice_assistant():
     """Return a predefined workout voice assistant flow with messages and durations."""
@@ -185,72 +488,374 @@ async def voice_assistant():
     return {"steps": steps}
  
 # Speech-to-Text endpoint: convert user audio to text
-@app.post("/speech-to-text")
-async def speech_to_text(file: UploadFile = File(...)):
-    """Convert uploaded audio file to text via Azure OpenAI Whisper."""
+async def proxy_stt_upload(request: Request, secrets) -> httpx.Response:
+    """Forward the client's multipart body to the STT endpoint chunk by chunk.
+
+    The body can only be read once, so this is never retried or hedged.
+    """
+    headers = {
+        'api-key': secrets.AZURE_SPEECH_STT_KEY,
+        'content-type': request.headers["content-type"],
+    }
+    if "content-length" in request.headers:
+        headers['content-length'] = request.headers["content-length"]
+
+    async def send():
+        resp = await clients.http.post(
+            secrets.AZURE_SPEECH_STT_ENDPOINT,
+            content=limit_stream(request.stream(), STT_MAX_BYTES),
+            headers=headers,
+        )
+        resp.raise_for_status()
+        return resp
+    return await scheduler.call("stt", send, attempts=1)
+
+async def downmix_stt_upload(request: Request, secrets) -> httpx.Response:
+    """Parse the upload, shrink WAV input to 16 kHz mono, and send it upstream.
+
+    The body is size-limited as it is parsed, then buffered here so the call can
+    be retried, and hedged when the (small) downmixed clip is held in memory.
+    """
     try:
-        secrets = load_secrets()
-        audio_content = await file.read()
-        
-        # Use the direct endpoint from your secret.py
-        stt_url = secrets.AZURE_SPEECH_STT_ENDPOINT
-        
-        files = {
-            'file': (file.filename, audio_content, file.content_type)
-        }
+        form = await MultiPartParser(request.headers, limit_stream(request.stream(), STT_MAX_BYTES)).parse()
+    except MultiPartException as e:
+        raise HTTPException(status_code=400, detail=e.message)
+    converted = tempfile.TemporaryFile()
+    try:
+        upload = form.get("file")
+        if upload is None or not hasattr(upload, "file"):
+            raise HTTPException(status_code=400, detail="Missing audio file")
+        downmixed = await run_in_threadpool(downmix_wav, upload.file, converted)
+        if downmixed:
+            name = os.path.splitext(upload.filename or "audio")[0] + ".wav"
+            converted.seek(0)
+            files = {'file': (name, converted.read(), "audio/wav")}
+        else:
+            # httpx rewinds the file before each attempt; attempts never overlap without hedging
+            files = {'file': (upload.filename, upload.file, upload.content_type)}
         headers = {
             'api-key': secrets.AZURE_SPEECH_STT_KEY
         }
-        
-        print("Task started with Speech-to-Text API")
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(stt_url, files=files, headers=headers)
-        resp.raise_for_status()
-        print("Task complete Speech-to-Text API")
-        
+
+        async def send():
+            resp = await clients.http.post(secrets.AZURE_SPEECH_STT_ENDPOINT, files=files, headers=headers)
+            resp.raise_for_status()
+            return resp
+        return await scheduler.call("stt", send, hedge=downmixed)
+    finally:
+        converted.close()
+        await form.close()
+
+async def transcribe(request: Request, downmix: bool = False) -> str:
+    """Send the request's multipart audio upload to STT and return the text (HTTPException on failure)."""
+    if not request.headers.get("content-type", "").startswith("multipart/form-data"):
+        raise HTTPException(status_code=400, detail="Expected a multipart/form-data upload")
+    if int(request.headers.get("content-length") or 0) > STT_MAX_BYTES:
+        raise HTTPException(status_code=413, detail=f"Audio upload exceeds {STT_MAX_MB} MB")
+    try:
+        secrets = load_secrets()
+        with upstream_timer("stt"):
+            if downmix and can_downmix():
+                resp = await downmix_stt_upload(request, secrets)
+            else:
+                resp = await proxy_stt_upload(request, secrets)
+
         result = resp.json()
-        transcribed_text = result.get('text', '')
-        return {"transcription": transcribed_text}
-        
+        return result.get('text', '')
+
+    except HTTPException:
+        raise
+    except UpstreamUnavailable as e:
+        raise unavailable(e)
+    except UploadTooLarge:
+        raise HTTPException(status_code=413, detail=f"Audio upload exceeds {STT_MAX_MB} MB")
     except Exception as e:
-        print("Speech-to-text exception:", e)
+        log_event("upstream_error", logging.WARNING, upstream="stt", error=str(e))
         raise HTTPException(status_code=500, detail=f"Speech-to-text error: {str(e)}")
 
+@app.post("/speech-to-text")
+async def speech_to_text(request: Request, downmix: bool = Query(False)):
+    """Convert uploaded audio file to text via Azure OpenAI Whisper.
+
+    The multipart upload (field "file") is streamed to the STT endpoint without
+    being buffered, and rejected with 413 once it exceeds VITALIS_STT_MAX_MB.
+    With ?downmix=true, WAV uploads are converted to 16 kHz mono first.
+    """
+    await enforce_rate_limit("speech_to_text", request)
+    return {"transcription": await transcribe(request, downmix)}
+
 # Text-to-Speech endpoint: convert AI text response to audio
+async def open_tts_stream(secrets, text: str, voice: str) -> Tuple[httpx.Response, Lease]:
+    """Start a TTS request; return the response with its body still unread, and its scheduler slot.
+
+    Release the slot once the body has been read (relay_audio does).
+    """
+    payload = {
+        "model": TTS_MODEL,
+        "input": text,
+        "voice": voice
+    }
+    headers = {
+        'api-key': secrets.AZURE_SPEECH_TTS_KEY,
+        'Content-Type': 'application/json'
+    }
+
+    async def send():
+        # Use the direct endpoint from your secret.py
+        req = clients.http.build_request("POST", secrets.AZURE_SPEECH_TTS_ENDPOINT, json=payload, headers=headers)
+        resp = await clients.http.send(req, stream=True)
+        if resp.is_error:
+            try:
+                await resp.aread()
+            finally:
+                await resp.aclose()
+            resp.raise_for_status()
+        return resp
+
+    async def close(resp):
+        await resp.aclose()
+    return await scheduler.open("tts", send, hedge=True, discard=close)
+
+def read_chunks(f, size: int = 64 * 1024):
+    """Yield an open file's contents in chunks, closing it at the end."""
+    with f:
+        yield from iter(lambda: f.read(size), b"")
+
+async def relay_audio(resp: httpx.Response, lease: Lease, key: str, content_type: str, start: float):
+    """Pipe upstream audio to the client chunk by chunk, caching it once complete, then free the slot.
+
+    Caching is best-effort: a disk error drops the clip from the cache but the relay goes on.
+    """
+    writer = None
+    outcome = "error"
+    try:
+        try:
+            writer = tts_cache.writer(key, content_type)
+        except OSError as e:
+            cache_failed(e)
+        async for chunk in resp.aiter_bytes():
+            if writer is not None:
+                try:
+                    writer.write(chunk)
+                except OSError as e:
+                    writer = cache_failed(e, writer)
+            yield chunk
+        if writer is not None:
+            try:
+                writer.commit()
+            except OSError as e:
+                writer = cache_failed(e, writer)
+        outcome = "ok"
+    except GeneratorExit:
+        outcome = "closed"
+        raise
+    finally:
+        # No-op after commit; drops the partial clip if the client went away
+        if writer is not None:
+            writer.abort()
+        await resp.aclose()
+        lease.release(None if outcome == "ok" else sys.exc_info()[1])
+        record_upstream("tts", start, outcome)
+
+def cache_failed(error: OSError, writer: Optional[AudioCacheWriter] = None) -> None:
+    """Log a TTS cache disk error and discard the partial clip; returns None to clear the writer."""
+    log_event("tts_cache_error", logging.WARNING, error=str(error))
+    if writer is not None:
+        writer.abort()
+
 @app.post("/text-to-speech")
-async def text_to_speech(body: dict = Body(...)):
-    """Convert provided text to speech audio via Azure OpenAI TTS."""
+async def text_to_speech(request: Request, body: dict = Body(...)):
+    """Convert provided text to speech audio via Azure OpenAI TTS.
+
+    Clips are cached on disk by (text, voice, model). Send "format": "audio" (or an
+    Accept: audio/* header) to get raw audio bytes streamed from upstream; the
+    default "json" format returns {"audio": <base64>} for older clients.
+    """
+    await enforce_rate_limit("text_to_speech", request, body.get("uid", ""))
+    text = body.get('text', '')
+    if not text:
+        raise HTTPException(status_code=400, detail="No text provided")
+    voice = body.get('voice') or TTS_VOICE
+    raw = body.get('format') == "audio" or request.headers.get("accept", "").startswith("audio/")
+    key = audio_key(text, voice, TTS_MODEL)
+
+    hit = tts_cache.open(key)
+    if hit:
+        cached, f = hit
+        if raw:
+            # Stream from the already open file: the clip may be evicted before the response is sent
+            headers = {"X-Cache": "HIT", "Content-Length": str(cached.size)}
+            return StreamingResponse(read_chunks(f), media_type=cached.content_type, headers=headers)
+        with f:
+            audio_base64 = base64.b64encode(f.read()).decode('utf-8')
+        return JSONResponse({"audio": audio_base64}, headers={"X-Cache": "HIT"})
+
+    start = time.perf_counter()
+    try:
+        secrets = load_secrets()
+        resp, lease = await open_tts_stream(secrets, text, voice)
+    except UpstreamUnavailable as e:
+        record_upstream("tts", start, "error")
+        raise unavailable(e)
+    except Exception as e:
+        record_upstream("tts", start, "error")
+        log_event("upstream_error", logging.WARNING, upstream="tts", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Text-to-speech error: {str(e)}")
+    UPSTREAM_TTFB.observe(time.perf_counter() - start, "tts")
+    content_type = resp.headers.get("content-type", "audio/mpeg")
+
+    if raw:
+        return StreamingResponse(
+            relay_audio(resp, lease, key, content_type, start), media_type=content_type, headers={"X-Cache": "MISS"},
+        )
+
+    outcome = "error"
+    try:
+        audio = await resp.aread()
+        outcome = "ok"
+    except Exception as e:
+        log_event("upstream_error", logging.WARNING, upstream="tts", error=str(e))
+        raise HTTPException(status_code=500, detail=f"Text-to-speech error: {str(e)}")
+    finally:
+        await resp.aclose()
+        lease.release(None if outcome == "ok" else sys.exc_info()[1])
+        record_upstream("tts", start, outcome)
+    try:
+        # None (not cached) for clips larger than the cache; either way the response is fine
+        tts_cache.put(key, content_type, audio)
+    except OSError as e:
+        log_event("tts_cache_error", logging.WARNING, error=str(e))
+    # Return the audio as base64
+    audio_base64 = base64.b64encode(audio).decode('utf-8')
+    return JSONResponse({"audio": audio_base64}, headers={"X-Cache": "MISS"})
+
+async def synthesize(secrets, text: str, voice: str, content_types: Optional[dict] = None) -> AsyncIterator[bytes]:
+    """Audio for `text`: the cached clip, or streamed from TTS and cached once complete.
+
+    The clip's content type is recorded in content_types[text], if given, before the first chunk.
+    """
+    key = audio_key(text, voice, TTS_MODEL)
+    hit = tts_cache.open(key)
+    if hit:
+        cached, f = hit
+        if content_types is not None:
+            content_types[text] = cached.content_type
+        with f:
+            yield f.read()
+        return
+    start = time.perf_counter()
+    try:
+        resp, lease = await open_tts_stream(secrets, text, voice)
+    except Exception:
+        record_upstream("tts", start, "error")
+        raise
+    UPSTREAM_TTFB.observe(time.perf_counter() - start, "tts")
+    content_type = resp.headers.get("content-type", "audio/mpeg")
+    if content_types is not None:
+        content_types[text] = content_type
+    async with aclosing(relay_audio(resp, lease, key, content_type, start)) as chunks:
+        async for chunk in chunks:
+            yield chunk
+
+@app.post("/voice-turn")
+async def voice_turn(
+    request: Request,
+    uid: str = Query(""),
+    voice: str = Query(TTS_VOICE),
+    format: str = Query("sse"),
+    downmix: bool = Query(False),
+):
+    """One voice interaction in a single request: STT, streamed chat, then TTS per sentence, streamed back in order."""
+    start = time.perf_counter()
+    await enforce_rate_limit("voice_turn", request, uid)
+    transcript = (await transcribe(request, downmix)).strip()
+    if not transcript:
+        raise HTTPException(status_code=422, detail="No speech recognized")
+    admit("chat_stream", "tts")
     try:
-        text = body.get('text', '')
-        if not text:
-            raise HTTPException(status_code=400, detail="No text provided")
-        
         secrets = load_secrets()
-        
-        # Use the direct endpoint from your secret.py
-        tts_url = secrets.AZURE_SPEECH_TTS_ENDPOINT
-        
-        payload = {
-            "model": "gpt-4o-mini-tts",
-            "input": text,
-            "voice": "alloy"
-        }
-        headers = {
-            'api-key': secrets.AZURE_SPEECH_TTS_KEY,
-            'Content-Type': 'application/json'
-        }
-        
-        print("Task started with Text-to-Speech API")
-        async with httpx.AsyncClient() as client:
-            resp = await client.post(tts_url, json=payload, headers=headers)
-        resp.raise_for_status()
-        print("Task complete Text-to-Speech API")
-        
-        # Return the audio as base64
-        import base64
-        audio_base64 = base64.b64encode(resp.content).decode('utf-8')
-        return {"audio": audio_base64}
-        
     except Exception as e:
-        print("Text-to-speech exception:", e)
-        raise HTTPException(status_code=500, detail=f"Text-to-speech error: {str(e)}")
\ No newline at end of file
+        raise HTTPException(status_code=500, detail=str(e))
+    client = clients.openai(secrets.AZURE_OPENAI_ENDPOINT, secrets.AZURE_OPENAI_API_KEY, "2023-07-01-preview")
+    if uid:
+        await store.append_chat(uid, "user", transcript)
+        history = await store.get_chat_context(uid)
+    else:
+        history = [{"role": "user", "content": transcript}]
+    messages = [{"role": "system", "content": SYSTEM_PROMPT}] + history
+    reply: List[str] = []
+    # Sentence -> content type of its clip
+    content_types: Dict[str, str] = {}
+
+    async def sentences():
+        deltas = stream_chat(
+            client, secrets.AZURE_OPENAI_DEPLOYMENT, messages,
+            max_tokens=CHAT_MAX_TOKENS, temperature=CHAT_TEMPERATURE,
+        )
+        async for sentence in split_sentences(deltas):
+            reply.append(sentence)
+            yield sentence
+
+    async def spoken():
+        """(index, sentence, audio chunks) in reply order; records time to first audio."""
+        first = True
+        async with aclosing(pipelined(sentences(), lambda text: synthesize(secrets, text, voice, content_types), VOICE_TTS_PARALLEL)) as parts:
+            index = 0
+            async for sentence, chunks in parts:
+                async def timed(chunks=chunks):
+                    nonlocal first
+                    async for chunk in chunks:
+                        if first:
+                            VOICE_FIRST_AUDIO.observe(time.perf_counter() - start)
+                            first = False
+                        yield chunk
+                yield index, sentence, timed()
+                index += 1
+
+    # SSE (default): "transcript", then per sentence a "sentence" event and its base64
+    # "audio" chunks, then "done". ?format=audio: the raw audio bytes, transcript in X-Transcript.
+    async def events():
+        try:
+            yield sse_event(json.dumps({"text": transcript}), "transcript")
+            async with aclosing(spoken()) as parts:
+                async for index, sentence, chunks in parts:
+                    yield sse_event(json.dumps({"index": index, "text": sentence}), "sentence")
+                    async for chunk in chunks:
+                        audio = base64.b64encode(chunk).decode()
+                        yield sse_event(json.dumps({"index": index, "audio": audio}), "audio")
+            yield sse_event(json.dumps({"text": " ".join(reply)}), "done")
+        except Exception as e:
+            log_event("voice_turn_error", logging.WARNING, error=str(e))
+            yield sse_event(str(e), "error")
+        finally:
+            if uid:
+                await store.append_chat(uid, "assistant", " ".join(reply))
+
+    async def audio():
+        try:
+            async with aclosing(spoken()) as parts:
+                async for _, _, chunks in parts:
+                    async for chunk in chunks:
+                        yield chunk
+        except Exception as e:
+            # Headers are already sent; end the stream early
+            log_event("voice_turn_error", logging.WARNING, error=str(e))
+        finally:
+            if uid:
+                await store.append_chat(uid, "assistant", " ".join(reply))
+
+    headers = {"Cache-Control": "no-cache", "X-Transcript": urllib.parse.quote(transcript)}
+    if format == "audio":
+        # The response takes the first clip's content type, known once its first bytes arrive
+        body = audio()
+        first = await anext(body, b"")
+        media_type = content_types.get(reply[0], "audio/mpeg") if reply else "audio/mpeg"
+
+        async def rest():
+            async with aclosing(body):
+                if first:
+                    yield first
+                async for chunk in body:
+                    yield chunk
+        return StreamingResponse(rest(), media_type=media_type, headers=headers)
+    return StreamingResponse(events(), media_type="text/event-stream", headers=dict(headers, **{"X-Accel-Buffering": "no"}))
@@ -0,0 +1,69 @@
+"""Audio upload helpers: size-capped body streaming and WAV downmixing."""
+from typing import AsyncIterator, BinaryIO
+import wave
+
+try:
+    import audioop
+except ImportError:  # removed from the stdlib in Python 3.13
+    audioop = None
+
+TARGET_RATE = 16000
+CHUNK_FRAMES = 32768
+
+
+class UploadTooLarge(Exception):
+    """The upload exceeded the configured maximum size."""
+
+
+async def limit_stream(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """Pass chunks through, raising UploadTooLarge as soon as max_bytes is exceeded."""
+    total = 0
+    async for chunk in chunks:
+        total += len(chunk)
+        if total > max_bytes:
+            raise UploadTooLarge(f"Upload exceeds {max_bytes} bytes")
+        yield chunk
+
+
+def can_downmix() -> bool:
+    return audioop is not None
+
+
+def downmix_wav(src: BinaryIO, dst: BinaryIO, rate: int = TARGET_RATE) -> bool:
+    """Rewrite PCM WAV `src` into `dst` as 16-bit mono at `rate`, a chunk at a time.
+
+    Returns False (leaving dst untouched) if audioop is unavailable, the input is
+    not uncompressed PCM WAV, or it is already no larger than the target format.
+    """
+    if audioop is None:
+        return False
+    try:
+        reader = wave.open(src, "rb")
+    except (wave.Error, EOFError):
+        return False
+    with reader:
+        channels, width, in_rate = reader.getnchannels(), reader.getsampwidth(), reader.getframerate()
+        if channels > 2 or (channels == 1 and width <= 2 and in_rate <= rate):
+            return False
+        writer = wave.open(dst, "wb")
+        writer.setnchannels(1)
+        writer.setsampwidth(2)
+        writer.setframerate(rate)
+        state = None
+        while True:
+            frames = reader.readframes(CHUNK_FRAMES)
+            if not frames:
+                break
+            if width == 1:
+                # 8-bit WAV is unsigned; audioop expects signed samples
+                frames = audioop.bias(frames, 1, -128)
+            if width != 2:
+                frames = audioop.lin2lin(frames, width, 2)
+            if channels == 2:
+                frames = audioop.tomono(frames, 2, 0.5, 0.5)
+            if in_rate != rate:
+                frames, state = audioop.ratecv(frames, 2, 1, in_rate, rate, state)
+            writer.writeframes(frames)
+        writer.close()
+    dst.seek(0)
+    return True
@@ -0,0 +1,184 @@
+"""Disk-backed, size-bounded, content-addressed cache for synthesized audio."""
+from collections import OrderedDict
+from typing import BinaryIO, NamedTuple, Optional, Tuple
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+
+# Temp files older than this are left over from a crashed writer (ours or another worker's)
+STALE_TMP_SECONDS = 3600
+
+
+class CachedAudio(NamedTuple):
+    """A cached clip on disk."""
+    path: str
+    size: int
+    content_type: str
+
+
+def audio_key(*parts: str) -> str:
+    """Content address for a clip, e.g. audio_key(text, voice, model)."""
+    h = hashlib.sha256()
+    for part in parts:
+        h.update(part.encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _encode_type(content_type: str) -> str:
+    return content_type.split(";")[0].strip().replace("/", "_")
+
+
+def _decode_type(encoded: str) -> str:
+    return encoded.replace("_", "/", 1)
+
+
+class AudioCacheWriter:
+    """Collects a clip chunk by chunk into a temp file; commit() publishes it."""
+    def __init__(self, cache: "DiskAudioCache", key: str, content_type: str):
+        self.cache = cache
+        self.key = key
+        self.content_type = content_type
+        self.size = 0
+        self._tmp = os.path.join(cache.directory, f".tmp-{uuid.uuid4().hex}")
+        self._file = open(self._tmp, "wb")
+
+    def write(self, chunk: bytes):
+        self._file.write(chunk)
+        self.size += len(chunk)
+
+    def commit(self) -> Optional[CachedAudio]:
+        """Publish the clip under its key (called once the upstream body is complete).
+
+        Returns None, keeping nothing, if the clip is larger than the whole cache.
+        """
+        self._file.close()
+        return self.cache._publish(self.key, self.content_type, self._tmp, self.size)
+
+    def abort(self):
+        """Discard a partial clip, e.g. after an upstream error, client disconnect or disk error."""
+        try:
+            if not self._file.closed:
+                self._file.close()
+        except OSError:
+            # Flushing the rest failed too (e.g. disk full); the file is closed regardless
+            pass
+        try:
+            os.remove(self._tmp)
+        except FileNotFoundError:
+            pass
+
+
+class DiskAudioCache:
+    """Content-addressed clip files under `directory`, evicted LRU beyond max_bytes.
+
+    Files are named '<key>.<content type>' so the index can be rebuilt from a
+    directory listing on startup; the most recently used order survives restarts
+    through file mtimes, which are touched on every hit.
+    """
+    def __init__(self, directory: str, max_bytes: int):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.total = 0
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+        self._index: "OrderedDict[str, CachedAudio]" = OrderedDict()
+        entries = []
+        stale = time.time() - STALE_TMP_SECONDS
+        for name in os.listdir(directory):
+            path = os.path.join(directory, name)
+            try:
+                st = os.stat(path)
+                if name.startswith(".tmp-"):
+                    # Recent temp files may be clips other workers are still writing
+                    if st.st_mtime < stale:
+                        os.remove(path)
+                    continue
+            except FileNotFoundError:
+                # Published, evicted or cleaned up by another worker meanwhile
+                continue
+            key, _, encoded = name.partition(".")
+            entries.append((st.st_mtime, key, CachedAudio(path, st.st_size, _decode_type(encoded))))
+        for _, key, entry in sorted(entries):
+            self._index[key] = entry
+            self.total += entry.size
+        self._evict()
+
+    def get(self, key: str) -> Optional[CachedAudio]:
+        """Return the cached clip and mark it recently used, or None."""
+        entry = self._index.get(key)
+        if entry is None or not os.path.exists(entry.path):
+            if entry is not None:
+                self._drop(key)
+            self.stats["misses"] += 1
+            return None
+        try:
+            os.utime(entry.path)
+        except FileNotFoundError:
+            # Evicted by another worker since the exists() check
+            self._drop(key)
+            self.stats["misses"] += 1
+            return None
+        self._index.move_to_end(key)
+        self.stats["hits"] += 1
+        return entry
+
+    def open(self, key: str) -> Optional[Tuple[CachedAudio, BinaryIO]]:
+        """Like get(), but also open the clip, so a later eviction cannot remove it under the reader."""
+        entry = self.get(key)
+        if entry is None:
+            return None
+        try:
+            return entry, open(entry.path, "rb")
+        except FileNotFoundError:
+            # Evicted by another worker between the lookup and the open
+            self._drop(key)
+            self.stats["hits"] -= 1
+            self.stats["misses"] += 1
+            return None
+
+    def writer(self, key: str, content_type: str) -> AudioCacheWriter:
+        """Start writing a clip for `key`."""
+        return AudioCacheWriter(self, key, content_type)
+
+    def put(self, key: str, content_type: str, data: bytes) -> Optional[CachedAudio]:
+        """Store a complete clip; None if it does not fit in the cache at all."""
+        w = self.writer(key, content_type)
+        try:
+            w.write(data)
+            return w.commit()
+        except BaseException:
+            w.abort()
+            raise
+
+    def _publish(self, key: str, content_type: str, tmp: str, size: int) -> Optional[CachedAudio]:
+        if size > self.max_bytes:
+            os.remove(tmp)
+            return None
+        path = os.path.join(self.directory, f"{key}.{_encode_type(content_type)}")
+        if key in self._index:
+            self._drop(key)
+        os.replace(tmp, path)
+        entry = self._index[key] = CachedAudio(path, size, content_type)
+        self.total += size
+        self._evict()
+        return entry
+
+    def _drop(self, key: str):
+        entry = self._index.pop(key)
+        self.total -= entry.size
+        try:
+            os.remove(entry.path)
+        except FileNotFoundError:
+            pass
+
+    def _evict(self):
+        while self.total > self.max_bytes and self._index:
+            self._drop(next(iter(self._index)))
+            self.stats["evictions"] += 1
+
+
+def default_cache_dir() -> str:
+    return os.path.join(tempfile.gettempdir(), "vitalis-tts-cache")
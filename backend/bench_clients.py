@@ -0,0 +1,86 @@
+"""Benchmark: per-request upstream clients vs the shared pooled ClientRegistry.
+
+Starts stub_upstream on a local port and issues chat completions and TTS calls
+the way app.py used to (new client per request, sync client for /chat) and the
+way it does now (one pooled registry). Usage: python bench_clients.py [requests]
+"""
+import asyncio
+import sys
+import time
+
+import httpx
+import openai
+from openai import AsyncAzureOpenAI
+
+from clients import ClientRegistry
+from stub_upstream import STUB_CONFIG, serve_in_thread
+
+API_KEY = "stub-key"
+DEPLOYMENT = "stub-deployment"
+MESSAGES = [{"role": "user", "content": "How long should I rest between sets?"}]
+
+
+def percentile(samples, p):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * p))]
+
+
+async def run(call, total, concurrency):
+    """Run `total` calls with at most `concurrency` in flight; return latencies and wall time."""
+    sem = asyncio.Semaphore(concurrency)
+    latencies = []
+
+    async def one():
+        async with sem:
+            start = time.perf_counter()
+            await call()
+            latencies.append(time.perf_counter() - start)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(one() for _ in range(total)))
+    return latencies, time.perf_counter() - start
+
+
+async def main(total):
+    base = serve_in_thread()
+    registry = ClientRegistry()
+
+    async def chat_per_request():
+        client = AsyncAzureOpenAI(api_key=API_KEY, azure_endpoint=base, api_version="2023-05-15")
+        await client.chat.completions.create(model=DEPLOYMENT, messages=MESSAGES, max_tokens=128)
+        await client.close()
+
+    async def chat_sync_client():
+        client = openai.AzureOpenAI(api_key=API_KEY, azure_endpoint=base, api_version="2023-05-15")
+        client.chat.completions.create(model=DEPLOYMENT, messages=MESSAGES, max_tokens=128)
+
+    async def chat_pooled():
+        client = registry.openai(base, API_KEY, "2023-05-15")
+        await client.chat.completions.create(model=DEPLOYMENT, messages=MESSAGES, max_tokens=128)
+
+    async def tts_per_request():
+        async with httpx.AsyncClient() as client:
+            (await client.post(f"{base}/tts", json={"input": "hi"})).raise_for_status()
+
+    async def tts_pooled():
+        (await registry.http.post(f"{base}/tts", json={"input": "hi"})).raise_for_status()
+
+    cases = [
+        ("chat: sync client (old /chat)", chat_sync_client),
+        ("chat: new async client/request", chat_per_request),
+        ("chat: pooled registry", chat_pooled),
+        ("tts: new httpx client/request", tts_per_request),
+        ("tts: pooled registry", tts_pooled),
+    ]
+    print(f"stub latency {STUB_CONFIG['latency_ms']}ms, {total} requests per case")
+    print(f"{'case':<34}{'conc':>6}{'req/s':>10}{'p50 ms':>10}{'p95 ms':>10}")
+    for concurrency in (1, 16, 64):
+        for name, call in cases:
+            latencies, wall = await run(call, total, concurrency)
+            print(f"{name:<34}{concurrency:>6}{total / wall:>10.1f}"
+                  f"{percentile(latencies, 0.5) * 1000:>10.1f}{percentile(latencies, 0.95) * 1000:>10.1f}")
+    await registry.close()
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 200))
@@ -0,0 +1,45 @@
+"""Benchmark: chat prompt assembly time and prompt size, fixed 20-message cut vs token budget."""
+import random
+import sys
+import timeit
+
+from store import CHAT_CONTEXT_TOKENS, Store
+
+
+def fill(store, users, seed=0):
+    """Chat histories with a mix of one-liners and long assistant replies."""
+    rng = random.Random(seed)
+    for u in range(users):
+        for i in range(60):
+            words = rng.choice([5, 12, 40, 600]) if i % 2 else rng.choice([4, 8, 20])
+            store.append_chat(f"user{u}", "assistant" if i % 2 else "user", "word " * words)
+
+
+def old_assembly(store, uid):
+    history = store.get_chat_history(uid)[-20:]
+    return [{"role": m["role"], "content": m["content"]} for m in history]
+
+
+def prompt_tokens(store, uid, messages):
+    tokens = store.chat_tokens[uid]
+    return sum(list(tokens)[len(tokens) - len(messages):])
+
+
+def main(users):
+    store = Store()
+    fill(store, users)
+    uids = [f"user{u}" for u in range(users)]
+    n = 200000
+    for name, build in [
+        ("last 20 messages (before)", lambda uid: old_assembly(store, uid)),
+        (f"token budget {CHAT_CONTEXT_TOKENS}", lambda uid: store.get_chat_context(uid)),
+    ]:
+        it = iter(uids * (n // users + 1))
+        per_call = timeit.timeit(lambda: build(next(it)), number=n) / n
+        sizes = [prompt_tokens(store, uid, build(uid)) for uid in uids]
+        print(f"{name:<28}{per_call * 1e6:8.2f} us/assembly  avg {sum(sizes) / len(sizes):7.0f} "
+              f"prompt tokens  max {max(sizes):6d}  over budget {sum(s > CHAT_CONTEXT_TOKENS for s in sizes)}/{users}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1000)
@@ -0,0 +1,71 @@
+"""Benchmark: N single POST /log/workout calls vs one /log/workout/batch upload.
+
+Drives the app in-process through httpx's ASGI transport (no network), so the
+numbers isolate request handling, validation and store commits.
+Usage: python bench_ingest.py [logs]
+"""
+import asyncio
+import json
+import random
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import httpx
+
+from app import app
+from recovery import COMMON_MUSCLES
+
+
+def make_logs(n, seed=0):
+    rng = random.Random(seed)
+    start = datetime(2026, 1, 1, tzinfo=timezone.utc)
+    return [{
+        "uid": f"athlete{i % 50}",
+        "muscles": rng.sample(COMMON_MUSCLES, rng.randint(1, 3)),
+        "effort": rng.randint(1, 10),
+        "soreness": rng.randint(0, 10),
+        "duration_min": rng.randint(15, 90),
+        "ts": (start + timedelta(minutes=i)).isoformat(),
+    } for i in range(n)]
+
+
+async def single_posts(client, logs, concurrency=32):
+    sem = asyncio.Semaphore(concurrency)
+
+    async def post(log):
+        async with sem:
+            (await client.post("/log/workout", json=log)).raise_for_status()
+    await asyncio.gather(*(post(log) for log in logs))
+
+
+async def batch(client, body, content_type):
+    async def chunks():
+        for i in range(0, len(body), 65536):
+            yield body[i:i + 65536]
+    resp = await client.post("/log/workout/batch", content=chunks(), headers={"content-type": content_type})
+    resp.raise_for_status()
+    return resp.json()
+
+
+async def main(n):
+    logs = make_logs(n)
+    ndjson = "\n".join(json.dumps(log) for log in logs).encode()
+    array = json.dumps(logs).encode()
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        single_n = min(n, 10000)
+        start = time.perf_counter()
+        await single_posts(client, logs[:single_n])
+        single = time.perf_counter() - start
+        print(f"single POSTs      {single_n:>8} logs  {single:8.2f}s  {single_n / single:>10.0f} logs/s")
+        for name, body, ctype in [("batch NDJSON", ndjson, "application/x-ndjson"),
+                                  ("batch JSON array", array, "application/json")]:
+            start = time.perf_counter()
+            result = await batch(client, body, ctype)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<17} {result['accepted']:>8} logs  {elapsed:8.2f}s  {n / elapsed:>10.0f} logs/s")
+
+
+if __name__ == "__main__":
+    asyncio.run(main(int(sys.argv[1]) if len(sys.argv) > 1 else 100000))
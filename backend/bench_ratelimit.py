@@ -0,0 +1,47 @@
+"""Microbenchmark: rate limiter cost per call and memory with 1M distinct uids."""
+import sys
+import timeit
+import tracemalloc
+
+from ratelimit import RateLimit, RateLimiter
+
+
+class StepClock:
+    """Advance time by `step` seconds per call to simulate a steady arrival rate."""
+    def __init__(self, step):
+        self.now, self.step = 0.0, step
+
+    def __call__(self):
+        self.now += self.step
+        return self.now
+
+
+def overhead():
+    limiter = RateLimiter({"chat": RateLimit(1000000, 1)})
+    n = 1000000
+    hot = timeit.timeit(lambda: limiter.check("chat", "u"), number=n) / n
+    keys = [f"user{i}" for i in range(n)]
+    it = iter(keys)
+    cold = timeit.timeit(lambda: limiter.check("chat", next(it)), number=n) / n
+    print(f"check() same uid:     {hot * 1e9:8.0f} ns/call")
+    print(f"check() distinct uid: {cold * 1e9:8.0f} ns/call")
+
+
+def memory(n, arrivals_per_sec, max_keys):
+    limiter = RateLimiter({"chat": RateLimit(3, 10)}, max_keys=max_keys, clock=StepClock(1 / arrivals_per_sec))
+    keys = [f"user{i}" for i in range(n)]
+    tracemalloc.start()
+    for key in keys:
+        limiter.check("chat", key)
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    print(f"{n} uids @ {arrivals_per_sec}/s, max_keys={max_keys}: "
+          f"{len(limiter)} live buckets, {current / 2**20:.1f} MiB held, {peak / 2**20:.1f} MiB peak")
+
+
+if __name__ == "__main__":
+    n = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    overhead()
+    memory(n, 1000, n)        # idle eviction only: ~10s worth of uids stay live
+    memory(n, 10 ** 9, n)     # all uids inside one window: bounded only by max_keys
+    memory(n, 10 ** 9, 100000)
@@ -0,0 +1,40 @@
+"""Benchmark: per-user scalar recovery vs the vectorized batch scorer at 10, 1k and 100k users."""
+import sys
+import time
+from datetime import datetime, timezone
+
+import recovery_batch
+from recovery import calc_recovery_from_summary, recommend_trainable
+from sample_summaries import random_summaries
+
+
+def scalar(summaries, now):
+    results = []
+    for summary in summaries:
+        scores = calc_recovery_from_summary(summary, now)
+        results.append((scores, recommend_trainable(scores, summary.last_trained, now)))
+    return results
+
+
+def timed(fn, *args):
+    start = time.perf_counter()
+    result = fn(*args)
+    return result, time.perf_counter() - start
+
+
+def main(sizes):
+    now = datetime.now(timezone.utc)
+    print(f"{'users':>8}{'scalar ms':>12}{'batch ms':>12}{'pack':>8}{'score':>8}{'unpack':>8}{'speedup':>9}")
+    for n in sizes:
+        summaries = random_summaries(n, now)
+        expected, t_scalar = timed(scalar, summaries, now)
+        got, t_batch = timed(recovery_batch.batch_recovery, summaries, now)
+        assert got == expected
+        packed, t_pack = timed(recovery_batch.pack, summaries)
+        _, t_score = timed(recovery_batch.score_arrays, *packed, recovery_batch.epoch_micros(now))
+        print(f"{n:>8}{t_scalar * 1000:>12.2f}{t_batch * 1000:>12.2f}{t_pack * 1000:>8.1f}{t_score * 1000:>8.1f}"
+              f"{(t_batch - t_pack - t_score) * 1000:>8.1f}{t_scalar / t_batch:>8.1f}x")
+
+
+if __name__ == "__main__":
+    main([int(a) for a in sys.argv[1:]] or [10, 1000, 100000])
@@ -0,0 +1,71 @@
+"""Benchmark: a /chat burst against a capacity-limited upstream, with and without the scheduler.
+
+Runs the app in-process against stub_upstream configured to answer 429 beyond
+`capacity` concurrent chat calls, and fires `burst` concurrent /chat requests
+(cache bypassed). Compares sending every call straight through (no limit, no
+retries; the old behaviour), retries alone, and the default adaptive limit
+with its wait queue and retries. Usage: python bench_scheduler.py [burst] [capacity]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import time
+
+import httpx
+
+from stub_upstream import STUB_CONFIG, serve_in_thread, stub_env
+
+STUB_BASE = serve_in_thread()
+os.environ.update(stub_env(STUB_BASE))
+os.environ["VITALIS_RATE_CHAT"] = "1000000/1"
+
+import scheduler  # noqa: E402
+from app import app  # noqa: E402
+from metrics import UPSTREAM_SHED  # noqa: E402
+from scheduler import Limiter, UpstreamPolicy  # noqa: E402
+
+DEFAULT = scheduler.DEFAULT_POLICIES["chat"]
+MODES = [
+    ("no limit, no retries (before)", UpstreamPolicy(100000, 0, DEFAULT.deadline, attempts=1)),
+    ("no limit, retries", UpstreamPolicy(100000, 0, DEFAULT.deadline)),
+    (f"adaptive limit {DEFAULT.concurrency}/{DEFAULT.queue}", DEFAULT),
+]
+
+
+async def one(client, i):
+    start = time.perf_counter()
+    r = await client.post("/chat", json={"message": f"How long should I rest? ({i})", "cache": False})
+    return r.status_code, time.perf_counter() - start
+
+
+async def burst(base, n):
+    limits = httpx.Limits(max_connections=n)
+    async with httpx.AsyncClient(base_url=base, timeout=60, limits=limits) as client:
+        return await asyncio.gather(*(one(client, i) for i in range(n)))
+
+
+def main(n, capacity):
+    STUB_CONFIG["max_concurrency"] = capacity
+    base = serve_in_thread(app=app)
+    print(f"stub: {capacity} concurrent chat calls, ~{STUB_CONFIG['latency_ms'] + STUB_CONFIG['tokens'] * STUB_CONFIG['token_ms']:.0f}ms each; "
+          f"burst of {n}")
+    print(f"{'mode':<32}{'ok':>6}{'503':>6}{'other':>7}{'ok p50 ms':>11}{'ok p99 ms':>11}{'503 p50 ms':>12}{'limit after':>13}")
+    for name, policy in MODES:
+        limiter = scheduler.scheduler.limiters["chat"] = Limiter("chat", policy)
+        shed_before = sum(v for k, v in UPSTREAM_SHED.values.items() if k[0] == "chat")
+        results = asyncio.run(burst(base, n))
+        ok = sorted(t for status, t in results if status == 200)
+        shed_times = sorted(t for status, t in results if status == 503)
+        shed = len(shed_times)
+        other = len(results) - len(ok) - shed
+        p50 = statistics.median(ok) * 1000 if ok else 0
+        p99 = ok[min(len(ok) - 1, int(len(ok) * 0.99))] * 1000 if ok else 0
+        assert shed == sum(v for k, v in UPSTREAM_SHED.values.items() if k[0] == "chat") - shed_before
+        shed_p50 = f"{statistics.median(shed_times) * 1000:.1f}" if shed_times else "-"
+        limit = limiter.slots if policy.queue else "-"
+        print(f"{name:<32}{len(ok):>6}{shed:>6}{other:>7}{p50:>11.1f}{p99:>11.1f}{shed_p50:>12}{limit:>13}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 200, int(sys.argv[2]) if len(sys.argv) > 2 else 16)
@@ -0,0 +1,67 @@
+"""Benchmark: in-memory Store vs journal-backed DurableStore write throughput."""
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+
+from store import Store, DurableStore
+
+WRITES_PER_THREAD = 5000
+
+
+def make_log(i):
+    return {
+        "uid": f"user{i % 100}", "muscles": ["chest", "triceps"], "effort": 7, "soreness": i % 10,
+        "duration_min": 45, "ts": datetime.now(timezone.utc),
+    }
+
+
+def run(store, threads):
+    """Write from `threads` concurrent writers and return writes/sec."""
+    errors = []
+
+    def writer(t):
+        try:
+            for i in range(WRITES_PER_THREAD):
+                store.log_workout(f"user{(t * WRITES_PER_THREAD + i) % 100}", make_log(i))
+        except BaseException as e:
+            errors.append(e)
+    workers = [threading.Thread(target=writer, args=(t,)) for t in range(threads)]
+    start = time.perf_counter()
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    store.close()
+    if errors:
+        raise errors[0]
+    elapsed = time.perf_counter() - start
+    return threads * WRITES_PER_THREAD / elapsed
+
+
+def main():
+    print(f"{'backend':<28}{'threads':>8}{'writes/s':>12}{'fsyncs':>10}")
+    for threads in (1, 4, 16):
+        # The in-memory Store is event-loop-only (not thread-safe), so it gets one writer
+        if threads == 1:
+            print(f"{'memory':<28}{threads:>8}{run(Store(), threads):>12.0f}{'-':>10}")
+        for wait in (False, True):
+            directory = tempfile.mkdtemp(prefix="vitalis-bench-")
+            try:
+                store = DurableStore(directory, wait_durable=wait)
+                rate = run(store, threads)
+                name = "durable (wait fsync)" if wait else "durable (group commit)"
+                print(f"{name:<28}{threads:>8}{rate:>12.0f}{store.journal.commits:>10}")
+                start = time.perf_counter()
+                DurableStore(directory).close()
+                print(f"{'  replay on startup':<28}{'':>8}{(time.perf_counter() - start) * 1000:>10.1f}ms")
+            finally:
+                shutil.rmtree(directory)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1:
+        WRITES_PER_THREAD = int(sys.argv[1])
+    main()
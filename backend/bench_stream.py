@@ -0,0 +1,73 @@
+"""Benchmark: /chat/stream chunks per reply and time-to-first-token.
+
+Runs the app in-process against stub_upstream and compares per-delta flushing
+(the old behaviour, FLUSH_BYTES=0) with the coalescing pipeline, in plain and
+SSE modes. Usage: python bench_stream.py [replies]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import threading
+import time
+
+import httpx
+import uvicorn
+
+from stub_upstream import STUB_CONFIG, free_port, serve_in_thread, stub_env
+
+STUB_BASE = serve_in_thread()
+os.environ.update(stub_env(STUB_BASE))
+os.environ.setdefault("VITALIS_RATE_CHAT_STREAM", "1000000/1")
+
+import streaming  # noqa: E402
+from app import app  # noqa: E402
+
+
+def start_app() -> str:
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+async def one_reply(client, base, i, sse):
+    start = time.perf_counter()
+    ttft, chunks = None, 0
+    params = {"format": "sse"} if sse else None
+    async with client.stream("POST", f"{base}/chat/stream", params=params,
+                             json={"uid": f"bench{i}", "message": "How long should I rest?"}) as resp:
+        async for chunk in resp.aiter_raw():
+            if ttft is None:
+                ttft = time.perf_counter() - start
+            chunks += 1
+    return ttft, chunks, time.perf_counter() - start
+
+
+async def run(base, replies, sse):
+    async with httpx.AsyncClient(timeout=60) as client:
+        results = await asyncio.gather(*(one_reply(client, base, i, sse) for i in range(replies)))
+    ttfts, chunks, totals = zip(*results)
+    return statistics.median(ttfts) * 1000, statistics.mean(chunks), statistics.median(totals) * 1000
+
+
+def main(replies):
+    base = start_app()
+    print(f"stub: {STUB_CONFIG['tokens']:.0f} tokens/reply, {STUB_CONFIG['token_ms']:.0f}ms apart; {replies} concurrent replies")
+    print(f"{'mode':<34}{'chunks/reply':>14}{'TTFT p50 ms':>14}{'total p50 ms':>14}")
+    default_bytes = streaming.FLUSH_BYTES
+    for name, flush_bytes, sse in [
+        ("per-delta flush (before)", 0, False),
+        (f"coalesced {streaming.FLUSH_SECONDS * 1000:.0f}ms/{default_bytes}B", default_bytes, False),
+        ("coalesced, SSE framing", default_bytes, True),
+    ]:
+        streaming.FLUSH_BYTES = flush_bytes
+        ttft, chunks, total = asyncio.run(run(base, replies, sse))
+        print(f"{name:<34}{chunks:>14.1f}{ttft:>14.1f}{total:>14.1f}")
+    streaming.FLUSH_BYTES = default_bytes
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 50)
@@ -0,0 +1,83 @@
+"""Memory benchmark: server peak RSS for /speech-to-text uploads of growing size.
+
+Each clip size is uploaded to a fresh uvicorn process (so VmHWM reflects only
+that request) whose secrets point at stub_upstream. Linux only (/proc).
+Usage: python bench_stt.py [max_mb]
+"""
+import os
+import subprocess
+import sys
+import tempfile
+import time
+import wave
+
+import httpx
+
+from stub_upstream import free_port, serve_in_thread, stub_env
+
+
+def make_wav(path, megabytes, rate=44100, channels=2):
+    """Write a silent 16-bit WAV of roughly `megabytes` MiB without holding it in memory."""
+    frame = 2 * channels
+    frames = megabytes * 2**20 // frame
+    block = b"\0" * (frame * rate)
+    with wave.open(path, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        for _ in range(frames // rate):
+            w.writeframes(block)
+
+
+def proc_kib(pid, field):
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith(field):
+                return int(line.split()[1])
+    return 0
+
+
+def measure(path, env, downmix):
+    port = free_port()
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--log-level", "warning"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    base = f"http://127.0.0.1:{port}"
+    try:
+        for _ in range(100):
+            try:
+                httpx.get(base + "/")
+                break
+            except httpx.TransportError:
+                time.sleep(0.1)
+        idle = proc_kib(server.pid, "VmRSS")
+        start = time.perf_counter()
+        with open(path, "rb") as f:
+            resp = httpx.post(f"{base}/speech-to-text", params={"downmix": downmix},
+                              files={"file": ("clip.wav", f, "audio/wav")}, timeout=300)
+        elapsed = time.perf_counter() - start
+        return resp.status_code, (proc_kib(server.pid, "VmHWM") - idle) / 1024, elapsed
+    finally:
+        server.terminate()
+        server.wait()
+
+
+def main(max_mb):
+    base = serve_in_thread()
+    env = dict(os.environ, **stub_env(base), VITALIS_STT_MAX_MB=str(max_mb * 2))
+    sizes = [s for s in (1, 10, 50, 100, 200) if s <= max_mb]
+    print(f"{'clip MiB':>9}{'mode':>10}{'status':>8}{'peak RSS growth MiB':>22}{'seconds':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for size in sizes:
+            path = os.path.join(tmp, f"clip{size}.wav")
+            make_wav(path, size)
+            for downmix in (False, True):
+                status, growth, elapsed = measure(path, env, downmix)
+                mode = "downmix" if downmix else "stream"
+                print(f"{size:>9}{mode:>10}{status:>8}{growth:>22.1f}{elapsed:>10.2f}")
+            os.remove(path)
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
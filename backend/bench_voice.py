@@ -0,0 +1,77 @@
+"""Benchmark: time to first audio, three calls (STT, /chat, TTS) vs /voice-turn.
+
+Runs the app in-process against stub_upstream. The three-call flow is what the
+frontend does today: wait for the transcript, wait for the whole chat reply,
+then stream TTS of the whole reply. /voice-turn streams the reply and starts
+TTS at the first sentence. The TTS cache is disabled so every clip is
+synthesized. Usage: python bench_voice.py [turns]
+"""
+import asyncio
+import os
+import statistics
+import sys
+import tempfile
+import time
+
+import httpx
+
+from loadtest import wav_clip
+from stub_upstream import STUB_CONFIG, serve_in_thread, stub_env
+
+STUB_BASE = serve_in_thread()
+os.environ.update(stub_env(STUB_BASE))
+for endpoint in ("CHAT", "SPEECH_TO_TEXT", "TEXT_TO_SPEECH", "VOICE_TURN"):
+    os.environ[f"VITALIS_RATE_{endpoint}"] = "1000000/1"
+os.environ["VITALIS_TTS_CACHE_MB"] = "0"
+os.environ["VITALIS_TTS_CACHE_DIR"] = tempfile.mkdtemp(prefix="vitalis-bench-voice-")
+
+from app import app  # noqa: E402
+
+CLIP = wav_clip()
+
+
+async def first_byte(response: httpx.Response, start: float) -> float:
+    first = None
+    async for chunk in response.aiter_raw():
+        if chunk and first is None:
+            first = time.perf_counter() - start
+    return first
+
+
+async def three_calls(client, i):
+    start = time.perf_counter()
+    r = await client.post("/speech-to-text", files={"file": ("clip.wav", CLIP, "audio/wav")})
+    transcript = r.json()["transcription"]
+    r = await client.post("/chat", json={"message": f"{transcript} ({i})", "cache": False})
+    reply = r.json()["response"]
+    async with client.stream("POST", "/text-to-speech", json={"text": reply, "format": "audio"}) as r:
+        return await first_byte(r, start), time.perf_counter() - start
+
+
+async def voice_turn(client, i):
+    start = time.perf_counter()
+    files = {"file": ("clip.wav", CLIP, "audio/wav")}
+    async with client.stream("POST", "/voice-turn", params={"format": "audio"}, files=files) as r:
+        r.raise_for_status()
+        return await first_byte(r, start), time.perf_counter() - start
+
+
+async def run(base, flow, turns):
+    async with httpx.AsyncClient(base_url=base, timeout=60) as client:
+        results = await asyncio.gather(*(flow(client, i) for i in range(turns)))
+    firsts, totals = zip(*results)
+    return statistics.median(firsts) * 1000, statistics.median(totals) * 1000
+
+
+def main(turns):
+    base = serve_in_thread(app=app)
+    print(f"stub: {STUB_CONFIG['latency_ms']:.0f}ms to first byte, {STUB_CONFIG['tokens']:.0f} tokens "
+          f"{STUB_CONFIG['token_ms']:.0f}ms apart; {turns} concurrent turns")
+    print(f"{'flow':<28}{'first audio p50 ms':>20}{'total p50 ms':>14}")
+    for name, flow in [("STT + /chat + TTS (before)", three_calls), ("/voice-turn", voice_turn)]:
+        first, total = asyncio.run(run(base, flow, turns))
+        print(f"{name:<28}{first:>20.1f}{total:>14.1f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 10)
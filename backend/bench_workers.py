@@ -0,0 +1,112 @@
+"""Benchmark: throughput and consistency from 1 to N uvicorn workers, per store backend.
+
+Starts `uvicorn app:app --workers N` against stub_upstream with either the
+in-process Store or a shared SQLiteStore (VITALIS_STORE_DB), then drives a
+log-and-read mix (1 POST /log/workout per 3 GET /recovery) and reports req/s.
+It also checks what users would see across workers: how many of 10 rapid
+/chat calls pass a 5/hour rate limit, and how many reads miss a just-logged
+workout. Throughput only scales with free cores; the load generator runs in
+this process and takes one of them.
+
+Usage: python bench_workers.py [requests] [max_workers]
+"""
+import asyncio
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from stub_upstream import free_port, serve_in_thread, stub_env
+
+CONCURRENCY = 32
+USERS = 1000
+LOG = {"muscles": ["chest", "triceps"], "effort": 7, "soreness": 3, "duration_min": 45}
+
+
+def start_app(workers: int, env: dict) -> tuple:
+    port = free_port()
+    proc = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "app:app", "--port", str(port), "--workers", str(workers),
+         "--log-level", "warning", "--no-access-log"],
+        env=env, cwd=os.path.dirname(os.path.abspath(__file__)),
+    )
+    base = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(base + "/", timeout=1)
+            break
+        except httpx.TransportError:
+            time.sleep(0.1)
+    # Give the remaining workers time to come up before measuring
+    time.sleep(1 + 0.5 * workers)
+    return proc, base
+
+
+async def drive(base: str, total: int) -> float:
+    """Run the log/read mix with CONCURRENCY connections; return requests per second."""
+    limits = httpx.Limits(max_connections=CONCURRENCY, max_keepalive_connections=CONCURRENCY)
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=30) as client:
+        rng = random.Random(0)
+
+        async def worker(n):
+            for i in range(n):
+                uid = f"user{rng.randrange(USERS)}"
+                if i % 4 == 0:
+                    r = await client.post("/log/workout", json=dict(LOG, uid=uid))
+                else:
+                    r = await client.get("/recovery", params={"uid": uid})
+                r.raise_for_status()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(total // CONCURRENCY) for _ in range(CONCURRENCY)))
+        return (total // CONCURRENCY * CONCURRENCY) / (time.perf_counter() - start)
+
+
+def consistency(base: str) -> tuple:
+    """(allowed /chat calls out of 10 at 5/hour, stale reads out of 20) using fresh connections."""
+    allowed = 0
+    for _ in range(10):
+        with httpx.Client(base_url=base, timeout=30) as c:
+            allowed += c.post("/chat", json={"uid": "limited", "message": "hi"}).status_code == 200
+    stale = 0
+    for i in range(20):
+        uid = f"fresh{i}"
+        with httpx.Client(base_url=base, timeout=30) as c:
+            c.post("/log/workout", json=dict(LOG, uid=uid)).raise_for_status()
+        with httpx.Client(base_url=base, timeout=30) as c:
+            stale += c.get("/recovery", params={"uid": uid}).json()["muscle_scores"]["chest"] == 100
+    return allowed, stale
+
+
+def main(total: int, max_workers: int):
+    upstream = serve_in_thread()
+    counts = [n for n in (1, 2, 4, 8) if n <= max_workers]
+    print(f"{total} requests per run, concurrency {CONCURRENCY}, {os.cpu_count()} CPUs")
+    print(f"{'backend':<10}{'workers':>8}{'req/s':>10}{'chat ok/10':>12}{'stale/20':>10}")
+    for backend in ("memory", "sqlite"):
+        for workers in counts:
+            with tempfile.TemporaryDirectory() as tmp:
+                env = dict(os.environ, **stub_env(upstream), VITALIS_RATE_CHAT="5/3600")
+                env.pop("VITALIS_STORE_DIR", None)
+                env.pop("VITALIS_STORE_DB", None)
+                if backend == "sqlite":
+                    env["VITALIS_STORE_DB"] = os.path.join(tmp, "store.db")
+                env["VITALIS_TTS_CACHE_DIR"] = os.path.join(tmp, "tts")
+                proc, base = start_app(workers, env)
+                try:
+                    rate = asyncio.run(drive(base, total))
+                    allowed, stale = consistency(base)
+                finally:
+                    proc.terminate()
+                    proc.wait()
+            print(f"{backend:<10}{workers:>8}{rate:>10.0f}{allowed:>12}{stale:>10}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 4000,
+         int(sys.argv[2]) if len(sys.argv) > 2 else max(2, min(8, os.cpu_count() or 1)))
@@ -0,0 +1,65 @@
+"""Benchmark: memory per log and recovery time, dict logs vs WorkoutColumns.
+
+Builds N logs shaped like the ones /log/workout stores (a dict with a tz-aware
+datetime and a list of muscle names), measures their memory with tracemalloc,
+then does the same for the compact columns. It also times building a recovery
+summary from each form. Usage: python bench_workout_log.py [logs]
+"""
+import random
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timedelta, timezone
+
+from recovery import COMMON_MUSCLES, MuscleSummary, calc_recovery_from_summary
+from workout_log import WorkoutColumns
+
+
+def make_logs(n, now):
+    rng = random.Random(0)
+    return [{
+        "uid": "user1",
+        "muscles": rng.sample(COMMON_MUSCLES, rng.randint(1, 4)),
+        "effort": rng.randint(1, 10),
+        "soreness": rng.randint(0, 10),
+        "duration_min": rng.randint(10, 90),
+        "ts": now - timedelta(seconds=rng.randrange(365 * 86400)),
+    } for _ in range(n)]
+
+
+def measure(build):
+    tracemalloc.start()
+    value = build()
+    size = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return value, size
+
+
+def timed(fn):
+    start = time.perf_counter()
+    result = fn()
+    return result, time.perf_counter() - start
+
+
+def main(n):
+    now = datetime.now(timezone.utc)
+    logs, dict_bytes = measure(lambda: make_logs(n, now))
+
+    def build_columns():
+        columns = WorkoutColumns("user1")
+        columns.extend(logs)
+        return columns
+    columns, column_bytes = measure(build_columns)
+
+    full, dict_time = timed(lambda: MuscleSummary.from_logs(logs))
+    compact, column_time = timed(lambda: MuscleSummary.from_rows(columns.rows()))
+    assert calc_recovery_from_summary(full, now) == calc_recovery_from_summary(compact, now)
+
+    print(f"{n} logs")
+    print(f"{'form':<16}{'bytes/log':>12}{'total MiB':>12}{'summary s':>12}")
+    print(f"{'dicts':<16}{dict_bytes / n:>12.1f}{dict_bytes / 2**20:>12.1f}{dict_time:>12.3f}")
+    print(f"{'columns':<16}{column_bytes / n:>12.1f}{column_bytes / 2**20:>12.1f}{column_time:>12.3f}")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 1_000_000)
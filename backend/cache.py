@@ -0,0 +1,106 @@
+"""Response caching with single-flight coalescing of concurrent identical requests."""
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Hashable, Optional, Tuple
+import asyncio
+import hashlib
+import json
+import time
+
+
+class TTLCache:
+    """Bounded LRU cache whose entries also expire `ttl` seconds after being set."""
+    def __init__(self, maxsize: int, ttl: float, clock: Callable[[], float] = time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.clock = clock
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None if missing or expired."""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires, value = entry
+        if expires <= self.clock():
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return value
+
+    def set(self, key: Hashable, value: Any):
+        """Store a value, evicting the least recently used entry if full."""
+        self._entries[key] = (self.clock() + self.ttl, value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+
+class SingleFlight:
+    """Run at most one in-flight call per key; concurrent callers share its result.
+
+    The call runs in a task owned by the flight rather than by the first caller,
+    so a caller that goes away (e.g. a client disconnect cancelling its request)
+    only stops waiting: the others still get the result.
+    """
+    def __init__(self):
+        self._calls: Dict[Hashable, asyncio.Task] = {}
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[Any]]) -> Tuple[Any, bool]:
+        """Return (result, shared) where shared is True if another caller's call was reused."""
+        task = self._calls.get(key)
+        shared = task is not None
+        if task is None:
+            task = self._calls[key] = asyncio.ensure_future(fn())
+            task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task), shared
+
+    def _finish(self, key: Hashable, task: asyncio.Task):
+        if self._calls.get(key) is task:
+            del self._calls[key]
+        if not task.cancelled():
+            # Mark retrieved so a call every caller abandoned does not log a warning
+            task.exception()
+
+
+class ResponseCache:
+    """TTL/LRU cache in front of an async fetch, with single-flight coalescing."""
+    def __init__(self, maxsize: int, ttl: float):
+        self.cache = TTLCache(maxsize, ttl)
+        self.flights = SingleFlight()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0, "bypassed": 0}
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]], use_cache: bool = True) -> Tuple[Any, str]:
+        """Return (value, outcome) where outcome is 'hit', 'miss', 'coalesced' or 'bypass'."""
+        if not use_cache:
+            self.stats["bypassed"] += 1
+            return await fetch(), "bypass"
+        value = self.cache.get(key)
+        if value is not None:
+            self.stats["hits"] += 1
+            return value, "hit"
+
+        async def fetch_and_store():
+            result = await fetch()
+            self.cache.set(key, result)
+            return result
+
+        value, shared = await self.flights.do(key, fetch_and_store)
+        self.stats["coalesced" if shared else "misses"] += 1
+        return value, "coalesced" if shared else "miss"
+
+    def snapshot(self) -> dict:
+        """Counters plus current size, for the stats endpoint."""
+        return dict(self.stats, size=len(self.cache))
+
+
+def normalize_prompt(text: str) -> str:
+    """Case- and whitespace-insensitive form of a prompt, ignoring trailing punctuation."""
+    return " ".join(text.lower().split()).rstrip(" ?!.")
+
+
+def cache_key(**params: Any) -> str:
+    """Stable hash of the request parameters that determine a completion."""
+    return hashlib.sha256(json.dumps(params, sort_keys=True).encode()).hexdigest()
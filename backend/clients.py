@@ -0,0 +1,84 @@
+"""Shared, lifespan-managed HTTP and Azure OpenAI clients."""
+from typing import Dict, Optional, Tuple
+import os
+
+import httpx
+from openai import AsyncAzureOpenAI
+
+POOL_MAX_CONNECTIONS = int(os.environ.get("VITALIS_POOL_MAX_CONNECTIONS", "100"))
+POOL_MAX_KEEPALIVE = int(os.environ.get("VITALIS_POOL_MAX_KEEPALIVE", "20"))
+POOL_KEEPALIVE_EXPIRY = float(os.environ.get("VITALIS_POOL_KEEPALIVE_EXPIRY", "30"))
+CONNECT_TIMEOUT = float(os.environ.get("VITALIS_CONNECT_TIMEOUT", "5"))
+READ_TIMEOUT = float(os.environ.get("VITALIS_READ_TIMEOUT", "60"))
+HTTP2 = os.environ.get("VITALIS_HTTP2", "1") == "1"
+
+
+def _http2_available() -> bool:
+    """HTTP/2 needs the optional h2 package (pip install httpx[http2])."""
+    try:
+        import h2  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+class ClientRegistry:
+    """Owns one pooled httpx.AsyncClient and the Azure OpenAI clients built on it.
+
+    Every upstream call reuses the same connection pool, so TLS handshakes and
+    client construction happen once per process instead of once per request.
+    """
+    def __init__(
+        self,
+        http2: bool = HTTP2,
+        limits: Optional[httpx.Limits] = None,
+        timeout: Optional[httpx.Timeout] = None,
+    ):
+        self.http2 = http2 and _http2_available()
+        self.limits = limits or httpx.Limits(
+            max_connections=POOL_MAX_CONNECTIONS,
+            max_keepalive_connections=POOL_MAX_KEEPALIVE,
+            keepalive_expiry=POOL_KEEPALIVE_EXPIRY,
+        )
+        self.timeout = timeout or httpx.Timeout(READ_TIMEOUT, connect=CONNECT_TIMEOUT)
+        self._http: Optional[httpx.AsyncClient] = None
+        self._openai: Dict[Tuple[str, str, str], AsyncAzureOpenAI] = {}
+
+    @property
+    def http(self) -> httpx.AsyncClient:
+        """The shared pooled HTTP client, created on first use."""
+        if self._http is None or self._http.is_closed:
+            self._http = httpx.AsyncClient(http2=self.http2, limits=self.limits, timeout=self.timeout)
+            self._openai.clear()
+        return self._http
+
+    def openai(self, endpoint: str, api_key: str, api_version: str) -> AsyncAzureOpenAI:
+        """Get the Azure OpenAI client for these credentials, sharing the HTTP pool."""
+        http = self.http
+        key = (endpoint, api_key, api_version)
+        client = self._openai.get(key)
+        if client is None:
+            client = AsyncAzureOpenAI(
+                api_key=api_key,
+                azure_endpoint=endpoint,
+                api_version=api_version,
+                http_client=http,
+                # Retries are done by the scheduler, which also knows about deadlines
+                max_retries=0,
+            )
+            self._openai[key] = client
+        return client
+
+    async def start(self):
+        """Open the connection pool (called from the app lifespan)."""
+        _ = self.http
+
+    async def close(self):
+        """Close the connection pool and drop cached clients."""
+        self._openai.clear()
+        if self._http is not None:
+            await self._http.aclose()
+            self._http = None
+
+
+clients = ClientRegistry()
@@ -0,0 +1,16 @@
+"""Shared pytest fixtures."""
+import pytest
+
+
+class FakeClock:
+    """A clock for injected `clock=` parameters that only moves when a test sets `now`."""
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock() -> FakeClock:
+    return FakeClock()
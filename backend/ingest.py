@@ -0,0 +1,161 @@
+"""Streaming parsing and bulk validation for batch workout ingestion."""
+from typing import Any, AsyncIterator, List, Tuple
+import codecs
+import json
+import re
+
+from pydantic import TypeAdapter, ValidationError
+
+from models import WorkoutLog
+
+VALIDATE_CHUNK = 1000
+# Longest single record (in characters) buffered while waiting for the rest of it
+MAX_RECORD_CHARS = 64 * 1024
+
+_logs_adapter = TypeAdapter(List[WorkoutLog])
+_decoder = json.JSONDecoder()
+# Whole strings (skipped as one token), an unterminated string, and brackets
+_STRUCTURE = re.compile(r'"(?:[^"\\]|\\.)*"|"|[\[\]{}]')
+_SCALAR_END = re.compile(r"[\s,\]]")
+
+
+class ParseError(Exception):
+    """A record (or the array framing) could not be parsed as JSON."""
+
+
+async def iter_ndjson(chunks: AsyncIterator[bytes], max_record: int = MAX_RECORD_CHARS) -> AsyncIterator[Any]:
+    """Yield one parsed value (or ParseError) per non-empty line of an NDJSON body.
+
+    A line longer than max_record is reported as a ParseError and skipped
+    without being buffered.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    pending, skipping = "", False
+    async for chunk in chunks:
+        pending += decoder.decode(chunk)
+        *lines, pending = pending.split("\n")
+        for line in lines:
+            if skipping:
+                # The end of an oversized line already reported
+                skipping = False
+            elif len(line) > max_record:
+                yield _too_long(max_record)
+            elif line.strip():
+                yield _parse(line)
+        if len(pending) > max_record:
+            if not skipping:
+                yield _too_long(max_record)
+            pending, skipping = "", True
+    pending += decoder.decode(b"", final=True)
+    if pending.strip() and not skipping:
+        yield _parse(pending)
+
+
+def _parse(line: str) -> Any:
+    try:
+        return json.loads(line)
+    except ValueError as e:
+        return ParseError(f"Invalid JSON: {e}")
+
+
+def _too_long(max_record: int) -> ParseError:
+    return ParseError(f"Record longer than {max_record} characters")
+
+
+def _element_complete(buf: str, pos: int) -> bool:
+    """True if the JSON value starting at buf[pos] ends within buf, so a decode error is final."""
+    if buf[pos] == '"':
+        return _STRUCTURE.match(buf, pos).group() != '"'
+    if buf[pos] not in "[{":
+        return _SCALAR_END.search(buf, pos) is not None
+    depth = 0
+    for match in _STRUCTURE.finditer(buf, pos):
+        token = match.group()
+        if token == '"':
+            return False
+        if token in "[{":
+            depth += 1
+        elif token in "]}":
+            depth -= 1
+            if depth == 0:
+                return True
+    return False
+
+
+async def iter_json_array(chunks: AsyncIterator[bytes], max_record: int = MAX_RECORD_CHARS) -> AsyncIterator[Any]:
+    """Yield the elements of a top-level JSON array as they arrive.
+
+    Framing errors (not an array, missing or extra commas, truncated body), an
+    element that is invalid JSON, and an element longer than max_record raise
+    ParseError as soon as they are seen; everything before that point has
+    already been yielded.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")()
+    buf, pos, offset, eof = "", 0, 0, False
+    # What comes next: the opening bracket, the first element or "]", an element, or "," / "]"
+    expect = "open"
+    it = chunks.__aiter__()
+    while True:
+        while pos < len(buf) and buf[pos].isspace():
+            pos += 1
+        if pos < len(buf):
+            char = buf[pos]
+            if expect == "open":
+                if char != "[":
+                    raise ParseError("Expected a JSON array or NDJSON body")
+                expect, pos = "first", pos + 1
+                continue
+            if expect == "separator":
+                if char == "]":
+                    return
+                if char != ",":
+                    raise ParseError(f"Expected ',' or ']' at offset {offset + pos}")
+                expect, pos = "element", pos + 1
+                continue
+            if char == "]" and expect == "first":
+                return
+            if char in ",]":
+                raise ParseError(f"Expected a value at offset {offset + pos}")
+            try:
+                value, end = _decoder.raw_decode(buf, pos)
+            except ValueError as e:
+                if eof or _element_complete(buf, pos):
+                    raise ParseError(f"Invalid JSON at offset {offset + pos}: {e}")
+            else:
+                # A number may continue in the next chunk ("12" then ".5") until a delimiter follows it
+                if eof or (end < len(buf) and (buf[pos] in '[{"' or _SCALAR_END.match(buf, end))):
+                    yield value
+                    expect, pos = "separator", end
+                    continue
+            if len(buf) - pos > max_record:
+                raise ParseError(f"Record at offset {offset + pos} is longer than {max_record} characters")
+        if eof:
+            raise ParseError("Unexpected end of JSON array")
+        offset += pos
+        try:
+            chunk = await it.__anext__()
+            buf = buf[pos:] + decoder.decode(chunk)
+        except StopAsyncIteration:
+            buf, eof = buf[pos:] + decoder.decode(b"", final=True), True
+        pos = 0
+
+
+def validate_chunk(records: List[Tuple[int, Any]]) -> Tuple[List[WorkoutLog], List[Tuple[int, str]]]:
+    """Validate (index, record) pairs in one pydantic call; return (valid logs, errors).
+
+    If any record fails, the failing indices are taken from the error locations
+    and the remaining records are validated again in a single call.
+    """
+    errors: List[Tuple[int, str]] = []
+    values = [r for _, r in records]
+    try:
+        return _logs_adapter.validate_python(values), errors
+    except ValidationError as e:
+        bad = {}
+        for err in e.errors():
+            pos = err["loc"][0]
+            field = ".".join(str(part) for part in err["loc"][1:])
+            bad.setdefault(pos, f"{field}: {err['msg']}" if field else err["msg"])
+    errors = [(records[pos][0], msg) for pos, msg in sorted(bad.items())]
+    good = [r for pos, (_, r) in enumerate(records) if pos not in bad]
+    return _logs_adapter.validate_python(good), errors
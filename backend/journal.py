@@ -0,0 +1,232 @@
+"""Append-only journal with group-commit fsync and snapshot compaction."""
+from typing import Callable, List, Optional, Tuple
+import asyncio
+import json
+import os
+import threading
+
+JOURNAL_FILE = "journal.log"
+SNAPSHOT_FILE = "snapshot.json"
+
+
+class JournalError(Exception):
+    """The commit thread failed to write or fsync; nothing appended since is durable."""
+
+
+def _resolve(future: asyncio.Future, error: Optional[BaseException]):
+    if future.done():
+        return
+    if error is None:
+        future.set_result(None)
+    else:
+        future.set_exception(error)
+
+
+class _Snapshot:
+    """Marker queued between journal records: write the state build() returns as of `seq`."""
+    __slots__ = ("seq", "build")
+
+    def __init__(self, seq: int, build: Callable[[], dict]):
+        self.seq = seq
+        self.build = build
+
+
+class Journal:
+    """Append-only JSON-lines journal written by one background commit thread.
+
+    Callers only enqueue records. The writer thread takes everything queued since
+    its last fsync, writes it in one go and fsyncs once, so concurrent writers share
+    the cost of each fsync (group commit). A queued snapshot replaces the journal:
+    the snapshot file is written atomically and the journal is truncated, so startup
+    replays one snapshot plus the short tail written after it. Snapshots are built
+    and serialized on the writer thread, never by the caller.
+    """
+    def __init__(self, directory: str):
+        os.makedirs(directory, exist_ok=True)
+        self.directory = directory
+        self.journal_path = os.path.join(directory, JOURNAL_FILE)
+        self.snapshot_path = os.path.join(directory, SNAPSHOT_FILE)
+        self.commits = 0
+        self._cond = threading.Condition()
+        self._pending: list = []
+        self._seq = 0
+        self._durable_seq = 0
+        self._closed = False
+        self._error: Optional[BaseException] = None
+        # (seq, loop, future) for wait_async callers
+        self._waiters: list = []
+        self._file = None
+        self._thread: Optional[threading.Thread] = None
+
+    def replay(self) -> Tuple[Optional[dict], List[dict]]:
+        """Return the last snapshot state and the journal records written after it."""
+        state, snap_seq = None, 0
+        if os.path.exists(self.snapshot_path):
+            with open(self.snapshot_path, "rb") as f:
+                snap = json.loads(f.read())
+            state, snap_seq = snap["state"], snap["seq"]
+        records = []
+        if os.path.exists(self.journal_path):
+            good = 0
+            with open(self.journal_path, "r+b") as f:
+                for line in f:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash mid-commit: drop it so new appends start clean
+                        f.truncate(good)
+                        break
+                    good += len(line)
+                    if record["seq"] > snap_seq:
+                        records.append(record)
+        self._seq = max([snap_seq] + [r["seq"] for r in records])
+        self._durable_seq = self._seq
+        return state, records
+
+    def start(self):
+        """Open the journal for appending and start the commit thread."""
+        self._file = open(self.journal_path, "ab")
+        self._thread = threading.Thread(target=self._run, name="journal-commit", daemon=True)
+        self._thread.start()
+
+    def append(self, record: dict) -> int:
+        """Queue a record for the next group commit and return its sequence number."""
+        with self._cond:
+            self._check()
+            self._seq += 1
+            record["seq"] = self._seq
+            self._pending.append(json.dumps(record, separators=(",", ":")).encode() + b"\n")
+            self._cond.notify()
+            return self._seq
+
+    def snapshot(self, build: Callable[[], dict]):
+        """Queue a snapshot; build() runs later on the commit thread.
+
+        It must return the state as of every record appended so far, even though
+        more may have been applied by the time it runs (see DurableStore._snapshot).
+        """
+        with self._cond:
+            self._check()
+            self._pending.append(_Snapshot(self._seq, build))
+            self._cond.notify()
+
+    def wait(self, seq: int, timeout: Optional[float] = None) -> bool:
+        """Block until record `seq` has been fsynced; JournalError if the commit thread failed first."""
+        with self._cond:
+            done = self._cond.wait_for(lambda: self._durable_seq >= seq or self._error is not None, timeout)
+            if self._durable_seq < seq:
+                self._check()
+            return done
+
+    @property
+    def last_seq(self) -> int:
+        """Sequence number of the latest appended record."""
+        with self._cond:
+            return self._seq
+
+    def wait_async(self, seq: int) -> "asyncio.Future":
+        """Future on the running loop, resolved once record `seq` is fsynced (or failed with JournalError).
+
+        The commit thread resolves it, so an event loop can await durability
+        without blocking in wait().
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        with self._cond:
+            if self._durable_seq >= seq:
+                future.set_result(None)
+            elif self._error is not None:
+                future.set_exception(self._failure())
+            else:
+                self._waiters.append((seq, loop, future))
+        return future
+
+    def _wake_async(self):
+        """Resolve wait_async futures that are now durable (or all of them, failed, after an error)."""
+        ready = [w for w in self._waiters if w[0] <= self._durable_seq or self._error is not None]
+        if not ready:
+            return
+        self._waiters = [w for w in self._waiters if w[0] > self._durable_seq and self._error is None]
+        for seq, loop, future in ready:
+            error = self._failure() if seq > self._durable_seq else None
+            try:
+                loop.call_soon_threadsafe(_resolve, future, error)
+            except RuntimeError:
+                # That loop is closed; nobody is waiting any more
+                pass
+
+    def _failure(self) -> JournalError:
+        error = JournalError(f"journal commit failed: {self._error!r}")
+        error.__cause__ = self._error
+        return error
+
+    def _check(self):
+        if self._error is not None:
+            raise self._failure()
+
+    def close(self):
+        """Commit everything queued and stop the commit thread."""
+        with self._cond:
+            self._closed = True
+            self._cond.notify()
+        if self._thread:
+            self._thread.join()
+        if self._file:
+            self._file.close()
+
+    def _run(self):
+        try:
+            self._commit_loop()
+        except BaseException as e:
+            # e.g. ENOSPC or EIO: fail every waiter and every later append instead of hanging
+            with self._cond:
+                self._error = e
+                self._cond.notify_all()
+                self._wake_async()
+
+    def _commit_loop(self):
+        while True:
+            with self._cond:
+                self._cond.wait_for(lambda: self._pending or self._closed)
+                batch, self._pending = self._pending, []
+                seq = self._seq
+                if not batch and self._closed:
+                    return
+            buf = []
+            for item in batch:
+                if isinstance(item, _Snapshot):
+                    self._write(buf)
+                    buf = []
+                    self._write_snapshot(item)
+                else:
+                    buf.append(item)
+            self._write(buf)
+            self.commits += 1
+            with self._cond:
+                self._durable_seq = seq
+                self._cond.notify_all()
+                self._wake_async()
+
+    def _write(self, lines: List[bytes]):
+        if lines:
+            self._file.write(b"".join(lines))
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def _write_snapshot(self, snap: _Snapshot):
+        payload = json.dumps({"seq": snap.seq, "state": snap.build()}, separators=(",", ":")).encode()
+        tmp = self.snapshot_path + ".tmp"
+        with open(tmp, "wb") as f:
+            f.write(payload)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.snapshot_path)
+        if hasattr(os, "O_DIRECTORY"):
+            fd = os.open(self.directory, os.O_DIRECTORY)
+            try:
+                os.fsync(fd)
+            finally:
+                os.close(fd)
+        # Records up to snap.seq now live in the snapshot; start a fresh journal
+        self._file.close()
+        self._file = open(self.journal_path, "wb")
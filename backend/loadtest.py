@@ -0,0 +1,293 @@
+"""Offline load test: every API endpoint against stub_upstream, at set concurrency levels.
+
+Starts stub_upstream and the app itself (both in this process, each on its own
+uvicorn thread and local port), then drives each endpoint with N concurrent
+clients. Reports throughput, p50/p95/p99 latency and, for streamed responses,
+time to first byte (TTFT; first audio byte for voice_turn), and writes the results as JSON so runs can be compared:
+
+    python loadtest.py --out before.json
+    python loadtest.py --out after.json --compare before.json
+
+Rate limits are lifted for the run and every chat/TTS request uses a distinct
+input so the upstream path is measured; pass --repeat-inputs to measure the
+cache-hit path instead. --url targets an already running server instead.
+"""
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+import argparse
+import asyncio
+import io
+import json
+import os
+import platform
+import subprocess
+import tempfile
+import time
+import wave
+from datetime import datetime, timezone
+
+import httpx
+
+from stub_upstream import STUB_CONFIG, serve_in_thread, stub_env
+
+ENDPOINTS = ["chat", "chat_stream", "log_workout", "recovery", "speech_to_text", "text_to_speech", "voice_turn"]
+UNLIMITED = "1000000000/1"
+
+# One request: returns (status code, seconds to first body byte or None)
+Call = Callable[[httpx.AsyncClient, int], Awaitable[Tuple[int, Optional[float]]]]
+
+
+def wav_clip(seconds: float = 1.0, rate: int = 16000) -> bytes:
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(1)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        w.writeframes(b"\x00\x00" * int(seconds * rate))
+    return buf.getvalue()
+
+
+async def _first_byte(response: httpx.Response, start: float) -> Optional[float]:
+    ttft = None
+    async for chunk in response.aiter_raw():
+        if chunk and ttft is None:
+            ttft = time.perf_counter() - start
+    return ttft
+
+
+def scenarios(repeat_inputs: bool) -> Dict[str, Call]:
+    """Request builders per endpoint; `i` makes inputs unique unless repeat_inputs."""
+    clip = wav_clip()
+
+    def text(i: int, prefix: str) -> str:
+        return prefix if repeat_inputs else f"{prefix} (request {i})"
+
+    async def chat(client, i):
+        r = await client.post("/chat", json={"uid": f"load{i}", "message": text(i, "How long should I rest?")})
+        return r.status_code, None
+
+    async def chat_stream(client, i):
+        start = time.perf_counter()
+        body = {"uid": f"load{i}", "message": text(i, "Plan my leg day")}
+        async with client.stream("POST", "/chat/stream", json=body) as r:
+            return r.status_code, await _first_byte(r, start)
+
+    async def log_workout(client, i):
+        r = await client.post("/log/workout", json={
+            "uid": f"load{i % 1000}", "muscles": ["quads", "glutes"], "effort": 7, "soreness": 3, "duration_min": 45,
+        })
+        return r.status_code, None
+
+    async def recovery(client, i):
+        r = await client.get("/recovery", params={"uid": f"load{i % 1000}"})
+        return r.status_code, None
+
+    async def speech_to_text(client, i):
+        r = await client.post("/speech-to-text", files={"file": ("clip.wav", clip, "audio/wav")})
+        return r.status_code, None
+
+    async def text_to_speech(client, i):
+        start = time.perf_counter()
+        body = {"text": text(i, "Great set, rest for sixty seconds."), "format": "audio"}
+        async with client.stream("POST", "/text-to-speech", json=body) as r:
+            return r.status_code, await _first_byte(r, start)
+
+    async def voice_turn(client, i):
+        start = time.perf_counter()
+        files = {"file": ("clip.wav", clip, "audio/wav")}
+        async with client.stream("POST", "/voice-turn", params={"format": "audio"}, files=files) as r:
+            return r.status_code, await _first_byte(r, start)
+
+    return {
+        "chat": chat, "chat_stream": chat_stream, "log_workout": log_workout, "recovery": recovery,
+        "speech_to_text": speech_to_text, "text_to_speech": text_to_speech,
+        "voice_turn": voice_turn,
+    }
+
+
+def percentiles(samples: List[float]) -> Optional[Dict[str, float]]:
+    """p50/p95/p99/mean/max in milliseconds (nearest rank), or None without samples."""
+    if not samples:
+        return None
+    ordered = sorted(samples)
+
+    def rank(p):
+        return ordered[min(len(ordered) - 1, int(len(ordered) * p))] * 1000
+    return {
+        "p50": rank(0.50), "p95": rank(0.95), "p99": rank(0.99),
+        "mean": sum(ordered) / len(ordered) * 1000, "max": ordered[-1] * 1000,
+    }
+
+
+async def run_level(base: str, name: str, call: Call, concurrency: int, requests: int, offset: int) -> dict:
+    """Issue `requests` calls with `concurrency` clients in flight; return one result row."""
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    latencies: List[float] = []
+    ttfts: List[float] = []
+    statuses: Dict[str, int] = {}
+    errors = 0
+    counter = iter(range(offset, offset + requests))
+
+    async with httpx.AsyncClient(base_url=base, limits=limits, timeout=60) as client:
+        async def worker():
+            nonlocal errors
+            for i in counter:
+                start = time.perf_counter()
+                try:
+                    status, ttft = await call(client, i)
+                except httpx.HTTPError as e:
+                    status, ttft = type(e).__name__, None
+                latency = time.perf_counter() - start
+                statuses[str(status)] = statuses.get(str(status), 0) + 1
+                if status == 200:
+                    latencies.append(latency)
+                    if ttft is not None:
+                        ttfts.append(ttft)
+                else:
+                    errors += 1
+
+        start = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        wall = time.perf_counter() - start
+    return {
+        "endpoint": name,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "status_counts": statuses,
+        "seconds": wall,
+        "throughput_rps": len(latencies) / wall,
+        "latency_ms": percentiles(latencies),
+        "ttft_ms": percentiles(ttfts),
+    }
+
+
+def start_app(upstream: str, repeat_inputs: bool) -> str:
+    """Point the app at the stub, lift rate limits, and serve it on a local thread."""
+    os.environ.update(stub_env(upstream))
+    for endpoint in ("chat", "chat_stream", "speech_to_text", "text_to_speech", "voice_turn"):
+        os.environ[f"VITALIS_RATE_{endpoint.upper()}"] = UNLIMITED
+    os.environ.setdefault("VITALIS_TTS_CACHE_DIR", tempfile.mkdtemp(prefix="vitalis-load-tts-"))
+    from app import app  # after the environment is set up
+    return serve_in_thread(app=app)
+
+
+def git_revision() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True,
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _ms(stats: Optional[dict], key: str) -> str:
+    return f"{stats[key]:.1f}" if stats else "-"
+
+
+def print_table(results: List[dict]):
+    print(f"{'endpoint':<16}{'conc':>6}{'req/s':>10}{'p50':>9}{'p95':>9}{'p99':>9}{'ttft p50':>10}{'ttft p95':>10}{'errors':>8}")
+    for r in results:
+        lat, ttft = r["latency_ms"], r["ttft_ms"]
+        print(f"{r['endpoint']:<16}{r['concurrency']:>6}{r['throughput_rps']:>10.1f}"
+              f"{_ms(lat, 'p50'):>9}{_ms(lat, 'p95'):>9}{_ms(lat, 'p99'):>9}"
+              f"{_ms(ttft, 'p50'):>10}{_ms(ttft, 'p95'):>10}{r['errors']:>8}")
+
+
+def compare(results: List[dict], baseline: dict) -> List[dict]:
+    """Per (endpoint, concurrency) relative change against a saved run; positive is worse."""
+    before = {(r["endpoint"], r["concurrency"]): r for r in baseline["results"]}
+    rows = []
+    for r in results:
+        old = before.get((r["endpoint"], r["concurrency"]))
+        if old is None:
+            continue
+        row = {"endpoint": r["endpoint"], "concurrency": r["concurrency"]}
+        if old["throughput_rps"]:
+            row["throughput"] = old["throughput_rps"] / r["throughput_rps"] - 1 if r["throughput_rps"] else float("inf")
+        for metric in ("latency_ms", "ttft_ms"):
+            for p in ("p50", "p95", "p99"):
+                if r[metric] and old[metric] and old[metric][p]:
+                    row[f"{metric[:-3]}_{p}"] = r[metric][p] / old[metric][p] - 1
+        rows.append(row)
+    return rows
+
+
+def print_comparison(rows: List[dict], baseline_name: str):
+    print(f"\nchange vs {baseline_name} (positive = slower)")
+    print(f"{'endpoint':<16}{'conc':>6}{'req/s':>9}{'p50':>9}{'p95':>9}{'p99':>9}{'ttft p50':>10}")
+    for row in rows:
+        def pct(key):
+            return f"{row[key] * 100:+.0f}%" if key in row else "-"
+        print(f"{row['endpoint']:<16}{row['concurrency']:>6}{pct('throughput'):>9}{pct('latency_p50'):>9}"
+              f"{pct('latency_p95'):>9}{pct('latency_p99'):>9}{pct('ttft_p50'):>10}")
+
+
+async def run(base: str, endpoints: List[str], levels: List[int], requests: int, repeat_inputs: bool) -> List[dict]:
+    calls = scenarios(repeat_inputs)
+    # Seed the users /recovery reads so it scores real data
+    if "recovery" in endpoints:
+        await run_level(base, "log_workout", calls["log_workout"], 16, 1000, 0)
+    results = []
+    offset = 0
+    for name in endpoints:
+        for concurrency in levels:
+            results.append(await run_level(base, name, calls[name], concurrency, requests, offset))
+            offset += requests
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of " + ",".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=200, help="requests per endpoint and level")
+    parser.add_argument("--latency-ms", type=float, default=STUB_CONFIG["latency_ms"], help="stub time to first byte")
+    parser.add_argument("--token-ms", type=float, default=STUB_CONFIG["token_ms"], help="stub delay between chat tokens")
+    parser.add_argument("--repeat-inputs", action="store_true", help="reuse one input per endpoint (cache hits)")
+    parser.add_argument("--url", help="load an already running server instead of starting one")
+    parser.add_argument("--out", help="write results to this JSON file")
+    parser.add_argument("--compare", help="JSON results of an earlier run to compare against")
+    args = parser.parse_args(argv)
+    unknown = set(args.endpoints.split(",")) - set(ENDPOINTS)
+    if unknown:
+        parser.error(f"unknown endpoints: {', '.join(sorted(unknown))}")
+    return args
+
+
+def main(argv=None) -> dict:
+    args = parse_args(argv)
+    STUB_CONFIG["latency_ms"] = args.latency_ms
+    STUB_CONFIG["token_ms"] = args.token_ms
+    endpoints = args.endpoints.split(",")
+    levels = [int(n) for n in args.concurrency.split(",")]
+    base = args.url or start_app(serve_in_thread(), args.repeat_inputs)
+
+    results = asyncio.run(run(base, endpoints, levels, args.requests, args.repeat_inputs))
+    report = {
+        "meta": {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "revision": git_revision(),
+            "python": platform.python_version(),
+            "cpus": os.cpu_count(),
+            "target": args.url or "in-process",
+            "stub": dict(STUB_CONFIG),
+            "requests": args.requests,
+            "repeat_inputs": args.repeat_inputs,
+        },
+        "results": results,
+    }
+    print_table(results)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        report["comparison"] = compare(results, baseline)
+        print_comparison(report["comparison"], args.compare)
+    if args.out:
+        with open(args.out, "w") as f:
+            json.dump(report, f, indent=2)
+    return report
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,354 @@
+"""In-process metrics in the Prometheus text format, and structured sampled logging.
+
+Counters and gauges are plain dicts of numbers updated without locks: they are
+only updated on the event loop thread, so nothing can interleave with them.
+Histograms are also observed from worker threads (store timings under
+SQLiteStore run on AsyncStore's threads), so they update under a lock; they keep
+per-bucket counts and only build the cumulative series when /metrics is scraped.
+"""
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterator, List, Optional, Sequence, Tuple
+import inspect
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import random
+import sys
+import threading
+import time
+
+from starlette.routing import Match
+
+from proxy import MethodProxy
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+RATE_BUCKETS = (5, 10, 20, 50, 100, 200, 500, 1000)
+
+# Share of info-level log events that are written; warnings and errors always are
+LOG_SAMPLE = float(os.environ.get("VITALIS_LOG_SAMPLE", "0.01"))
+LOG_LEVEL = os.environ.get("VITALIS_LOG_LEVEL", "INFO").upper()
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_labels(names: Sequence[str], values: Sequence[str], extra: str = "") -> str:
+    parts = [f'{n}="{_escape(str(v))}"' for n, v in zip(names, values)]
+    if extra:
+        parts.append(extra)
+    return "{" + ",".join(parts) + "}" if parts else ""
+
+
+def _number(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Registry:
+    """Metrics rendered together by /metrics."""
+    def __init__(self):
+        self.metrics: List["_Metric"] = []
+
+    def register(self, metric: "_Metric") -> "_Metric":
+        self.metrics.append(metric)
+        return metric
+
+    def render(self) -> str:
+        lines: List[str] = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+class _Metric:
+    type = "untyped"
+
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), registry: Optional[Registry] = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        if registry is not None:
+            registry.register(self)
+
+    def samples(self) -> Iterator[str]:
+        raise NotImplementedError
+
+
+class Counter(_Metric):
+    """Monotonic count per label set."""
+    type = "counter"
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.values: Dict[Labels, float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self) -> Iterator[str]:
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_number(value)}"
+
+
+class Gauge(Counter):
+    """Value per label set that can go up and down."""
+    type = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.values[labels] = self.values.get(labels, 0) - amount
+
+    def set(self, value: float, *labels: str):
+        self.values[labels] = value
+
+
+class Histogram(_Metric):
+    """Bucketed observations per label set (non-cumulative counts, plus sum and count)."""
+    type = "histogram"
+
+    def __init__(self, *args, buckets: Sequence[float] = LATENCY_BUCKETS, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.bounds = tuple(buckets)
+        # labels -> [count per bucket ..., count above the last bound, sum]
+        self.series: Dict[Labels, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *labels: str):
+        with self._lock:
+            series = self.series.get(labels)
+            if series is None:
+                series = self.series[labels] = [0] * (len(self.bounds) + 1) + [0.0]
+            series[bisect_left(self.bounds, value)] += 1
+            series[-1] += value
+
+    def count(self, *labels: str) -> int:
+        series = self.series.get(labels)
+        return int(sum(series[:-1])) if series else 0
+
+    def samples(self) -> Iterator[str]:
+        with self._lock:
+            snapshot = [(labels, list(series)) for labels, series in self.series.items()]
+        for labels, series in snapshot:
+            total = 0
+            for bound, n in zip(self.bounds + (float("inf"),), series):
+                total += n
+                le = 'le="' + _number(bound) + '"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {total}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {_number(series[-1])}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {total}"
+
+
+class Collected(_Metric):
+    """Values read from elsewhere (e.g. cache stats) each time metrics are rendered.
+
+    `collect` returns {label values: value}, or a single number when there are no labels.
+    """
+    def __init__(self, name: str, help: str, type: str, collect: Callable[[], object], labels: Sequence[str] = (),
+                 registry: Optional[Registry] = REGISTRY):
+        self.type = type
+        self.collect = collect
+        super().__init__(name, help, labels, registry)
+
+    def samples(self) -> Iterator[str]:
+        values = self.collect()
+        if not isinstance(values, dict):
+            values = {(): values}
+        for labels, value in values.items():
+            labels = labels if isinstance(labels, tuple) else (labels,)
+            yield f"{self.name}{_format_labels(self.labels, labels)} {_number(value)}"
+
+
+# Metrics recorded by the app
+HTTP_SECONDS = Histogram(
+    "vitalis_http_request_duration_seconds", "Time from request start to the end of the response body",
+    ("method", "route", "status"),
+)
+HTTP_IN_FLIGHT = Gauge("vitalis_http_requests_in_flight", "Requests currently being handled", ("route",))
+UPSTREAM_SECONDS = Histogram(
+    "vitalis_upstream_duration_seconds", "Upstream call time, to the end of the response body",
+    ("upstream", "outcome"),
+)
+UPSTREAM_TTFB = Histogram(
+    "vitalis_upstream_first_byte_seconds", "Time to first token (chat_stream) or response headers (tts)",
+    ("upstream",),
+)
+UPSTREAM_SHED = Counter(
+    "vitalis_upstream_shed_total", "Upstream calls rejected with 503 before being sent (queue full or deadline)",
+    ("upstream", "reason"),
+)
+UPSTREAM_RETRIES = Counter(
+    "vitalis_upstream_retries_total", "Upstream attempts retried after a 429, 5xx or connection error", ("upstream",),
+)
+UPSTREAM_HEDGES = Counter(
+    "vitalis_upstream_hedges_total", "Hedged upstream attempts sent, and how many answered first",
+    ("upstream", "outcome"),
+)
+RATE_KEYS_REFUSED = Counter(
+    "vitalis_rate_limit_keys_refused_total", "New rate-limit keys refused because every tracked bucket is in use",
+    ("endpoint",),
+)
+STREAM_TOKENS = Counter("vitalis_chat_stream_tokens_total", "Content deltas received from streamed chat completions")
+STREAM_TOKEN_RATE = Histogram(
+    "vitalis_chat_stream_tokens_per_second", "Streamed chat deltas per second after the first one",
+    buckets=RATE_BUCKETS,
+)
+VOICE_FIRST_AUDIO = Histogram(
+    "vitalis_voice_first_audio_seconds", "/voice-turn time from request start to the first audio byte sent",
+)
+STORE_SECONDS = Histogram(
+    "vitalis_store_operation_duration_seconds", "Store method calls (the _count series counts operations)",
+    ("op",), buckets=(0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.1, 1.0),
+)
+
+
+def record_upstream(upstream: str, start: float, outcome: str, **fields):
+    """Record an upstream call that began at perf_counter() `start`, and log a sampled event for it."""
+    elapsed = time.perf_counter() - start
+    UPSTREAM_SECONDS.observe(elapsed, upstream, outcome)
+    log_event("upstream_call", upstream=upstream, outcome=outcome, seconds=round(elapsed, 4), **fields)
+
+
+@contextmanager
+def upstream_timer(upstream: str) -> Iterator[None]:
+    """Time the enclosed upstream call, labelled ok or error."""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        record_upstream(upstream, start, outcome)
+
+
+class InstrumentedStore(MethodProxy):
+    """Proxy that times every public method call on a store."""
+    def wrap(self, name: str, method: Callable):
+        if inspect.iscoroutinefunction(method):
+            async def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return await method(*args, **kwargs)
+                finally:
+                    STORE_SECONDS.observe(time.perf_counter() - start, name)
+        else:
+            def timed(*args, **kwargs):
+                start = time.perf_counter()
+                try:
+                    return method(*args, **kwargs)
+                finally:
+                    STORE_SECONDS.observe(time.perf_counter() - start, name)
+        return timed
+
+
+class MetricsMiddleware:
+    """Pure ASGI middleware recording per-route latency and in-flight requests.
+
+    Routes are labelled by their path template (unknown paths as "unmatched") so
+    label cardinality stays bounded; the path -> template lookup is cached.
+    """
+    def __init__(self, app, routes: Sequence = (), max_paths: int = 4096):
+        self.app = app
+        self.routes = routes
+        self.max_paths = max_paths
+        self._paths: Dict[Tuple[str, str], str] = {}
+
+    def route_for(self, scope) -> str:
+        key = (scope["method"], scope["path"])
+        route = self._paths.get(key)
+        if route is None:
+            route = "unmatched"
+            for candidate in self.routes:
+                match, _ = candidate.matches(scope)
+                if match == Match.FULL:
+                    route = candidate.path
+                    break
+                if match == Match.PARTIAL and route == "unmatched":
+                    route = candidate.path
+            if len(self._paths) < self.max_paths:
+                self._paths[key] = route
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        route = self.route_for(scope)
+        status = "500"
+        start = time.perf_counter()
+        HTTP_IN_FLIGHT.inc(route)
+
+        async def send_wrapper(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            HTTP_IN_FLIGHT.dec(route)
+            HTTP_SECONDS.observe(time.perf_counter() - start, scope["method"], route, status)
+
+
+# Structured logging
+
+logger = logging.getLogger("vitalis")
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, event name and the event's fields."""
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {"ts": round(record.created, 3), "level": record.levelname.lower(), "event": record.getMessage()}
+        entry.update(getattr(record, "fields", {}))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def log_event(event: str, level: int = logging.INFO, sample: Optional[float] = None, **fields):
+    """Log `event` with structured fields; info and below are kept with probability `sample`."""
+    if level < logging.WARNING and random.random() >= (LOG_SAMPLE if sample is None else sample):
+        return
+    if logger.isEnabledFor(level):
+        logger.log(level, event, extra={"fields": fields})
+
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+def start_logging(stream=None):
+    """Send vitalis events through a queue to a writer thread, so the event loop never blocks on I/O."""
+    global _listener
+    if _listener is not None:
+        return
+    records: queue.SimpleQueue = queue.SimpleQueue()
+    handler = logging.StreamHandler(stream or sys.stderr)
+    handler.setFormatter(JsonFormatter())
+    _listener = logging.handlers.QueueListener(records, handler)
+    _listener.start()
+    logger.addHandler(logging.handlers.QueueHandler(records))
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+
+def stop_logging():
+    """Flush queued events and stop the writer thread."""
+    global _listener
+    if _listener is None:
+        return
+    _listener.stop()
+    for handler in list(logger.handlers):
+        if isinstance(handler, logging.handlers.QueueHandler):
+            logger.removeHandler(handler)
+    _listener = None
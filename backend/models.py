@@ -17,6 +17,8 @@ class RecoveryScore(BaseModel):
     muscle_scores: Dict[str, int]
     recommended: List[str]
     updated_at: datetime
+    model: str = "step"
+    ready_at: Optional[Dict[str, datetime]] = None
 
 class WorkoutLog(BaseModel):
     """Workout log entry."""
@@ -25,4 +27,13 @@ class WorkoutLog(BaseModel):
     effort: int = Field(..., ge=1, le=10)
     soreness: int = Field(..., ge=0, le=10)
     duration_min: int
-    ts: Optional[datetime] = None 
\ No newline at end of file
+    ts: Optional[datetime] = None
+
+class RecoveryBatchRequest(BaseModel):
+    """Users to score in one /recovery/batch call."""
+    uids: List[str]
+
+class RecoveryBatch(BaseModel):
+    """Recovery scores keyed by uid."""
+    results: Dict[str, RecoveryScore]
+    updated_at: datetime
@@ -0,0 +1,23 @@
+"""Base class for proxies that wrap every public method of another object."""
+from typing import Any, Callable
+
+
+class MethodProxy:
+    """Forwards attribute lookups to `target`, wrapping its public methods with wrap().
+
+    Each wrapper is built on first use and cached on the proxy, so later lookups
+    skip __getattr__. Private and non-callable attributes are returned as-is.
+    """
+    def __init__(self, target):
+        self._target = target
+
+    def wrap(self, name: str, method: Callable[..., Any]) -> Callable[..., Any]:
+        raise NotImplementedError
+
+    def __getattr__(self, name: str):
+        attr = getattr(self._target, name)
+        if name.startswith("_") or not callable(attr):
+            return attr
+        wrapped = self.wrap(name, attr)
+        setattr(self, name, wrapped)
+        return wrapped
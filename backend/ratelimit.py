@@ -0,0 +1,130 @@
+"""Token-bucket rate limiting with lazy eviction of refilled keys."""
+from collections import OrderedDict
+from typing import Callable, Dict, NamedTuple
+import logging
+import os
+import time
+
+from metrics import RATE_KEYS_REFUSED, log_event
+
+MAX_KEYS_PER_ENDPOINT = int(os.environ.get("VITALIS_RATE_MAX_KEYS", "100000"))
+
+
+class RateLimit(NamedTuple):
+    """Allow `requests` per `seconds`, refilled continuously."""
+    requests: int
+    seconds: float
+
+    @classmethod
+    def parse(cls, spec: str) -> "RateLimit":
+        """Parse '3/10' (3 requests per 10 seconds)."""
+        requests, seconds = spec.split("/")
+        return cls(int(requests), float(seconds))
+
+
+def _limit(endpoint: str, default: str) -> RateLimit:
+    return RateLimit.parse(os.environ.get(f"VITALIS_RATE_{endpoint.upper()}", default))
+
+
+# Per-endpoint limits, overridable with e.g. VITALIS_RATE_CHAT_STREAM=3/10
+DEFAULT_LIMITS: Dict[str, RateLimit] = {
+    "chat_stream": _limit("chat_stream", "3/10"),
+    "chat": _limit("chat", "5/10"),
+    "speech_to_text": _limit("speech_to_text", "5/10"),
+    "text_to_speech": _limit("text_to_speech", "10/10"),
+    "voice_turn": _limit("voice_turn", "3/10"),
+}
+# Requests keyed by a client-chosen uid are also limited per client address, across
+# all its uids, to SOURCE_FACTOR times the endpoint limit: one client cannot mint
+# uids fast enough to fill the key table and lock out new users at max_keys
+SOURCE_FACTOR = int(os.environ.get("VITALIS_RATE_SOURCE_FACTOR", "10"))
+
+
+def source_endpoint(endpoint: str) -> str:
+    """Limiter name for the per-address limit that goes with `endpoint`."""
+    return f"{endpoint}:source"
+
+
+DEFAULT_LIMITS.update({
+    source_endpoint(name): RateLimit(limit.requests * SOURCE_FACTOR, limit.seconds)
+    for name, limit in list(DEFAULT_LIMITS.items())
+})
+
+
+class _Buckets:
+    """Buckets for one endpoint, ordered by last use so idle keys sit at the front."""
+    __slots__ = ("capacity", "rate", "entries", "full")
+
+    def __init__(self, limit: RateLimit):
+        self.capacity = float(limit.requests)
+        self.rate = limit.requests / limit.seconds
+        self.entries: "OrderedDict[str, list]" = OrderedDict()
+        # Refusing new keys at max_keys; logged once per episode, counted every time
+        self.full = False
+
+    def refill_in(self, bucket: list, now: float) -> float:
+        """Seconds until `bucket` is full again; a full bucket can be forgotten without changing anything."""
+        return (self.capacity - bucket[0]) / self.rate - (now - bucket[1])
+
+
+class RateLimiter:
+    """Token-bucket limiter keyed by (endpoint, key).
+
+    Each bucket is just [tokens, last_refill]; tokens are refilled from the elapsed
+    time on every check, so no timers or background tasks are needed. Every check
+    also drops a couple of buckets that have been idle long enough to be full,
+    which bounds memory without a sweeper. max_keys is a hard cap on top: only
+    full buckets are ever dropped, so when every tracked key is still limited,
+    new keys are refused (fail closed) rather than letting a flood of fresh keys
+    push out, and so reset, the bucket of a key that is being limited.
+    """
+    def __init__(
+        self,
+        limits: Dict[str, RateLimit] = DEFAULT_LIMITS,
+        max_keys: int = MAX_KEYS_PER_ENDPOINT,
+        clock: Callable[[], float] = time.monotonic,
+    ):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._endpoints = {name: _Buckets(limit) for name, limit in limits.items()}
+
+    def check(self, endpoint: str, key: str) -> float:
+        """Take one token; return 0.0 if allowed, else seconds until a token is free."""
+        buckets = self._endpoints.get(endpoint)
+        if buckets is None:
+            return 0.0
+        now = self.clock()
+        entries = buckets.entries
+        bucket = entries.get(key)
+        if bucket is None:
+            self._evict(buckets, now)
+            if len(entries) >= self.max_keys:
+                RATE_KEYS_REFUSED.inc(endpoint)
+                if not buckets.full:
+                    buckets.full = True
+                    log_event("rate_limit_keys_full", logging.WARNING, endpoint=endpoint, max_keys=self.max_keys)
+                return buckets.refill_in(next(iter(entries.values())), now)
+            buckets.full = False
+            bucket = entries[key] = [buckets.capacity, now]
+        else:
+            entries.move_to_end(key)
+            bucket[0] = min(buckets.capacity, bucket[0] + (now - bucket[1]) * buckets.rate)
+            bucket[1] = now
+            self._evict(buckets, now)
+        if bucket[0] >= 1.0:
+            bucket[0] -= 1.0
+            return 0.0
+        return (1.0 - bucket[0]) / buckets.rate
+
+    def _evict(self, buckets: _Buckets, now: float):
+        """Drop up to two least recently used buckets that have refilled, more while over max_keys."""
+        entries = buckets.entries
+        evicted = 0
+        while entries and (evicted < 2 or len(entries) >= self.max_keys):
+            if buckets.refill_in(next(iter(entries.values())), now) > 0:
+                break
+            entries.popitem(last=False)
+            evicted += 1
+
+    def __len__(self) -> int:
+        return sum(len(b.entries) for b in self._endpoints.values())
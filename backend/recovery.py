@@ -1,32 +1,187 @@
 """Recovery score calculation utility."""
-from typing import Dict, List
-from datetime import datetime, timedelta
+from typing import Dict, Iterable, List, Optional, Tuple
+import math
+import os
+from datetime import datetime, timedelta, timezone
 
 # Muscle list for reference
 COMMON_MUSCLES = [
     "quads", "hamstrings", "glutes", "calves", "chest", "back", "shoulders", "biceps", "triceps", "core", "forearms"
 ]
 
+MUSCLE_INDEX = {m: i for i, m in enumerate(COMMON_MUSCLES)}
+# Muscle indices set in each possible bitmask of COMMON_MUSCLES (bit i = COMMON_MUSCLES[i])
+MASK_INDICES = [tuple(i for i in range(len(COMMON_MUSCLES)) if mask >> i & 1) for mask in range(1 << len(COMMON_MUSCLES))]
+
 RECENT_HOURS = 24
 RECENTLY_TRAINED_HOURS = 48
 
+TRAINABLE_SCORE = 71
 
-def calc_recovery(
-    logs: List[dict],
+# Decay model: each session adds fatigue load that halves every DECAY_HALF_LIFE_HOURS;
+# one unit of load costs LOAD_PENALTY points (a 60 min, effort 7, soreness 3 session is ~0.9)
+DECAY_HALF_LIFE_HOURS = float(os.environ.get("VITALIS_DECAY_HALF_LIFE_HOURS", "24"))
+LOAD_PENALTY = 40
+RECOVERY_MODELS = ("step", "decay")
+DEFAULT_RECOVERY_MODEL = os.environ.get("VITALIS_RECOVERY_MODEL", "step")
+if DEFAULT_RECOVERY_MODEL not in RECOVERY_MODELS:
+    raise ValueError(f"VITALIS_RECOVERY_MODEL must be one of {', '.join(RECOVERY_MODELS)}, got {DEFAULT_RECOVERY_MODEL!r}")
+
+# Sentinel for "never trained" in epoch-microsecond timestamps
+NEVER_US = -(2**63)
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+_MICRO = timedelta(microseconds=1)
+
+
+def epoch_micros(ts: datetime) -> int:
+    """Exact epoch microseconds for a datetime (naive values are taken as UTC)."""
+    if ts.tzinfo is None:
+        ts = ts.replace(tzinfo=timezone.utc)
+    return (ts - _EPOCH) // _MICRO
+
+
+def from_epoch_micros(us: int) -> datetime:
+    """Inverse of epoch_micros (UTC)."""
+    return _EPOCH + timedelta(microseconds=us)
+
+
+def muscle_mask(muscles: List[str]) -> int:
+    """Bitmask of the COMMON_MUSCLES in `muscles` (others are ignored)."""
+    mask = 0
+    for m in muscles:
+        i = MUSCLE_INDEX.get(m)
+        if i is not None:
+            mask |= 1 << i
+    return mask
+
+
+def session_load(log: dict) -> float:
+    """Fatigue load from one session, scaled by effort, duration and soreness."""
+    return _load(log.get("effort", 5), log.get("soreness", 0), log.get("duration_min", 30))
+
+
+def _load(effort: int, soreness: int, duration_min: int) -> float:
+    duration = min(max(duration_min, 0), 180)
+    return (effort / 10) * (duration / 60) * (1 + soreness / 10)
+
+
+def _decay(elapsed_us: float) -> float:
+    return 2.0 ** (-elapsed_us / (DECAY_HALF_LIFE_HOURS * 3600e6))
+
+
+def _penalty(load: float, at_us: int, now_us: int) -> float:
+    return LOAD_PENALTY * (load * _decay(max(0, now_us - at_us))) if at_us != NEVER_US else 0.0
+
+
+def _first_at_or_below(load: float, at_us: int, rounded: int, start_us: int) -> int:
+    """First microsecond >= start_us at which int(penalty + 0.5) <= rounded.
+
+    The closed-form solution is only an estimate under float rounding, so it is
+    nudged until it agrees with the penalty the scorer actually computes.
+    """
+    def over(t):
+        return int(_penalty(load, at_us, t) + 0.5) > rounded
+    t = at_us + math.floor(DECAY_HALF_LIFE_HOURS * 3600e6 * math.log2(LOAD_PENALTY * load / (rounded + 0.5)))
+    t = max(t, start_us)
+    while t > start_us and not over(t - 1):
+        t -= 1
+    while over(t):
+        t += 1
+    return t
+
+
+class MuscleSummary:
+    """Latest training time and peak soreness per muscle, kept up to date per log."""
+    def __init__(self):
+        self.last_trained: Dict[str, Optional[datetime]] = {m: None for m in COMMON_MUSCLES}
+        self.doms: Dict[str, int] = {m: 0 for m in COMMON_MUSCLES}
+        # last_trained as epoch microseconds in COMMON_MUSCLES order, for batch scoring
+        self.last_trained_us: List[int] = [NEVER_US] * len(COMMON_MUSCLES)
+        # Decay model state: fatigue load per muscle as of load_at_us
+        self.load: List[float] = [0.0] * len(COMMON_MUSCLES)
+        self.load_at_us: List[int] = [NEVER_US] * len(COMMON_MUSCLES)
+
+    def add(self, log: dict):
+        """Fold one workout log into the summary (logs may arrive out of order)."""
+        ts = log.get("ts")
+        if not ts:
+            return
+        self.add_row(
+            epoch_micros(ts), muscle_mask(log.get("muscles", [])),
+            log.get("effort", 5), log.get("soreness", 0), log.get("duration_min", 30),
+        )
+
+    def add_row(self, ts_us: int, mask: int, effort: int, soreness: int, duration_min: int):
+        """Fold one log in its compact form (see workout_log.WorkoutColumns)."""
+        if ts_us == NEVER_US:
+            return
+        load = _load(effort, soreness, duration_min)
+        ts = None
+        for i in MASK_INDICES[mask]:
+            m = COMMON_MUSCLES[i]
+            if ts_us > self.last_trained_us[i]:
+                if ts is None:
+                    ts = from_epoch_micros(ts_us)
+                self.last_trained[m] = ts
+                self.last_trained_us[i] = ts_us
+            if soreness > self.doms[m]:
+                self.doms[m] = soreness
+            # Keep load referenced to the newest log; older logs are decayed into it
+            at = self.load_at_us[i]
+            if at == NEVER_US or ts_us >= at:
+                self.load[i] = (self.load[i] * _decay(ts_us - at) if at != NEVER_US else 0.0) + load
+                self.load_at_us[i] = ts_us
+            else:
+                self.load[i] += load * _decay(at - ts_us)
+
+    @classmethod
+    def from_logs(cls, logs: List[dict]) -> "MuscleSummary":
+        """Build a summary by scanning a full list of logs."""
+        summary = cls()
+        for log in logs:
+            summary.add(log)
+        return summary
+
+    @classmethod
+    def from_rows(cls, rows: Iterable[Tuple[int, int, int, int, int]]) -> "MuscleSummary":
+        """Build a summary from compact (ts_us, mask, effort, soreness, duration_min) rows."""
+        summary = cls()
+        add = summary.add_row
+        for row in rows:
+            add(*row)
+        return summary
+
+    def to_dict(self) -> dict:
+        """JSON-compatible state, for stores that keep summaries outside the process."""
+        return {
+            "last_trained": [None if ts is None else ts.isoformat() for ts in self.last_trained.values()],
+            "doms": list(self.doms.values()),
+            "load": self.load,
+            "load_at_us": self.load_at_us,
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "MuscleSummary":
+        """Inverse of to_dict."""
+        summary = cls()
+        for i, (m, ts) in enumerate(zip(COMMON_MUSCLES, state["last_trained"])):
+            if ts is not None:
+                summary.last_trained[m] = datetime.fromisoformat(ts)
+                summary.last_trained_us[i] = epoch_micros(summary.last_trained[m])
+        summary.doms = dict(zip(COMMON_MUSCLES, state["doms"]))
+        summary.load = list(state["load"])
+        summary.load_at_us = list(state["load_at_us"])
+        return summary
+
+
+def calc_recovery_from_summary(
+    summary: MuscleSummary,
     now: datetime
 ) -> Dict[str, int]:
-    """Calculate recovery scores for each muscle group."""
+    """Calculate recovery scores for each muscle group from a MuscleSummary."""
     scores = {m: 100 for m in COMMON_MUSCLES}
-    last_trained = {m: None for m in COMMON_MUSCLES}
-    doms = {m: 0 for m in COMMON_MUSCLES}
-    for log in logs:
-        ts = log.get("ts")
-        if not ts:
-            continue
-        for m in log.get("muscles", []):
-            if last_trained[m] is None or ts > last_trained[m]:
-                last_trained[m] = ts
-            doms[m] = max(doms[m], log.get("soreness", 0))
+    last_trained = summary.last_trained
+    doms = summary.doms
     for m in COMMON_MUSCLES:
         # -40 if trained in last 24h
         if last_trained[m] and (now - last_trained[m]).total_seconds() < RECENT_HOURS * 3600:
@@ -38,10 +193,71 @@ def calc_recovery(
         scores[m] = max(0, min(100, scores[m]))
     return scores
 
+
+def calc_recovery(
+    logs: List[dict],
+    now: datetime
+) -> Dict[str, int]:
+    """Calculate recovery scores for each muscle group."""
+    return calc_recovery_from_summary(MuscleSummary.from_logs(logs), now)
+
+def calc_recovery_decay(
+    summary: MuscleSummary,
+    now: datetime
+) -> Tuple[Dict[str, int], Dict[str, datetime]]:
+    """Decay-model scores per muscle, plus when each muscle becomes trainable.
+
+    The score is 100 minus LOAD_PENALTY per unit of decayed fatigue load. The
+    forecast is the earliest time the score reaches TRAINABLE_SCORE and the muscle
+    is past RECENTLY_TRAINED_HOURS, i.e. when recommend_trainable would list it
+    (now if it already would).
+    """
+    now_us = epoch_micros(now)
+    max_penalty = 100 - TRAINABLE_SCORE
+    scores, ready_at = {}, {}
+    for i, m in enumerate(COMMON_MUSCLES):
+        load, at = summary.load[i], summary.load_at_us[i]
+        rounded = int(_penalty(load, at, now_us) + 0.5)
+        scores[m] = max(0, min(100, 100 - rounded))
+        ready_us = now_us
+        if rounded > max_penalty:
+            ready_us = _first_at_or_below(load, at, max_penalty, now_us)
+        last_us = summary.last_trained_us[i]
+        if last_us != NEVER_US:
+            ready_us = max(ready_us, last_us + RECENTLY_TRAINED_HOURS * 3600 * 10**6 + 1)
+        ready_at[m] = from_epoch_micros(ready_us)
+    return scores, ready_at
+
+
+def next_change_us(summary: MuscleSummary, now: datetime, model: str = "step") -> Optional[int]:
+    """Epoch microseconds at which the scores or recommendations next change, if ever.
+
+    Without new logs, the step model only changes when a muscle's last-trained time
+    turns RECENT_HOURS old (score) or passes RECENTLY_TRAINED_HOURS (recommendation).
+    The decay model also changes whenever a rounded penalty steps down by one.
+    """
+    now_us = epoch_micros(now)
+    candidates = []
+    for i in range(len(COMMON_MUSCLES)):
+        last_us = summary.last_trained_us[i]
+        if last_us != NEVER_US:
+            if model == "step":
+                candidates.append(last_us + RECENT_HOURS * 3600 * 10**6)
+            candidates.append(last_us + RECENTLY_TRAINED_HOURS * 3600 * 10**6 + 1)
+        load, at = summary.load[i], summary.load_at_us[i]
+        if model == "decay" and at != NEVER_US:
+            # The score next changes when the rounded penalty steps down by one
+            rounded = int(_penalty(load, at, now_us) + 0.5)
+            if rounded > 0:
+                candidates.append(_first_at_or_below(load, at, rounded - 1, now_us))
+    future = [c for c in candidates if c > now_us]
+    return min(future) if future else None
+
+
 def recommend_trainable(scores: Dict[str, int], last_trained: Dict[str, datetime], now: datetime) -> List[str]:
-    """Return list of trainable muscles (score>=71, not trained <48h), else ['Rest / Mobility']."""
+    """Return list of trainable muscles (score >= TRAINABLE_SCORE, not trained <48h), else ['Rest / Mobility']."""
     trainable = [
         m for m, s in scores.items()
-        if s >= 71 and (not last_trained[m] or (now - last_trained[m]).total_seconds() > RECENTLY_TRAINED_HOURS * 3600)
+        if s >= TRAINABLE_SCORE and (not last_trained[m] or (now - last_trained[m]).total_seconds() > RECENTLY_TRAINED_HOURS * 3600)
     ]
-    return trainable if trainable else ["Rest / Mobility"] 
\ No newline at end of file
+    return trainable if trainable else ["Rest / Mobility"] 
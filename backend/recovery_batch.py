@@ -0,0 +1,68 @@
+"""Vectorized recovery scoring for many users at once.
+
+Packs users x COMMON_MUSCLES into arrays (last-trained time in integer
+microseconds and peak soreness) and applies the same rules as
+recovery.calc_recovery_from_summary / recommend_trainable as array operations.
+Integer microseconds keep the 24h/48h comparisons exact, and the soreness
+penalty uses the same float64 operations as the scalar code, so results are
+identical. Falls back to the scalar functions when NumPy is not installed.
+"""
+from datetime import datetime
+from itertools import chain
+from typing import Dict, List, Tuple
+
+try:
+    import numpy as np
+except ImportError:
+    np = None
+
+from recovery import (
+    COMMON_MUSCLES, NEVER_US, RECENT_HOURS, RECENTLY_TRAINED_HOURS, TRAINABLE_SCORE, MuscleSummary,
+    calc_recovery_from_summary, epoch_micros, recommend_trainable,
+)
+
+REST = ["Rest / Mobility"]
+_RECENT_US = RECENT_HOURS * 3600 * 10**6
+_RECENTLY_TRAINED_US = RECENTLY_TRAINED_HOURS * 3600 * 10**6
+_BITS = None if np is None else (1 << np.arange(len(COMMON_MUSCLES), dtype=np.int64))
+
+
+def pack(summaries: List[MuscleSummary]):
+    """Return (last_us, trained, doms) arrays of shape (users, muscles)."""
+    shape = (len(summaries), len(COMMON_MUSCLES))
+    count = shape[0] * shape[1]
+    last_us = np.fromiter(chain.from_iterable(s.last_trained_us for s in summaries), np.int64, count).reshape(shape)
+    doms = np.fromiter(chain.from_iterable(s.doms.values() for s in summaries), np.int64, count).reshape(shape)
+    return last_us, last_us != NEVER_US, doms
+
+
+def score_arrays(last_us, trained, doms, now_us: int):
+    """Scores and trainable flags for packed arrays, matching the scalar rules."""
+    age = now_us - last_us
+    scores = 100 - 40 * (trained & (age < _RECENT_US)) - (30 * (doms / 10)).astype(np.int64)
+    np.clip(scores, 0, 100, out=scores)
+    trainable = (scores >= TRAINABLE_SCORE) & (~trained | (age > _RECENTLY_TRAINED_US))
+    return scores, trainable
+
+
+def batch_recovery(summaries: List[MuscleSummary], now: datetime) -> List[Tuple[Dict[str, int], List[str]]]:
+    """(muscle_scores, recommended) for each summary, in order."""
+    if np is None:
+        results = []
+        for summary in summaries:
+            scores = calc_recovery_from_summary(summary, now)
+            results.append((scores, recommend_trainable(scores, summary.last_trained, now)))
+        return results
+    if not summaries:
+        return []
+    scores, trainable = score_arrays(*pack(summaries), epoch_micros(now))
+    # One bitmask per user; each distinct mask's muscle list is built once
+    masks = (trainable.astype(np.int64) @ _BITS).tolist()
+    lists: Dict[int, List[str]] = {}
+    results = []
+    for row, mask in zip(scores.tolist(), masks):
+        names = lists.get(mask)
+        if names is None:
+            names = lists[mask] = [m for i, m in enumerate(COMMON_MUSCLES) if mask >> i & 1] or REST
+        results.append((dict(zip(COMMON_MUSCLES, row)), list(names)))
+    return results
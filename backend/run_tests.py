@@ -0,0 +1,58 @@
+"""Run the unit tests and, optionally, an offline load test gated on a baseline.
+
+    python run_tests.py                              # pytest only
+    python run_tests.py --load                       # plus a short loadtest.py run
+    python run_tests.py --load --baseline base.json  # fail on regressions vs base.json
+
+A regression is throughput or p95 latency more than --max-regression worse than
+the baseline for the same endpoint and concurrency. Extra arguments after `--`
+are passed to loadtest.py.
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+QUICK_LOAD = ["--requests", "50", "--concurrency", "1,8"]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--load", action="store_true", help="also run a short load test")
+    parser.add_argument("--baseline", help="loadtest.py JSON results to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.25, help="allowed relative slowdown (0.25 = 25%%)")
+    parser.add_argument("--out", help="write the load test results to this JSON file")
+    args, extra = parser.parse_known_args()
+    here = os.path.dirname(os.path.abspath(__file__))
+
+    status = subprocess.call([sys.executable, "-m", "pytest", "-q"], cwd=here)
+    if status or not args.load:
+        return status
+
+    # Imported here so a plain test run does not start any servers
+    import loadtest
+    load_args = (extra[1:] if extra[:1] == ["--"] else extra) or QUICK_LOAD
+    if args.baseline:
+        load_args += ["--compare", args.baseline]
+    if args.out:
+        load_args += ["--out", args.out]
+    report = loadtest.main(load_args)
+    if sum(r["errors"] for r in report["results"]):
+        print("\nload test had failed requests")
+        return 1
+    regressions = [
+        f"{row['endpoint']} @ {row['concurrency']}: {key} {row[key] * 100:+.0f}%"
+        for row in report.get("comparison", [])
+        for key in ("throughput", "latency_p95")
+        if row.get(key, 0) > args.max_regression
+    ]
+    if regressions:
+        print("\nregressions beyond {:.0f}%:".format(args.max_regression * 100))
+        for line in regressions:
+            print("  " + line)
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
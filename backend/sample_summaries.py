@@ -0,0 +1,24 @@
+"""Random per-user recovery summaries shared by the batch scorer tests and benchmark."""
+import random
+from datetime import timedelta
+
+from recovery import COMMON_MUSCLES, RECENT_HOURS, RECENTLY_TRAINED_HOURS, MuscleSummary
+
+
+def random_summaries(n, now, seed=0):
+    rng = random.Random(seed)
+    summaries = []
+    for _ in range(n):
+        s = MuscleSummary()
+        for _ in range(rng.randint(0, 6)):
+            # Include ages exactly on and around the 24h/48h boundaries
+            age = rng.choice([
+                timedelta(hours=rng.uniform(0, 96)),
+                timedelta(hours=RECENT_HOURS), timedelta(hours=RECENTLY_TRAINED_HOURS),
+                timedelta(hours=RECENT_HOURS, microseconds=rng.choice([-1, 1])),
+                timedelta(hours=RECENTLY_TRAINED_HOURS, microseconds=rng.choice([-1, 1])),
+            ])
+            s.add({"muscles": rng.sample(COMMON_MUSCLES, rng.randint(1, 3)),
+                   "soreness": rng.randint(0, 10), "ts": now - age})
+        summaries.append(s)
+    return summaries
@@ -0,0 +1,369 @@
+"""Upstream scheduler: adaptive concurrency limits, bounded queues with deadlines, retries and hedging.
+
+Every call to an upstream (chat, chat_stream, stt, tts) holds a slot from that
+upstream's Limiter while it runs. The number of slots adapts AIMD-style: it
+grows by about one per window of successful calls that used every slot, up to
+the configured concurrency, and is cut by DECREASE when the upstream signals
+overload (429, 503 or a timeout). Callers beyond the limit wait in a bounded
+FIFO queue; a call is shed with Overloaded (503 + Retry-After in app.py) as soon
+as the queue is full or its deadline would pass before a slot is likely to
+free up, instead of waiting until the client gives up.
+
+Failed attempts are retried on 429/5xx and connection errors with full-jitter
+exponential backoff (or the upstream's Retry-After, if longer) while the
+deadline allows. Idempotent calls can be hedged: if the first attempt has not
+answered within the upstream's recent p95 latency and a slot is free, a second
+copy is sent and whichever answers first wins.
+"""
+from collections import deque
+from typing import Awaitable, Callable, Deque, Dict, Iterator, NamedTuple, Optional, Tuple, TypeVar
+import asyncio
+import math
+import os
+import random
+import time
+
+import httpx
+
+from metrics import UPSTREAM_HEDGES, UPSTREAM_RETRIES, UPSTREAM_SHED
+
+T = TypeVar("T")
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+OVERLOAD_STATUSES = {429, 503}
+# Multiplicative decrease of the concurrency limit on overload
+DECREASE = 0.7
+BACKOFF_BASE = float(os.environ.get("VITALIS_UPSTREAM_BACKOFF", "0.2"))
+BACKOFF_MAX = float(os.environ.get("VITALIS_UPSTREAM_BACKOFF_MAX", "2"))
+ATTEMPTS = int(os.environ.get("VITALIS_UPSTREAM_ATTEMPTS", "3"))
+HEDGE = os.environ.get("VITALIS_UPSTREAM_HEDGE", "1") == "1"
+# Attempts timed before hedging starts (the hedge delay is their p95)
+HEDGE_MIN_SAMPLES = 20
+
+
+class UpstreamPolicy(NamedTuple):
+    """Up to `concurrency` calls in flight, `queue` waiting, each finished or shed within `deadline` seconds."""
+    concurrency: int
+    queue: int
+    deadline: float
+    attempts: int = ATTEMPTS
+    hedge: bool = False
+
+    @classmethod
+    def parse(cls, spec: str, **kwargs) -> "UpstreamPolicy":
+        """Parse '32/64/30' (32 concurrent calls, 64 queued, 30 second deadline)."""
+        concurrency, queue, deadline = spec.split("/")
+        return cls(int(concurrency), int(queue), float(deadline), **kwargs)
+
+
+def _policy(upstream: str, default: str, **kwargs) -> UpstreamPolicy:
+    return UpstreamPolicy.parse(os.environ.get(f"VITALIS_UPSTREAM_{upstream.upper()}", default), **kwargs)
+
+
+# Per-upstream policies, overridable with e.g. VITALIS_UPSTREAM_TTS=32/64/15.
+# Streamed calls (chat_stream, tts) hold their slot until the body is done, but the
+# deadline only covers getting the response started.
+DEFAULT_POLICIES: Dict[str, UpstreamPolicy] = {
+    "chat": _policy("chat", "32/64/30"),
+    "chat_stream": _policy("chat_stream", "32/64/15"),
+    "stt": _policy("stt", "16/32/30", hedge=HEDGE),
+    "tts": _policy("tts", "32/64/15", hedge=HEDGE),
+}
+
+
+class UpstreamUnavailable(Exception):
+    """The call was not completed for capacity reasons; `status` and `retry_after` are for the client."""
+    status = 503
+
+    def __init__(self, upstream: str, message: str, retry_after: float):
+        super().__init__(message)
+        self.upstream = upstream
+        self.retry_after = retry_after
+
+
+class Overloaded(UpstreamUnavailable):
+    """Shed before being sent: the queue was full or the deadline could not be met."""
+
+
+class DeadlineExceeded(UpstreamUnavailable):
+    """The upstream did not answer before the deadline."""
+    status = 504
+
+
+def _chain(exc: BaseException) -> Iterator[BaseException]:
+    while exc is not None:
+        yield exc
+        exc = exc.__cause__ or exc.__context__
+
+
+def _response(exc: BaseException) -> Optional[httpx.Response]:
+    """The HTTP response behind an httpx or openai status error, if any."""
+    for e in _chain(exc):
+        response = getattr(e, "response", None)
+        if isinstance(response, httpx.Response):
+            return response
+    return None
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """429, 5xx, or a connection that failed before the request was sent."""
+    response = _response(exc)
+    if response is not None:
+        return response.status_code in RETRY_STATUSES
+    return any(isinstance(e, (httpx.ConnectError, httpx.ConnectTimeout)) for e in _chain(exc))
+
+
+def is_overload(exc: BaseException) -> bool:
+    """Whether a failure means the upstream is saturated (and the limit should shrink)."""
+    response = _response(exc)
+    if response is not None:
+        return response.status_code in OVERLOAD_STATUSES
+    return any(isinstance(e, (httpx.TimeoutException, TimeoutError)) for e in _chain(exc))
+
+
+def retry_after(exc: BaseException) -> float:
+    """Seconds the upstream asked us to wait (Retry-After), or 0."""
+    response = _response(exc)
+    try:
+        return float(response.headers.get("retry-after", 0)) if response is not None else 0.0
+    except ValueError:
+        return 0.0
+
+
+class Lease:
+    """A slot held on a Limiter. release() frees it; calls after the first are ignored."""
+    __slots__ = ("limiter", "started", "released")
+
+    def __init__(self, limiter: "Limiter", started: float):
+        self.limiter = limiter
+        self.started = started
+        self.released = False
+
+    def release(self, error: Optional[BaseException] = None):
+        """Free the slot; `error` is what the call failed with (None for success)."""
+        if not self.released:
+            self.released = True
+            self.limiter._release(self, error)
+
+
+class Limiter:
+    """AIMD concurrency limit and bounded FIFO wait queue for one upstream."""
+    def __init__(self, name: str, policy: UpstreamPolicy, clock: Callable[[], float] = time.monotonic):
+        self.name = name
+        self.policy = policy
+        self.clock = clock
+        self.limit = float(policy.concurrency)
+        self.in_flight = 0
+        self.waiters: Deque[asyncio.Future] = deque()
+        # Mean slot hold time (EWMA), for estimating queue waits
+        self.hold = 0.0
+        # Recent attempt durations, for the hedge delay
+        self.latencies: Deque[float] = deque(maxlen=200)
+        self.decreased_at = -math.inf
+
+    @property
+    def slots(self) -> int:
+        return max(1, int(self.limit))
+
+    def expected_wait(self) -> float:
+        """Rough wait for a new caller: the queue ahead drains `slots` calls per mean hold time."""
+        if self.in_flight < self.slots:
+            return 0.0
+        return self.hold * (len(self.waiters) + 1) / self.slots
+
+    def retry_after(self) -> float:
+        return max(1.0, math.ceil(self.expected_wait()))
+
+    def hedge_delay(self) -> Optional[float]:
+        """p95 of recent attempt durations, or None until there are enough of them."""
+        if len(self.latencies) < HEDGE_MIN_SAMPLES:
+            return None
+        ordered = sorted(self.latencies)
+        return ordered[int(len(ordered) * 0.95)]
+
+    def _shed(self, reason: str):
+        UPSTREAM_SHED.inc(self.name, reason)
+        raise Overloaded(self.name, f"{self.name} upstream is overloaded ({reason.replace('_', ' ')})", self.retry_after())
+
+    def admit(self, deadline: float):
+        """Raise Overloaded if a call with this deadline would be shed rather than queued."""
+        if self.in_flight < self.slots and not self.waiters:
+            return
+        if len(self.waiters) >= self.policy.queue:
+            self._shed("queue_full")
+        if self.clock() + self.expected_wait() > deadline:
+            self._shed("deadline")
+
+    def try_acquire(self) -> Optional[Lease]:
+        """A slot if one is free right now (never queues)."""
+        if self.in_flight < self.slots and not self.waiters:
+            self.in_flight += 1
+            return Lease(self, self.clock())
+        return None
+
+    async def acquire(self, deadline: float) -> Lease:
+        """Wait for a slot in FIFO order; Overloaded if shed or still waiting at `deadline`."""
+        lease = self.try_acquire()
+        if lease is not None:
+            return lease
+        self.admit(deadline)
+        waiter = asyncio.get_running_loop().create_future()
+        self.waiters.append(waiter)
+        try:
+            async with asyncio.timeout(deadline - self.clock()):
+                await waiter
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # A slot was handed to us as we gave up: pass it on
+                self.in_flight -= 1
+                self._wake()
+            else:
+                waiter.cancel()
+                try:
+                    self.waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, TimeoutError):
+                self._shed("deadline")
+            raise
+        return Lease(self, self.clock())
+
+    def _wake(self):
+        """Hand free slots to waiters in arrival order (the slot is counted for them here)."""
+        while self.waiters and self.in_flight < self.slots:
+            waiter = self.waiters.popleft()
+            if not waiter.done():
+                self.in_flight += 1
+                waiter.set_result(None)
+
+    def _release(self, lease: Lease, error: Optional[BaseException]):
+        now = self.clock()
+        full = self.in_flight >= self.slots
+        self.in_flight -= 1
+        if error is None:
+            held = now - lease.started
+            self.hold = held if not self.hold else 0.9 * self.hold + 0.1 * held
+            if full:
+                self.limit = min(float(self.policy.concurrency), self.limit + 1 / self.limit)
+        elif is_overload(error) and lease.started >= self.decreased_at:
+            # Calls already in flight at the last decrease saw the same congestion; cut once per window
+            self.limit = max(1.0, self.limit * DECREASE)
+            self.decreased_at = now
+        self._wake()
+
+
+class Scheduler:
+    """One Limiter per upstream, and the retry/hedge logic around each call."""
+    def __init__(self, policies: Dict[str, UpstreamPolicy] = DEFAULT_POLICIES,
+                 clock: Callable[[], float] = time.monotonic):
+        self.clock = clock
+        self.limiters = {name: Limiter(name, policy, clock) for name, policy in policies.items()}
+
+    def admit(self, upstream: str):
+        """Fail fast with Overloaded if a call to `upstream` made now would be shed."""
+        limiter = self.limiters[upstream]
+        limiter.admit(self.clock() + limiter.policy.deadline)
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        """Queue depth, calls in flight and current limit per upstream."""
+        return {
+            name: {"queued": len(l.waiters), "in_flight": l.in_flight, "limit": l.slots}
+            for name, l in self.limiters.items()
+        }
+
+    async def call(self, upstream: str, attempt: Callable[[], Awaitable[T]], hedge: bool = False,
+                   attempts: Optional[int] = None) -> T:
+        """Run attempt() under `upstream`'s limits (see open()) and free the slot once it returns."""
+        value, lease = await self.open(upstream, attempt, hedge=hedge, attempts=attempts)
+        lease.release()
+        return value
+
+    async def open(self, upstream: str, attempt: Callable[[], Awaitable[T]], hedge: bool = False,
+                   attempts: Optional[int] = None,
+                   discard: Optional[Callable[[T], Awaitable[None]]] = None) -> Tuple[T, Lease]:
+        """Run attempt() in a slot, retrying and (if `hedge`) hedging it; return its result and the held slot.
+
+        The caller releases the lease once it is done with the result, e.g. after
+        reading a streamed body. Raises Overloaded when shed, DeadlineExceeded when
+        the upstream does not answer in time, or the last attempt's error. Pass
+        attempts=1 for calls that cannot be replayed (a request body read from the
+        client), and `discard` to close results of losing hedged attempts.
+        """
+        limiter = self.limiters[upstream]
+        policy = limiter.policy
+        deadline = self.clock() + policy.deadline
+        attempts = attempts or policy.attempts
+        for n in range(attempts):
+            lease = await limiter.acquire(deadline)
+            start = self.clock()
+            timeout = asyncio.timeout(deadline - start)
+            try:
+                async with timeout:
+                    if hedge and policy.hedge:
+                        value, lease = await self._hedged(limiter, attempt, lease, discard)
+                    else:
+                        value = await attempt()
+            except Exception as e:
+                lease.release(e)
+                if timeout.expired():
+                    raise DeadlineExceeded(upstream, f"{upstream} upstream timed out", limiter.retry_after()) from e
+                delay = max(random.uniform(0, min(BACKOFF_MAX, BACKOFF_BASE * 2 ** n)), retry_after(e))
+                if n + 1 >= attempts or not is_retryable(e) or self.clock() + delay >= deadline:
+                    raise
+                UPSTREAM_RETRIES.inc(upstream)
+                await asyncio.sleep(delay)
+                continue
+            except BaseException as e:
+                lease.release(e)
+                raise
+            limiter.latencies.append(self.clock() - start)
+            return value, lease
+
+    async def _hedged(self, limiter: Limiter, attempt: Callable[[], Awaitable[T]], lease: Lease,
+                      discard: Optional[Callable[[T], Awaitable[None]]]) -> Tuple[T, Lease]:
+        """attempt(), plus a second copy in a free slot if it is slower than the recent p95."""
+        first = asyncio.ensure_future(attempt())
+        running = {first: lease}
+        try:
+            delay = limiter.hedge_delay()
+            if delay is not None:
+                await asyncio.wait({first}, timeout=delay)
+                extra = None if first.done() else limiter.try_acquire()
+                if extra is not None:
+                    UPSTREAM_HEDGES.inc(limiter.name, "sent")
+                    running[asyncio.ensure_future(attempt())] = extra
+            error = None
+            while running:
+                done, _ = await asyncio.wait(running, return_when=asyncio.FIRST_COMPLETED)
+                for task in sorted(done, key=lambda t: t is not first):
+                    if task.exception() is None:
+                        if task is not first:
+                            UPSTREAM_HEDGES.inc(limiter.name, "won")
+                        return task.result(), running.pop(task)
+                    running.pop(task).release(task.exception())
+                    error = error or task.exception()
+            raise error
+        finally:
+            if running:
+                # Losing or abandoned attempts; shielded so a second cancellation cannot skip the cleanup
+                stopping = asyncio.gather(*(_stop(task, held, discard) for task, held in running.items()),
+                                          return_exceptions=True)
+                await asyncio.shield(stopping)
+
+
+async def _stop(task: "asyncio.Future[T]", held: Lease, discard: Optional[Callable[[T], Awaitable[None]]]):
+    """Cancel an attempt, wait for it to end and free its slot; discard() whatever it still returned.
+
+    An attempt can finish (e.g. with an open streaming response) just as it is
+    cancelled, so its result is only known once it has actually stopped.
+    """
+    task.cancel()
+    try:
+        await asyncio.wait({task})
+    finally:
+        held.release(asyncio.CancelledError())
+    if discard and not task.cancelled() and task.exception() is None:
+        await discard(task.result())
+
+
+scheduler = Scheduler()
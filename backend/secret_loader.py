@@ -1,10 +1,17 @@
-"""Safely load Azure OpenAI secrets from a fixed path."""
+"""Load Azure OpenAI secrets once and reload them only when secret.py changes."""
+from dataclasses import dataclass, fields, replace
+from typing import Optional, Tuple
 import importlib.util
-import sys
 import os
+import signal
+import threading
+import time
 
-SECRET_PATH = r"C:\Users\ahmtt\Documents\VS\API KEY\secret.py"
+SECRET_PATH = os.environ.get("VITALIS_SECRET_PATH", r"C:\Users\ahmtt\Documents\VS\API KEY\secret.py")
+# How often (seconds) a lookup may stat secret.py to notice edits
+CHECK_INTERVAL = float(os.environ.get("VITALIS_SECRET_CHECK_INTERVAL", "2"))
 
+@dataclass(frozen=True)
 class Secret:
     """Secrets for Azure OpenAI (loaded at runtime)."""
     AZURE_OPENAI_DEPLOYMENT: str = ""
@@ -19,36 +26,105 @@ class Secret:
     AZURE_SPEECH_TTS_ENDPOINT: str = ""
     AZURE_SPEECH_TTS_REGION: str = ""
 
+REQUIRED_FIELDS = (
+    "AZURE_OPENAI_DEPLOYMENT",
+    "AZURE_OPENAI_API_KEY",
+    "AZURE_OPENAI_ENDPOINT",
+    "AZURE_OPENAI_SPEECH_STT_DEPLOYMENT",
+    "AZURE_OPENAI_SPEECH_TTS_DEPLOYMENT",
+)
 
-def load_secrets() -> Secret:
-    """Dynamically import secret.py from fixed path. Fail gracefully if missing."""
-    if not os.path.exists(SECRET_PATH):
-        raise RuntimeError(f"secret.py not found at {SECRET_PATH}. Please create it with your Azure OpenAI credentials.")
+
+def _file_id(path: str) -> Optional[Tuple[int, int, int]]:
     try:
-        spec = importlib.util.spec_from_file_location("secret", SECRET_PATH)
-        secret = importlib.util.module_from_spec(spec)
-        sys.modules["secret"] = secret
-        spec.loader.exec_module(secret)
-        s = Secret()
-        s.AZURE_OPENAI_DEPLOYMENT = getattr(secret, "AZURE_OPENAI_DEPLOYMENT", "")
-        s.AZURE_OPENAI_API_KEY = getattr(secret, "AZURE_OPENAI_API_KEY", "")
-        s.AZURE_OPENAI_ENDPOINT = getattr(secret, "AZURE_OPENAI_ENDPOINT", "")
-        s.AZURE_OPENAI_SPEECH_STT_DEPLOYMENT = getattr(secret, "AZURE_OPENAI_SPEECH_STT_DEPLOYMENT", "")
-        s.AZURE_SPEECH_STT_KEY = getattr(secret, "AZURE_SPEECH_STT_KEY", "")
-        s.AZURE_SPEECH_STT_ENDPOINT = getattr(secret, "AZURE_SPEECH_STT_ENDPOINT", "")
-        s.AZURE_SPEECH_STT_REGION = getattr(secret, "AZURE_SPEECH_STT_REGION", "")
-        s.AZURE_OPENAI_SPEECH_TTS_DEPLOYMENT = getattr(secret, "AZURE_OPENAI_SPEECH_TTS_DEPLOYMENT", "")
-        s.AZURE_SPEECH_TTS_KEY = getattr(secret, "AZURE_SPEECH_TTS_KEY", "")
-        s.AZURE_SPEECH_TTS_ENDPOINT = getattr(secret, "AZURE_SPEECH_TTS_ENDPOINT", "")
-        s.AZURE_SPEECH_TTS_REGION = getattr(secret, "AZURE_SPEECH_TTS_REGION", "")
-        if not all([
-            s.AZURE_OPENAI_DEPLOYMENT,
-            s.AZURE_OPENAI_API_KEY,
-            s.AZURE_OPENAI_ENDPOINT,
-            s.AZURE_OPENAI_SPEECH_STT_DEPLOYMENT,
-            s.AZURE_OPENAI_SPEECH_TTS_DEPLOYMENT,
-        ]):
+        st = os.stat(path)
+    except OSError:
+        return None
+    return (st.st_ino, st.st_mtime_ns, st.st_size)
+
+
+def _read_secret_file(path: str) -> Secret:
+    """Execute secret.py without registering it in sys.modules."""
+    spec = importlib.util.spec_from_file_location("secret", path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return Secret(**{f.name: getattr(module, f.name, "") for f in fields(Secret)})
+
+
+class SecretProvider:
+    """Serve a cached, immutable Secret and reload it when secret.py changes.
+
+    Lookups return the cached Secret without touching the filesystem; at most once
+    per check_interval a lookup stats the file and reloads if its inode, mtime or
+    size changed. invalidate() (also bound to SIGHUP) forces a reload on the next
+    lookup. Environment variables named like the Secret fields override the file.
+    """
+    def __init__(self, path: str = SECRET_PATH, check_interval: float = CHECK_INTERVAL):
+        self.path = path
+        self.check_interval = check_interval
+        self._lock = threading.Lock()
+        self._secret: Optional[Secret] = None
+        self._file_id: Optional[Tuple[int, int, int]] = None
+        self._next_check = 0.0
+        self._stale = True
+
+    def get(self) -> Secret:
+        """Return the current secrets, reloading only if due or invalidated."""
+        secret = self._secret
+        if secret is not None and not self._stale and time.monotonic() < self._next_check:
+            return secret
+        return self._refresh()
+
+    def invalidate(self):
+        """Force a reload on the next lookup."""
+        self._stale = True
+
+    def _refresh(self) -> Secret:
+        with self._lock:
+            now = time.monotonic()
+            if self._secret is not None and not self._stale and now < self._next_check:
+                return self._secret
+            file_id = _file_id(self.path)
+            if self._secret is None or self._stale or file_id != self._file_id:
+                try:
+                    self._secret = self._load(file_id)
+                except Exception:
+                    # Keep serving the last good secrets if an edit is half-written
+                    if self._secret is None:
+                        raise
+                self._file_id = file_id
+                self._stale = False
+            self._next_check = now + self.check_interval
+            return self._secret
+
+    def _load(self, file_id) -> Secret:
+        overrides = {f.name: os.environ[f.name] for f in fields(Secret) if os.environ.get(f.name)}
+        if file_id is not None:
+            try:
+                secret = _read_secret_file(self.path)
+            except Exception:
+                raise RuntimeError("Failed to load secrets from secret.py. Please check the file and try again. [REDACTED]") from None
+        elif overrides:
+            secret = Secret()
+        else:
+            raise RuntimeError(f"secret.py not found at {self.path}. Please create it with your Azure OpenAI credentials.")
+        secret = replace(secret, **overrides)
+        if not all(getattr(secret, name) for name in REQUIRED_FIELDS):
             raise RuntimeError("secret.py is missing required fields. Please check your credentials.")
-        return s
-    except Exception as e:
-        raise RuntimeError("Failed to load secrets from secret.py. Please check the file and try again. [REDACTED]") from None 
\ No newline at end of file
+        return secret
+
+    def install_signal_handler(self):
+        """Reload secrets on SIGHUP (main thread, POSIX only)."""
+        if hasattr(signal, "SIGHUP"):
+            try:
+                signal.signal(signal.SIGHUP, lambda signum, frame: self.invalidate())
+            except ValueError:
+                pass
+
+
+provider = SecretProvider()
+
+
+def load_secrets() -> Secret:
+    """Return cached secrets from secret.py (plus env overrides). Fail gracefully if missing."""
+    return provider.get()
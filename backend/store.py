@@ -1,35 +1,607 @@
-"""In-memory store for chat and workout logs."""
-from typing import Dict, List, Any
-from collections import deque
+"""Stores for chat and workout logs: in-memory (optionally journaled) or shared SQLite."""
+from abc import ABC, abstractmethod
+from typing import Callable, Dict, List, Any, Optional, Tuple
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 from datetime import datetime
+import asyncio
+import inspect
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+
+from journal import Journal
+from metrics import log_event
+from proxy import MethodProxy
+from ratelimit import DEFAULT_LIMITS, RateLimit, RateLimiter
+from recovery import MuscleSummary
+from workout_log import WorkoutColumns
 
 CHAT_HISTORY_LIMIT = 20
+SNAPSHOT_EVERY = 10000
+# Prompt budget for chat history sent upstream
+CHAT_CONTEXT_TOKENS = int(os.environ.get("VITALIS_CHAT_CONTEXT_TOKENS", "3000"))
+# Per-message framing cost (role, separators) in chat-completion prompts
+MESSAGE_OVERHEAD_TOKENS = 4
+
+try:
+    import tiktoken
+    _encoding = tiktoken.get_encoding("cl100k_base")
+except Exception:
+    _encoding = None
+
+
+def count_tokens(text: str) -> int:
+    """Prompt tokens for one chat message (tiktoken if installed, else ~4 chars/token)."""
+    if _encoding is not None:
+        return len(_encoding.encode(text)) + MESSAGE_OVERHEAD_TOKENS
+    return len(text) // 4 + 1 + MESSAGE_OVERHEAD_TOKENS
+
+
+class StoreBackend(ABC):
+    """Interface the app uses for user data and rate limits.
+
+    Store keeps everything in the current process; SQLiteStore shares one database
+    between all worker processes on a host. Backends whose calls can block on I/O
+    set `blocking`, and AsyncStore then runs them off the event loop.
+    """
+    blocking = False
+
+    @abstractmethod
+    def append_chat(self, uid: str, role: str, content: str):
+        """Append a chat message to history, capped."""
+
+    @abstractmethod
+    def get_chat_history(self, uid: str) -> List[dict]:
+        """Get recent chat history for user."""
+
+    @abstractmethod
+    def get_chat_context(self, uid: str, budget: int = CHAT_CONTEXT_TOKENS) -> List[dict]:
+        """Most recent messages that fit in `budget` prompt tokens, oldest first."""
+
+    @abstractmethod
+    def log_workout(self, uid: str, log: dict):
+        """Log a workout for user and fold it into the recovery summary."""
+
+    @abstractmethod
+    def log_workouts(self, entries: List[Tuple[str, dict]]):
+        """Log a batch of (uid, log) workouts in one call."""
+
+    @abstractmethod
+    def get_workouts(self, uid: str) -> List[dict]:
+        """Get all workout logs for user."""
+
+    @abstractmethod
+    def get_recovery_summary(self, uid: str) -> MuscleSummary:
+        """Get the incrementally maintained recovery summary for user."""
+
+    @abstractmethod
+    def get_data_version(self, uid: str) -> int:
+        """Counter bumped on every workout logged for user (0 if none)."""
+
+    @abstractmethod
+    def rebuild_recovery_summary(self, uid: str) -> MuscleSummary:
+        """Recompute the recovery summary for user from the full log list."""
+
+    @abstractmethod
+    def check_rate(self, endpoint: str, key: str) -> float:
+        """Take a rate-limit token; return 0.0 if allowed, else seconds to wait."""
+
+    async def flush(self):
+        """Wait until every write made so far is on disk (a no-op unless writes are buffered)."""
+
+    def close(self):
+        """Release resources held by the store."""
+
 
-class Store:
-    """Simple in-memory store for user data."""
+class Store(StoreBackend):
+    """Simple in-memory store for user data.
+
+    Not thread-safe: call it from the event loop only (AsyncStore calls it inline).
+    DurableStore adds the locking it needs for its journal thread.
+    """
     def __init__(self):
-        self.chat_history: Dict[str, deque] = {}
-        self.workout_logs: Dict[str, List[dict]] = {}
-        self.chat_rate: Dict[str, int] = {}
+        self.chat_history: Dict[str, Tuple[dict, ...]] = {}
+        self.chat_tokens: Dict[str, Tuple[int, ...]] = {}
+        self.workout_logs: Dict[str, WorkoutColumns] = {}
+        self.recovery_summary: Dict[str, MuscleSummary] = {}
+        self.data_version: Dict[str, int] = {}
+        self.rate_limiter = RateLimiter()
+
+    def append_chat(self, uid: str, role: str, content: str):
+        """Append a chat message to history, capped.
+
+        Histories are short tuples replaced on every append, never mutated, so
+        a reference to one is a stable view (DurableStore snapshots rely on it).
+        """
+        keep = CHAT_HISTORY_LIMIT * 2 - 1
+        self.chat_history[uid] = self.chat_history.get(uid, ())[-keep:] + ({"role": role, "content": content},)
+        self.chat_tokens[uid] = self.chat_tokens.get(uid, ())[-keep:] + (count_tokens(content),)
+
+    def get_chat_history(self, uid: str) -> List[dict]:
+        """Get recent chat history for user."""
+        return list(self.chat_history.get(uid, ()))
+
+    def get_chat_context(self, uid: str, budget: int = CHAT_CONTEXT_TOKENS) -> List[dict]:
+        """Most recent messages that fit in `budget` prompt tokens, oldest first.
+
+        Uses the token counts cached by append_chat; the latest message is always
+        included. The returned dicts are the stored ones and can be sent as-is.
+        """
+        history = self.chat_history.get(uid)
+        if not history:
+            return []
+        total = n = 0
+        for tokens in reversed(self.chat_tokens[uid]):
+            if n and total + tokens > budget:
+                break
+            total += tokens
+            n += 1
+        return list(history[len(history) - n:])
+
+    def log_workout(self, uid: str, log: dict):
+        """Log a workout for user and fold it into the recovery summary."""
+        logs = self.workout_logs.get(uid)
+        if logs is None:
+            logs = self.workout_logs[uid] = WorkoutColumns(uid)
+            self.recovery_summary[uid] = MuscleSummary()
+        logs.append(log)
+        self.recovery_summary[uid].add_row(*logs.row(len(logs) - 1))
+        self.data_version[uid] = self.data_version.get(uid, 0) + 1
+
+    def log_workouts(self, entries: List[Tuple[str, dict]]):
+        """Log a batch of (uid, log) workouts in one call."""
+        for uid, log in entries:
+            Store.log_workout(self, uid, log)
+
+    def get_workouts(self, uid: str) -> List[dict]:
+        """Get all workout logs for user."""
+        logs = self.workout_logs.get(uid)
+        return logs.to_dicts() if logs is not None else []
+
+    def get_recovery_summary(self, uid: str) -> MuscleSummary:
+        """Get the incrementally maintained recovery summary for user."""
+        summary = self.recovery_summary.get(uid)
+        return summary if summary is not None else MuscleSummary()
+
+    def get_data_version(self, uid: str) -> int:
+        """Counter bumped on every workout logged for user (0 if none)."""
+        return self.data_version.get(uid, 0)
+
+    def rebuild_recovery_summary(self, uid: str) -> MuscleSummary:
+        """Recompute the recovery summary for user from the full log list."""
+        logs = self.workout_logs.get(uid)
+        summary = MuscleSummary.from_rows(logs.rows()) if logs is not None else MuscleSummary()
+        self.recovery_summary[uid] = summary
+        return summary
+
+    def check_rate(self, endpoint: str, key: str) -> float:
+        """Take a rate-limit token; return 0.0 if allowed, else seconds to wait."""
+        return self.rate_limiter.check(endpoint, key)
+
+
+def _encode_log(log: dict) -> dict:
+    entry = dict(log)
+    if isinstance(entry.get("ts"), datetime):
+        entry["ts"] = entry["ts"].isoformat()
+    return entry
+
+
+def _decode_log(entry: dict) -> dict:
+    log = dict(entry)
+    if isinstance(log.get("ts"), str):
+        log["ts"] = datetime.fromisoformat(log["ts"])
+    return log
+
+
+class DurableStore(Store):
+    """Store that journals every write to disk and restores it on startup.
+
+    Writes are applied in memory and queued on a group-commit Journal, and are
+    on disk within one commit cycle. Async callers acknowledge a write only after
+    `await flush()`; with wait_durable=True each write call instead blocks until
+    its record is fsynced, which is only appropriate for threaded callers.
+    """
+    def __init__(self, directory: str, snapshot_every: int = SNAPSHOT_EVERY, wait_durable: bool = False):
+        super().__init__()
+        self.snapshot_every = snapshot_every
+        self.wait_durable = wait_durable
+        self._lock = threading.Lock()
+        self.journal = Journal(directory)
+        state, records = self.journal.replay()
+        if state:
+            self._load_state(state)
+        for record in records:
+            self._apply(record)
+        self._since_snapshot = len(records)
+        self.journal.start()
+
+    def append_chat(self, uid: str, role: str, content: str):
+        """Append a chat message to history and journal it."""
+        with self._lock:
+            super().append_chat(uid, role, content)
+            seq = self._record({"op": "chat", "uid": uid, "role": role, "content": content})
+        self._wait(seq)
+
+    def log_workout(self, uid: str, log: dict):
+        """Log a workout for user and journal it."""
+        with self._lock:
+            super().log_workout(uid, log)
+            seq = self._record({"op": "workout", "uid": uid, "log": _encode_log(log)})
+        self._wait(seq)
+
+    def log_workouts(self, entries: List[Tuple[str, dict]]):
+        """Log a batch of workouts under one lock as a single journal record."""
+        if not entries:
+            return
+        with self._lock:
+            super().log_workouts(entries)
+            seq = self._record({"op": "workouts", "logs": [[uid, _encode_log(log)] for uid, log in entries]})
+        self._wait(seq)
+
+    async def flush(self):
+        """Wait, without blocking the event loop, until every write so far is fsynced."""
+        await self.journal.wait_async(self.journal.last_seq)
+
+    def close(self):
+        """Flush pending writes and stop the journal."""
+        self.journal.close()
+
+    def _record(self, record: dict) -> int:
+        seq = self.journal.append(record)
+        self._since_snapshot += 1
+        if self._since_snapshot >= self.snapshot_every:
+            self.journal.snapshot(self._snapshot())
+            self._since_snapshot = 0
+        return seq
+
+    def _wait(self, seq: int):
+        if self.wait_durable:
+            self.journal.wait(seq)
+
+    def _apply(self, record: dict):
+        if record["op"] == "chat":
+            Store.append_chat(self, record["uid"], record["role"], record["content"])
+        elif record["op"] == "workout":
+            Store.log_workout(self, record["uid"], _decode_log(record["log"]))
+        elif record["op"] == "workouts":
+            Store.log_workouts(self, [(uid, _decode_log(log)) for uid, log in record["logs"]])
+
+    def _snapshot(self) -> Callable[[], dict]:
+        """Capture the current state cheaply; the returned build() serializes it later.
+
+        Called under the lock, and only takes references: chat histories are
+        immutable tuples and workout logs are append-only, so each user's current
+        tuple and log row count pin the state, and the journal thread copies and
+        encodes it while new writes keep arriving.
+        """
+        chats = dict(self.chat_history)
+        marks = [(uid, logs, len(logs)) for uid, logs in self.workout_logs.items()]
+
+        def build() -> dict:
+            return {
+                "chat_history": {uid: list(h) for uid, h in chats.items()},
+                "workout_logs": {uid: [_encode_log(l) for l in logs.to_dicts(n)] for uid, logs, n in marks},
+            }
+        return build
+
+    def _load_state(self, state: dict):
+        for uid, history in state.get("chat_history", {}).items():
+            for m in history:
+                Store.append_chat(self, uid, m["role"], m["content"])
+        for uid, logs in state.get("workout_logs", {}).items():
+            for entry in logs:
+                Store.log_workout(self, uid, _decode_log(entry))
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS chat (
+    id INTEGER PRIMARY KEY, uid TEXT NOT NULL, role TEXT NOT NULL, content TEXT NOT NULL, tokens INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS chat_uid ON chat (uid, id);
+CREATE TABLE IF NOT EXISTS workouts (
+    id INTEGER PRIMARY KEY, uid TEXT NOT NULL, ts_us INTEGER NOT NULL, muscles INTEGER NOT NULL,
+    effort INTEGER NOT NULL, soreness INTEGER NOT NULL, duration INTEGER NOT NULL, extra TEXT
+);
+CREATE INDEX IF NOT EXISTS workouts_uid ON workouts (uid, id);
+CREATE TABLE IF NOT EXISTS summaries (uid TEXT PRIMARY KEY, version INTEGER NOT NULL, summary TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS rate (
+    endpoint TEXT NOT NULL, key TEXT NOT NULL, tokens REAL NOT NULL, updated REAL NOT NULL,
+    PRIMARY KEY (endpoint, key)
+) WITHOUT ROWID;
+"""
+
+# Idle rate-limit buckets are swept after this many checks in a process
+RATE_SWEEP_EVERY = 1000
+# How long a rate check waits for another worker's write lock before letting the request through
+RATE_BUSY_TIMEOUT = float(os.environ.get("VITALIS_RATE_BUSY_TIMEOUT", "0.25"))
+# Threads running blocking store calls for the event loop (see AsyncStore)
+STORE_THREADS = int(os.environ.get("VITALIS_STORE_THREADS", "4"))
+
+
+def _dumps(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+
+def _encode_row(raw: tuple) -> tuple:
+    *row, unknown, overflow = raw
+    extra = _dumps([unknown, overflow]) if unknown or overflow else None
+    return (*row, extra)
+
+
+class SQLiteStore(StoreBackend):
+    """Store shared by every worker process on a host, kept in one SQLite file in WAL mode.
+
+    Each process opens its own connection (reopened after a fork). Writes run in
+    short BEGIN IMMEDIATE transactions, so concurrent workers queue on the database
+    lock instead of overwriting each other; WAL lets reads proceed meanwhile.
+    Recovery summaries and data versions are updated in the same transaction as
+    the logs, so reads never replay a user's history. Rate-limit buckets live in
+    the database too, which makes limits global rather than per worker; rate
+    checks use their own connection with a short busy timeout, so they never queue
+    behind this process's data writes and give up quickly under contention.
+    Every call blocks, so async code goes through AsyncStore.
+    """
+    blocking = True
+
+    def __init__(
+        self,
+        path: str,
+        limits: Dict[str, RateLimit] = DEFAULT_LIMITS,
+        busy_timeout: float = 10.0,
+        clock: Callable[[], float] = time.time,
+        rate_busy_timeout: float = RATE_BUSY_TIMEOUT,
+    ):
+        self.path = path
+        self.limits = limits
+        self.busy_timeout = busy_timeout
+        self.rate_busy_timeout = rate_busy_timeout
+        # Wall-clock time, so buckets mean the same thing in every process
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._rate_lock = threading.Lock()
+        self._conn = None
+        self._rate_conn = None
+        self._pid = None
+        self._rate_pid = None
+        self._checks = 0
+        with self._lock:
+            self._connect().executescript(_SCHEMA)
+
+    def _open(self, timeout: float) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        conn.execute("PRAGMA journal_mode=WAL")
+        # Durable at checkpoints; a power loss can drop the last commits but never corrupts
+        conn.execute("PRAGMA synchronous=NORMAL")
+        return conn
+
+    def _connect(self) -> sqlite3.Connection:
+        if self._conn is None or self._pid != os.getpid():
+            self._conn, self._pid = self._open(self.busy_timeout), os.getpid()
+        return self._conn
+
+    def _rate_connect(self) -> sqlite3.Connection:
+        if self._rate_conn is None or self._rate_pid != os.getpid():
+            self._rate_conn, self._rate_pid = self._open(self.rate_busy_timeout), os.getpid()
+        return self._rate_conn
+
+    @contextmanager
+    def _read(self):
+        with self._lock:
+            yield self._connect()
+
+    @contextmanager
+    def _write(self, lock: Optional[threading.Lock] = None, connect: Optional[Callable] = None):
+        with lock or self._lock:
+            conn = (connect or self._connect)()
+            conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
 
     def append_chat(self, uid: str, role: str, content: str):
         """Append a chat message to history, capped."""
-        if uid not in self.chat_history:
-            self.chat_history[uid] = deque(maxlen=CHAT_HISTORY_LIMIT * 2)
-        self.chat_history[uid].append({"role": role, "content": content})
+        with self._write() as conn:
+            conn.execute(
+                "INSERT INTO chat (uid, role, content, tokens) VALUES (?, ?, ?, ?)",
+                (uid, role, content, count_tokens(content)),
+            )
+            conn.execute(
+                "DELETE FROM chat WHERE uid = ? AND id <= "
+                "(SELECT id FROM chat WHERE uid = ? ORDER BY id DESC LIMIT 1 OFFSET ?)",
+                (uid, uid, CHAT_HISTORY_LIMIT * 2),
+            )
+
+    def _recent_chat(self, uid: str) -> List[Tuple[str, str, int]]:
+        with self._read() as conn:
+            rows = conn.execute(
+                "SELECT role, content, tokens FROM chat WHERE uid = ? ORDER BY id DESC LIMIT ?",
+                (uid, CHAT_HISTORY_LIMIT * 2),
+            ).fetchall()
+        rows.reverse()
+        return rows
 
     def get_chat_history(self, uid: str) -> List[dict]:
         """Get recent chat history for user."""
-        return list(self.chat_history.get(uid, []))[-CHAT_HISTORY_LIMIT*2:]
+        return [{"role": role, "content": content} for role, content, _ in self._recent_chat(uid)]
+
+    def get_chat_context(self, uid: str, budget: int = CHAT_CONTEXT_TOKENS) -> List[dict]:
+        """Most recent messages that fit in `budget` prompt tokens, oldest first."""
+        rows = self._recent_chat(uid)
+        total = n = 0
+        for _, _, tokens in reversed(rows):
+            if n and total + tokens > budget:
+                break
+            total += tokens
+            n += 1
+        return [{"role": role, "content": content} for role, content, _ in rows[len(rows) - n:]]
 
     def log_workout(self, uid: str, log: dict):
-        """Log a workout for user."""
-        if uid not in self.workout_logs:
-            self.workout_logs[uid] = []
-        self.workout_logs[uid].append(log)
+        """Log a workout for user and fold it into the recovery summary."""
+        self.log_workouts([(uid, log)])
+
+    def log_workouts(self, entries: List[Tuple[str, dict]]):
+        """Log a batch of (uid, log) workouts in one transaction."""
+        if not entries:
+            return
+        by_uid: Dict[str, List[dict]] = {}
+        for uid, log in entries:
+            by_uid.setdefault(uid, []).append(log)
+        with self._write() as conn:
+            for uid, logs in by_uid.items():
+                columns = WorkoutColumns(uid)
+                columns.extend(logs)
+                conn.executemany(
+                    "INSERT INTO workouts (uid, ts_us, muscles, effort, soreness, duration, extra) "
+                    "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    [(uid, *_encode_row(columns.raw(i))) for i in range(len(columns))],
+                )
+                summary, version = self._summary(conn, uid)
+                for row in columns.rows():
+                    summary.add_row(*row)
+                self._save_summary(conn, uid, summary, version + len(logs))
 
     def get_workouts(self, uid: str) -> List[dict]:
         """Get all workout logs for user."""
-        return self.workout_logs.get(uid, [])
+        with self._read() as conn:
+            return self._columns(conn, uid).to_dicts()
+
+    def get_recovery_summary(self, uid: str) -> MuscleSummary:
+        """Get the incrementally maintained recovery summary for user."""
+        with self._read() as conn:
+            return self._summary(conn, uid)[0]
+
+    def get_data_version(self, uid: str) -> int:
+        """Counter bumped on every workout logged for user (0 if none)."""
+        with self._read() as conn:
+            row = conn.execute("SELECT version FROM summaries WHERE uid = ?", (uid,)).fetchone()
+        return row[0] if row else 0
+
+    def rebuild_recovery_summary(self, uid: str) -> MuscleSummary:
+        """Recompute the recovery summary for user from the full log list."""
+        with self._write() as conn:
+            columns = self._columns(conn, uid)
+            summary = MuscleSummary.from_rows(columns.rows())
+            if len(columns):
+                self._save_summary(conn, uid, summary, self._summary(conn, uid)[1])
+        return summary
+
+    def check_rate(self, endpoint: str, key: str) -> float:
+        """Take a rate-limit token; return 0.0 if allowed, else seconds to wait.
+
+        Same token bucket as RateLimiter, read and updated in one transaction. If
+        other workers hold the database lock for longer than rate_busy_timeout,
+        the request is let through rather than stalled (fail open).
+        """
+        limit = self.limits.get(endpoint)
+        if limit is None:
+            return 0.0
+        capacity, rate = float(limit.requests), limit.requests / limit.seconds
+        try:
+            with self._write(self._rate_lock, self._rate_connect) as conn:
+                allowed, tokens = self._take_token(conn, endpoint, key, capacity, rate)
+        except sqlite3.OperationalError as e:
+            log_event("rate_check_skipped", logging.WARNING, endpoint=endpoint, error=str(e))
+            return 0.0
+        return 0.0 if allowed else (1.0 - tokens) / rate
+
+    def _take_token(self, conn: sqlite3.Connection, endpoint: str, key: str, capacity: float,
+                    rate: float) -> Tuple[bool, float]:
+        now = self.clock()
+        row = conn.execute("SELECT tokens, updated FROM rate WHERE endpoint = ? AND key = ?", (endpoint, key)).fetchone()
+        tokens = capacity if row is None else min(capacity, row[0] + max(0.0, now - row[1]) * rate)
+        allowed = tokens >= 1.0
+        if allowed:
+            tokens -= 1.0
+        conn.execute("INSERT OR REPLACE INTO rate VALUES (?, ?, ?, ?)", (endpoint, key, tokens, now))
+        self._checks += 1
+        if self._checks % RATE_SWEEP_EVERY == 0:
+            # A bucket idle for a full window is full again, so dropping it changes nothing
+            for name, lim in self.limits.items():
+                conn.execute("DELETE FROM rate WHERE endpoint = ? AND updated < ?", (name, now - lim.seconds))
+        return allowed, tokens
+
+    def close(self):
+        """Close this process's connections."""
+        with self._lock:
+            if self._conn is not None and self._pid == os.getpid():
+                self._conn.close()
+            self._conn = None
+        with self._rate_lock:
+            if self._rate_conn is not None and self._rate_pid == os.getpid():
+                self._rate_conn.close()
+            self._rate_conn = None
+
+    @staticmethod
+    def _columns(conn: sqlite3.Connection, uid: str) -> WorkoutColumns:
+        columns = WorkoutColumns(uid)
+        for *row, extra in conn.execute(
+            "SELECT ts_us, muscles, effort, soreness, duration, extra FROM workouts WHERE uid = ? ORDER BY id", (uid,)
+        ):
+            unknown, overflow = json.loads(extra) if extra else (None, None)
+            columns.append_raw(*row, unknown, overflow)
+        return columns
+
+    @staticmethod
+    def _summary(conn: sqlite3.Connection, uid: str) -> Tuple[MuscleSummary, int]:
+        row = conn.execute("SELECT summary, version FROM summaries WHERE uid = ?", (uid,)).fetchone()
+        if row is None:
+            return MuscleSummary(), 0
+        return MuscleSummary.from_dict(json.loads(row[0])), row[1]
+
+    @staticmethod
+    def _save_summary(conn: sqlite3.Connection, uid: str, summary: MuscleSummary, version: int):
+        conn.execute("INSERT OR REPLACE INTO summaries VALUES (?, ?, ?)", (uid, version, _dumps(summary.to_dict())))
+
+
+class AsyncStore(MethodProxy):
+    """Awaitable view of a store for async handlers: `await store.log_workout(...)`.
+
+    Calls to a blocking backend (SQLiteStore) run on a small dedicated thread
+    pool, so a busy database never stalls the event loop. The in-memory stores
+    are called inline: they never block and are not thread-safe. run() makes
+    several calls in one hop.
+    """
+    def __init__(self, store, threads: int = STORE_THREADS):
+        super().__init__(store)
+        self._executor = ThreadPoolExecutor(threads, thread_name_prefix="store") if store.blocking else None
+
+    async def run(self, fn: Callable[[Any], Any]) -> Any:
+        """fn(store), on the store threads if the backend blocks."""
+        if self._executor is None:
+            return fn(self._target)
+        return await asyncio.get_running_loop().run_in_executor(self._executor, fn, self._target)
+
+    def wrap(self, name: str, method: Callable):
+        if inspect.iscoroutinefunction(method):
+            return method
+
+        async def call(*args, **kwargs):
+            return await self.run(lambda store: method(*args, **kwargs))
+        return call
+
+    def close(self):
+        """Close the store and stop its threads."""
+        self._target.close()
+        if self._executor is not None:
+            self._executor.shutdown()
+
+
+# Set VITALIS_STORE_DB to share user data and rate limits between worker processes
+# (uvicorn --workers) through one SQLite file; VITALIS_STORE_DIR keeps the
+# in-process store but persists it across restarts
+STORE_DB = os.environ.get("VITALIS_STORE_DB", "")
+STORE_DIR = os.environ.get("VITALIS_STORE_DIR", "")
 
-store = Store() 
\ No newline at end of file
+if STORE_DB:
+    store: StoreBackend = SQLiteStore(STORE_DB)
+elif STORE_DIR:
+    store = DurableStore(STORE_DIR)
+else:
+    store = Store()
@@ -0,0 +1,175 @@
+"""Token streaming pipeline: delta coalescing, sentence splitting, ordered fan-out, SSE framing."""
+from typing import AsyncIterator, Callable, Optional, Tuple
+import asyncio
+import os
+import re
+
+# Flush buffered deltas after this long or once this many bytes are buffered
+FLUSH_SECONDS = float(os.environ.get("VITALIS_STREAM_FLUSH_MS", "20")) / 1000
+FLUSH_BYTES = int(os.environ.get("VITALIS_STREAM_FLUSH_BYTES", "256"))
+# SSE mode sends a comment line when the upstream has been silent this long
+HEARTBEAT_SECONDS = float(os.environ.get("VITALIS_STREAM_HEARTBEAT_S", "15"))
+
+# Sentences shorter than this are merged into the next one before being spoken
+MIN_SENTENCE_CHARS = int(os.environ.get("VITALIS_VOICE_MIN_SENTENCE_CHARS", "12"))
+# Sentence-ending punctuation (plus closing quotes/brackets) followed by whitespace, or a line break
+SENTENCE_END = re.compile(r"""[.!?…]+["')\]]*\s+|\n+""")
+
+_DONE = object()
+
+
+async def coalesce(
+    deltas: AsyncIterator[str],
+    max_bytes: Optional[int] = None,
+    max_delay: Optional[float] = None,
+    heartbeat: Optional[float] = None,
+) -> AsyncIterator[Optional[str]]:
+    """Group small deltas into larger chunks.
+
+    The first delta is passed through at once (time-to-first-token is unchanged);
+    after that a chunk is emitted when max_bytes are buffered or max_delay has
+    passed since the oldest buffered delta. If `heartbeat` is set and nothing
+    arrives for that long, None is yielded so the caller can send a keep-alive.
+    The upstream is read by a separate task so flush timers fire even while it is
+    silent; closing this generator cancels that task, which closes the upstream.
+    """
+    max_bytes = FLUSH_BYTES if max_bytes is None else max_bytes
+    max_delay = FLUSH_SECONDS if max_delay is None else max_delay
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+
+    async def pump():
+        try:
+            async for delta in deltas:
+                queue.put_nowait(delta)
+            queue.put_nowait(_DONE)
+        except Exception as e:
+            queue.put_nowait(e)
+
+    task = asyncio.create_task(pump())
+    buf, size, deadline, first = [], 0, 0.0, True
+    try:
+        while True:
+            timeout = max(0.0, deadline - loop.time()) if buf else heartbeat
+            try:
+                item = await asyncio.wait_for(queue.get(), timeout)
+            except asyncio.TimeoutError:
+                if buf:
+                    yield "".join(buf)
+                    buf, size = [], 0
+                else:
+                    yield None
+                continue
+            if item is _DONE or isinstance(item, Exception):
+                if buf:
+                    yield "".join(buf)
+                if item is not _DONE:
+                    raise item
+                return
+            if not buf:
+                deadline = loop.time() + max_delay
+            buf.append(item)
+            size += len(item.encode())
+            if first or size >= max_bytes:
+                yield "".join(buf)
+                buf, size, first = [], 0, False
+    finally:
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+
+
+async def split_sentences(deltas: AsyncIterator[str], min_chars: Optional[int] = None) -> AsyncIterator[str]:
+    """Regroup streamed text into sentences, each yielded as soon as it is complete.
+
+    A boundary needs whitespace after the punctuation, so "3.5" or a sentence
+    whose final space has not arrived yet is never split early. Fragments shorter
+    than min_chars ("Hi!") are joined to the following sentence.
+    """
+    min_chars = MIN_SENTENCE_CHARS if min_chars is None else min_chars
+    buf = ""
+    async for delta in deltas:
+        buf += delta
+        start = 0
+        for match in SENTENCE_END.finditer(buf):
+            sentence = buf[start:match.end()].strip()
+            if len(sentence) >= min_chars:
+                yield sentence
+                start = match.end()
+        buf = buf[start:]
+    if buf.strip():
+        yield buf.strip()
+
+
+async def pipelined(
+    items: AsyncIterator[str],
+    produce: Callable[[str], AsyncIterator[bytes]],
+    parallel: int,
+) -> AsyncIterator[Tuple[str, AsyncIterator[bytes]]]:
+    """Start produce(item) as each item arrives and yield (item, its chunks) in input order.
+
+    Up to `parallel` producers run at once (the earliest item always holds a
+    slot), so later items are prepared while earlier ones are still being
+    consumed; their chunks wait in memory until their turn. Each chunk iterator
+    must be drained before the next pair is requested. Errors from `items` are
+    raised after everything before them; closing this generator cancels all work.
+    """
+    slots = asyncio.Semaphore(parallel)
+    order: asyncio.Queue = asyncio.Queue()
+    tasks = []
+
+    async def fill(item, out):
+        try:
+            async with slots:
+                async for chunk in produce(item):
+                    out.put_nowait(chunk)
+            out.put_nowait(_DONE)
+        except Exception as e:
+            out.put_nowait(e)
+
+    async def feed():
+        try:
+            async for item in items:
+                out: asyncio.Queue = asyncio.Queue()
+                tasks.append(asyncio.create_task(fill(item, out)))
+                order.put_nowait((item, out))
+            order.put_nowait(_DONE)
+        except Exception as e:
+            order.put_nowait(e)
+
+    tasks.append(asyncio.create_task(feed()))
+    try:
+        while True:
+            entry = await order.get()
+            if entry is _DONE:
+                return
+            if isinstance(entry, Exception):
+                raise entry
+            item, out = entry
+            yield item, _drain(out)
+    finally:
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def _drain(queue: asyncio.Queue) -> AsyncIterator[bytes]:
+    while True:
+        chunk = await queue.get()
+        if chunk is _DONE:
+            return
+        if isinstance(chunk, Exception):
+            raise chunk
+        yield chunk
+
+
+def sse_event(data: str, event: Optional[str] = None) -> str:
+    """Frame `data` as one Server-Sent Event (multi-line data is split per spec)."""
+    lines = [f"event: {event}"] if event else []
+    lines.extend(f"data: {line}" for line in data.split("\n"))
+    return "\n".join(lines) + "\n\n"
+
+
+SSE_HEARTBEAT = ": ping\n\n"
@@ -0,0 +1,148 @@
+"""Local stub of the Azure chat-completions, STT and TTS endpoints for benchmarks.
+
+Run standalone with `python stub_upstream.py [port]`, or start it in a background
+thread with `serve_in_thread()`. Latencies are configurable through STUB_CONFIG.
+"""
+from typing import Any, Dict
+import asyncio
+import json
+import socket
+import sys
+import threading
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+import uvicorn
+
+STUB_CONFIG: Dict[str, Any] = {
+    "latency_ms": 50,      # delay before the first byte of every response
+    "token_ms": 10,        # delay between streamed chat tokens
+    "tokens": 40,          # tokens per chat reply
+    "audio_bytes": 48000,  # size of each TTS clip
+    "audio_chunk": 4096,   # TTS streaming chunk size
+    "audio_type": "audio/mpeg",  # TTS response content type
+    "max_concurrency": 0,  # chat calls served at once before answering 429 (0 = no limit)
+}
+# Chat calls in progress, for max_concurrency
+_active = 0
+
+REPLY = "Great question! Rest 60 to 90 seconds between sets for hypertrophy. Keep it up, you are doing great. "
+
+stub = FastAPI()
+
+
+def _tokens():
+    words = REPLY.split(" ")
+    return [words[i % len(words)] + " " for i in range(int(STUB_CONFIG["tokens"]))]
+
+
+async def _latency():
+    await asyncio.sleep(STUB_CONFIG["latency_ms"] / 1000)
+
+
+def _completion_chunk(deployment: str, content=None, finish=None) -> bytes:
+    chunk = {
+        "id": "chatcmpl-stub", "object": "chat.completion.chunk", "created": int(time.time()),
+        "model": deployment,
+        "choices": [{"index": 0, "delta": {"content": content} if content else {}, "finish_reason": finish}],
+    }
+    return f"data: {json.dumps(chunk)}\n\n".encode()
+
+
+@stub.post("/openai/deployments/{deployment}/chat/completions")
+async def chat_completions(deployment: str, request: Request):
+    """Mimic Azure OpenAI chat completions, streaming and non-streaming."""
+    global _active
+    body = await request.json()
+    if STUB_CONFIG["max_concurrency"] and _active >= STUB_CONFIG["max_concurrency"]:
+        return JSONResponse({"error": {"code": "429", "message": "Too many requests"}}, status_code=429)
+    _active += 1
+    try:
+        return await _complete(deployment, body)
+    finally:
+        if not body.get("stream"):
+            _active -= 1
+
+
+async def _complete(deployment: str, body: dict):
+    await _latency()
+    tokens = _tokens()
+    if body.get("stream"):
+        async def events():
+            global _active
+            try:
+                for tok in tokens:
+                    yield _completion_chunk(deployment, tok)
+                    await asyncio.sleep(STUB_CONFIG["token_ms"] / 1000)
+                yield _completion_chunk(deployment, finish="stop")
+                yield b"data: [DONE]\n\n"
+            finally:
+                _active -= 1
+        return StreamingResponse(events(), media_type="text/event-stream")
+    await asyncio.sleep(len(tokens) * STUB_CONFIG["token_ms"] / 1000)
+    return JSONResponse({
+        "id": "chatcmpl-stub", "object": "chat.completion", "created": int(time.time()), "model": deployment,
+        "choices": [{"index": 0, "message": {"role": "assistant", "content": "".join(tokens)}, "finish_reason": "stop"}],
+        "usage": {"prompt_tokens": 50, "completion_tokens": len(tokens), "total_tokens": 50 + len(tokens)},
+    })
+
+
+@stub.post("/stt")
+async def speech_to_text(request: Request):
+    """Mimic the Whisper transcription endpoint: drain the upload, return text."""
+    size = 0
+    async for chunk in request.stream():
+        size += len(chunk)
+    await _latency()
+    return {"text": f"How long should I rest between sets? ({size} bytes)"}
+
+
+@stub.post("/tts")
+async def text_to_speech(request: Request):
+    """Mimic the TTS endpoint: stream back a fixed-size audio clip."""
+    await request.json()
+    await _latency()
+    total, step = int(STUB_CONFIG["audio_bytes"]), int(STUB_CONFIG["audio_chunk"])
+
+    async def audio():
+        for offset in range(0, total, step):
+            yield b"\xff" * min(step, total - offset)
+    return StreamingResponse(audio(), media_type=STUB_CONFIG["audio_type"])
+
+
+def stub_env(base: str) -> Dict[str, str]:
+    """Environment that points the app's secrets (and nothing else) at the stub."""
+    return {
+        "VITALIS_SECRET_PATH": "/nonexistent/secret.py",
+        "AZURE_OPENAI_DEPLOYMENT": "stub-deployment",
+        "AZURE_OPENAI_API_KEY": "stub-key",
+        "AZURE_OPENAI_ENDPOINT": base,
+        "AZURE_OPENAI_SPEECH_STT_DEPLOYMENT": "stub-stt",
+        "AZURE_OPENAI_SPEECH_TTS_DEPLOYMENT": "stub-tts",
+        "AZURE_SPEECH_STT_KEY": "stub-key",
+        "AZURE_SPEECH_STT_ENDPOINT": f"{base}/stt",
+        "AZURE_SPEECH_TTS_KEY": "stub-key",
+        "AZURE_SPEECH_TTS_ENDPOINT": f"{base}/tts",
+    }
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def serve_in_thread(port: int = 0, app=stub) -> str:
+    """Start the stub (or another ASGI app) on a background thread and return its base URL."""
+    port = port or free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    thread = threading.Thread(target=server.run, daemon=True)
+    thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return f"http://127.0.0.1:{port}"
+
+
+if __name__ == "__main__":
+    uvicorn.run(stub, host="127.0.0.1", port=int(sys.argv[1]) if len(sys.argv) > 1 else 9000)
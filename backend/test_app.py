@@ -0,0 +1,282 @@
+"""Endpoint tests for the app, run against the in-memory store and a local stub of the upstream APIs."""
+import asyncio
+import base64
+import errno
+import os
+import json
+import urllib.parse
+from datetime import datetime, timedelta, timezone
+from types import SimpleNamespace
+
+import pytest
+from fastapi import Request
+from fastapi.testclient import TestClient
+
+import app
+import audio_cache
+from audio import UploadTooLarge
+from ratelimit import DEFAULT_LIMITS
+from secret_loader import provider as secret_provider
+from stub_upstream import STUB_CONFIG, serve_in_thread, stub_env
+
+
+@pytest.fixture
+def client():
+    with TestClient(app.app) as client:
+        yield client
+
+
+@pytest.fixture(scope="module")
+def stub_base():
+    return serve_in_thread()
+
+
+@pytest.fixture
+def upstream(stub_base, monkeypatch):
+    """Point the app's secrets at the local stub of the Azure endpoints."""
+    for name, value in stub_env(stub_base).items():
+        monkeypatch.setenv(name, value)
+    secret_provider.invalidate()
+    yield stub_base
+    secret_provider.invalidate()
+
+
+def log_workout(client, uid, hours_ago, muscles=("chest", "triceps"), effort=8, soreness=6):
+    ts = datetime.now(timezone.utc) - timedelta(hours=hours_ago)
+    response = client.post("/log/workout", json={
+        "uid": uid, "muscles": list(muscles), "effort": effort, "soreness": soreness,
+        "duration_min": 45, "ts": ts.isoformat(),
+    })
+    assert response.status_code == 200
+
+
+def without_timestamp(score):
+    """The score minus the request time (muscles already recovered are ready_at that time)."""
+    score = dict(score)
+    now = score.pop("updated_at")
+    if score["ready_at"]:
+        score["ready_at"] = {m: None if at == now else at for m, at in score["ready_at"].items()}
+    return score
+
+
+@pytest.mark.parametrize("model", ["step", "decay"])
+def test_recovery_batch_matches_single_user_endpoint(client, model):
+    uids = [f"batch-{model}-{i}" for i in range(3)]
+    log_workout(client, uids[0], hours_ago=2)
+    log_workout(client, uids[1], hours_ago=30, muscles=("quads",), soreness=2)
+    response = client.post("/recovery/batch", params={"model": model}, json={"uids": uids})
+    assert response.status_code == 200
+    results = response.json()["results"]
+    assert list(results) == uids
+    for uid in uids:
+        single = client.get("/recovery", params={"uid": uid, "model": model}).json()
+        assert results[uid]["model"] == model
+        assert without_timestamp(results[uid]) == without_timestamp(single)
+
+
+def test_recovery_batch_uses_default_model_and_rejects_unknown(client):
+    response = client.post("/recovery/batch", json={"uids": ["batch-default"]})
+    assert response.json()["results"]["batch-default"]["model"] == app.DEFAULT_RECOVERY_MODEL
+    response = client.post("/recovery/batch", params={"model": "magic"}, json={"uids": ["x"]})
+    assert response.status_code == 400
+
+
+def test_recovery_revalidates_with_etag(client):
+    log_workout(client, "etag", hours_ago=2)
+    first = client.get("/recovery", params={"uid": "etag"})
+    etag = first.headers["etag"]
+    assert etag.startswith('W/"')
+    for header in (etag, f'"other", {etag}', etag.removeprefix("W/"), "*"):
+        response = client.get("/recovery", params={"uid": "etag"}, headers={"If-None-Match": header})
+        assert response.status_code == 304, header
+        assert response.headers["etag"] == etag and not response.content
+    # A different tag is not a match
+    stale = client.get("/recovery", params={"uid": "etag"}, headers={"If-None-Match": f'W/"x{etag[3:]}'})
+    assert stale.status_code == 200 and stale.json() == first.json()
+
+
+def test_recovery_etag_changes_after_logging_a_workout(client):
+    log_workout(client, "etag-log", hours_ago=2)
+    etag = client.get("/recovery", params={"uid": "etag-log"}).headers["etag"]
+    log_workout(client, "etag-log", hours_ago=1, muscles=("quads",))
+    response = client.get("/recovery", params={"uid": "etag-log"}, headers={"If-None-Match": etag})
+    assert response.status_code == 200
+    assert response.headers["etag"] != etag
+    assert response.json()["muscle_scores"]["quads"] < 100
+
+
+def test_recovery_max_age_is_capped_at_next_change(client):
+    # chest leaves the 24h window in about 30 seconds, before the default max-age ends
+    log_workout(client, "etag-age", hours_ago=24 - 30 / 3600)
+    response = client.get("/recovery", params={"uid": "etag-age"})
+    max_age = int(response.headers["cache-control"].split("max-age=")[1])
+    assert 0 < max_age <= 30 < app.RECOVERY_MAX_AGE
+    log_workout(client, "etag-idle", hours_ago=24 * 30)
+    response = client.get("/recovery", params={"uid": "etag-idle"})
+    assert response.headers["cache-control"] == f"private, max-age={app.RECOVERY_MAX_AGE}"
+
+
+def stored(uid):
+    return asyncio.run(app.store.get_workouts(uid))
+
+
+def workout(uid, effort=7):
+    return {"uid": uid, "muscles": ["chest"], "effort": effort, "soreness": 3, "duration_min": 30}
+
+
+def test_ndjson_batch_reports_partial_errors(client):
+    lines = [json.dumps(workout("ndjson")), "not json", json.dumps(workout("ndjson", effort=11)),
+             "", json.dumps(workout("ndjson", effort=5))]
+    response = client.post(
+        "/log/workout/batch", content="\n".join(lines).encode(), headers={"Content-Type": "application/x-ndjson"},
+    )
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (2, 2)
+    assert [e["index"] for e in result["errors"]] == [1, 2]
+    assert "effort" in result["errors"][1]["error"]
+    assert [log["effort"] for log in stored("ndjson")] == [7, 5]
+
+
+def test_array_batch_reports_partial_errors_and_rejects_bad_framing(client):
+    body = [workout("array"), {"uid": "array"}, 42, workout("array", effort=9)]
+    response = client.post("/log/workout/batch", json=body)
+    assert response.status_code == 200
+    result = response.json()
+    assert (result["accepted"], result["rejected"]) == (2, 2)
+    assert [e["index"] for e in result["errors"]] == [1, 2]
+
+    bad = b"[" + json.dumps(workout("array-bad")).encode() + b",,{}]"
+    response = client.post("/log/workout/batch", content=bad, headers={"Content-Type": "application/json"})
+    assert response.status_code == 400
+    assert "Expected a value" in response.json()["detail"]
+    # Nothing is committed from a body that fails to parse
+    assert stored("array-bad") == []
+
+
+STT_SECRETS = SimpleNamespace(AZURE_SPEECH_STT_KEY="key", AZURE_SPEECH_STT_ENDPOINT="http://stt.invalid/")
+
+
+def multipart_chunks(size_kb):
+    yield b'--b\r\nContent-Disposition: form-data; name="file"; filename="a.wav"\r\n\r\n'
+    for _ in range(size_kb):
+        yield b"\0" * 1024
+    yield b"\r\n--b--\r\n"
+
+
+def test_oversized_downmix_upload_gets_413(client, monkeypatch):
+    monkeypatch.setattr(app, "STT_MAX_BYTES", 4096)
+    monkeypatch.setattr(app, "load_secrets", lambda: STT_SECRETS)
+    # A generator body is sent chunked, so there is no Content-Length to check up front
+    response = client.post(
+        "/speech-to-text", params={"downmix": "true"}, content=multipart_chunks(64),
+        headers={"Content-Type": "multipart/form-data; boundary=b"},
+    )
+    assert response.status_code == 413
+
+
+def test_downmix_upload_stops_reading_at_the_limit(monkeypatch):
+    monkeypatch.setattr(app, "STT_MAX_BYTES", 4096)
+    chunks = multipart_chunks(1024)
+    received = 0
+
+    async def receive():
+        nonlocal received
+        chunk = next(chunks)
+        received += len(chunk)
+        return {"type": "http.request", "body": chunk, "more_body": True}
+
+    scope = {"type": "http", "method": "POST", "headers": [(b"content-type", b"multipart/form-data; boundary=b")]}
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(app.downmix_stt_upload(Request(scope, receive), STT_SECRETS))
+    assert received <= 8 * 1024
+
+
+def disk_full(*args):
+    raise OSError(errno.ENOSPC, "No space left on device")
+
+
+@pytest.mark.parametrize("failing", ["writer", "write", "commit"])
+def test_tts_relay_survives_cache_disk_errors(client, upstream, monkeypatch, tmp_path, failing):
+    monkeypatch.setattr(app, "tts_cache", audio_cache.DiskAudioCache(str(tmp_path), 2**20))
+    if failing == "writer":
+        monkeypatch.setattr(app.tts_cache, "writer", disk_full)
+    else:
+        monkeypatch.setattr(audio_cache.AudioCacheWriter, failing, disk_full)
+    response = client.post("/text-to-speech", json={"text": f"cache fails at {failing}", "format": "audio"})
+    assert response.status_code == 200
+    assert len(response.content) == STUB_CONFIG["audio_bytes"]
+    assert app.scheduler.snapshot()["tts"]["in_flight"] == 0
+    assert os.listdir(tmp_path) == []
+
+
+def test_one_address_cannot_mint_uids_past_its_source_limit():
+    per_address = DEFAULT_LIMITS["text_to_speech:source"].requests
+    with TestClient(app.app, client=("203.0.113.9", 4000)) as rotating:
+        # Empty text: 400 once the rate limit lets the request through
+        statuses = [rotating.post("/text-to-speech", json={"uid": f"minted{i}", "text": ""}).status_code
+                    for i in range(2 * per_address)]
+    # Every uid is new, so only the per-address bucket (plus what refills meanwhile) limits them
+    assert statuses[:per_address] == [400] * per_address
+    assert statuses.count(429) > per_address // 2
+    with TestClient(app.app, client=("198.51.100.4", 4000)) as other:
+        assert other.post("/text-to-speech", json={"uid": "minted0", "text": ""}).status_code == 400
+
+
+@pytest.fixture
+def fast_stub(upstream, monkeypatch, tmp_path):
+    monkeypatch.setitem(STUB_CONFIG, "latency_ms", 1)
+    monkeypatch.setitem(STUB_CONFIG, "token_ms", 0)
+    monkeypatch.setitem(STUB_CONFIG, "audio_bytes", 6000)
+    monkeypatch.setattr(app, "tts_cache", audio_cache.DiskAudioCache(str(tmp_path), 2**20))
+    return upstream
+
+
+def voice_turn(format, address):
+    clip = b"RIFF" + b"\0" * 2000
+    with TestClient(app.app, client=(address, 4000)) as client:
+        return client.post(
+            "/voice-turn", params={"format": format}, files={"file": ("clip.wav", clip, "audio/wav")},
+        )
+
+
+def parse_sse(text):
+    events = []
+    for block in text.strip().split("\n\n"):
+        lines = dict(line.split(": ", 1) for line in block.split("\n") if not line.startswith(":"))
+        if lines:
+            events.append((lines["event"], json.loads(lines["data"])))
+    return events
+
+
+def assert_slots_released():
+    snapshot = app.scheduler.snapshot()
+    assert all(snapshot[name]["in_flight"] == 0 for name in ("stt", "chat_stream", "tts"))
+
+
+def test_voice_turn_streams_transcript_sentences_and_audio_as_sse(fast_stub):
+    response = voice_turn("sse", "192.0.2.10")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = parse_sse(response.text)
+    assert events[0][0] == "transcript" and events[0][1]["text"].startswith("How long should I rest")
+    assert events[-1][0] == "done"
+    sentences = [data for kind, data in events if kind == "sentence"]
+    assert [s["index"] for s in sentences] == list(range(len(sentences))) and len(sentences) > 1
+    assert events[-1][1]["text"] == " ".join(s["text"] for s in sentences)
+    audio = {}
+    for kind, data in events:
+        if kind == "audio":
+            audio[data["index"]] = audio.get(data["index"], 0) + len(base64.b64decode(data["audio"]))
+    assert audio == {s["index"]: 6000 for s in sentences}
+    assert_slots_released()
+
+
+def test_voice_turn_raw_audio_uses_the_upstream_content_type(fast_stub, monkeypatch):
+    monkeypatch.setitem(STUB_CONFIG, "audio_type", "audio/wav")
+    response = voice_turn("audio", "192.0.2.11")
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/wav"
+    assert urllib.parse.unquote(response.headers["x-transcript"]).startswith("How long should I rest")
+    assert len(response.content) > 6000 and len(response.content) % 6000 == 0
+    assert_slots_released()
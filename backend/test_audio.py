@@ -0,0 +1,53 @@
+"""Tests for upload size capping and WAV downmixing."""
+import asyncio
+import io
+import math
+import struct
+import wave
+
+import pytest
+
+from audio import UploadTooLarge, can_downmix, downmix_wav, limit_stream
+
+
+def make_wav(seconds, rate=44100, channels=2):
+    buf = io.BytesIO()
+    with wave.open(buf, "wb") as w:
+        w.setnchannels(channels)
+        w.setsampwidth(2)
+        w.setframerate(rate)
+        frames = bytearray()
+        for i in range(int(seconds * rate)):
+            sample = int(8000 * math.sin(2 * math.pi * 440 * i / rate))
+            frames += struct.pack("<h", sample) * channels
+        w.writeframes(bytes(frames))
+    buf.seek(0)
+    return buf
+
+
+def test_limit_stream_rejects_oversized_uploads():
+    async def chunks():
+        for _ in range(10):
+            yield b"x" * 100
+
+    async def drain(max_bytes):
+        return sum([len(c) async for c in limit_stream(chunks(), max_bytes)])
+
+    assert asyncio.run(drain(1000)) == 1000
+    with pytest.raises(UploadTooLarge):
+        asyncio.run(drain(999))
+
+
+@pytest.mark.skipif(not can_downmix(), reason="audioop not available")
+def test_downmix_to_16k_mono():
+    out = io.BytesIO()
+    assert downmix_wav(make_wav(1.0), out)
+    with wave.open(out, "rb") as w:
+        assert (w.getnchannels(), w.getsampwidth(), w.getframerate()) == (1, 2, 16000)
+        assert abs(w.getnframes() - 16000) < 10
+
+
+@pytest.mark.skipif(not can_downmix(), reason="audioop not available")
+def test_skips_inputs_that_would_not_shrink():
+    assert not downmix_wav(make_wav(0.1, rate=16000, channels=1), io.BytesIO())
+    assert not downmix_wav(io.BytesIO(b"not a wav file at all"), io.BytesIO())
@@ -0,0 +1,94 @@
+"""Tests for the disk-backed TTS audio cache."""
+import os
+import time
+
+import audio_cache
+from audio_cache import DiskAudioCache, audio_key
+
+
+def test_put_get_and_content_type(tmp_path):
+    cache = DiskAudioCache(str(tmp_path), max_bytes=1000)
+    key = audio_key("Warm up!", "alloy", "gpt-4o-mini-tts")
+    assert cache.get(key) is None
+    cache.put(key, "audio/mpeg", b"\xff" * 100)
+    entry = cache.get(key)
+    assert entry.content_type == "audio/mpeg"
+    assert open(entry.path, "rb").read() == b"\xff" * 100
+    assert key != audio_key("Warm up!", "nova", "gpt-4o-mini-tts")
+
+
+def test_lru_eviction_by_size(tmp_path):
+    cache = DiskAudioCache(str(tmp_path), max_bytes=250)
+    for name in ("a", "b", "c"):
+        cache.put(name, "audio/mpeg", b"x" * 100)
+    # "a" was evicted to stay under 250 bytes; touching "b" protects it next time
+    assert cache.get("a") is None
+    cache.get("b")
+    cache.put("d", "audio/mpeg", b"x" * 100)
+    assert cache.get("c") is None
+    assert cache.get("b") and cache.get("d")
+    assert cache.total == 200
+
+
+def test_partial_write_is_discarded(tmp_path):
+    cache = DiskAudioCache(str(tmp_path), max_bytes=1000)
+    writer = cache.writer("k", "audio/mpeg")
+    writer.write(b"partial")
+    writer.abort()
+    assert cache.get("k") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_index_survives_restart(tmp_path):
+    cache = DiskAudioCache(str(tmp_path), max_bytes=1000)
+    cache.put("k", "audio/wav", b"RIFF")
+    reopened = DiskAudioCache(str(tmp_path), max_bytes=1000)
+    assert reopened.get("k").content_type == "audio/wav"
+    assert reopened.total == 4
+
+
+def test_clip_larger_than_cache_is_not_kept(tmp_path):
+    cache = DiskAudioCache(str(tmp_path), max_bytes=10)
+    assert cache.put("k", "audio/mpeg", b"x" * 11) is None
+    assert cache.get("k") is None
+    assert list(tmp_path.iterdir()) == []
+
+
+def test_startup_only_removes_stale_temp_files(tmp_path):
+    stale = tmp_path / ".tmp-old"
+    fresh = tmp_path / ".tmp-new"
+    stale.write_bytes(b"x")
+    fresh.write_bytes(b"x")
+    old = time.time() - audio_cache.STALE_TMP_SECONDS - 1
+    os.utime(stale, (old, old))
+    DiskAudioCache(str(tmp_path), max_bytes=1000)
+    assert not stale.exists()
+    # Possibly another worker's clip in progress
+    assert fresh.exists()
+
+
+def test_open_survives_eviction_after_lookup(tmp_path):
+    cache = DiskAudioCache(str(tmp_path), max_bytes=1000)
+    cache.put("k", "audio/mpeg", b"clip")
+    entry, f = cache.open("k")
+    # Evicted (e.g. by another worker) while the response is being sent
+    os.remove(entry.path)
+    with f:
+        assert f.read() == b"clip"
+    assert cache.open("k") is None
+
+
+def test_get_treats_a_clip_evicted_during_lookup_as_a_miss(tmp_path, monkeypatch):
+    cache = DiskAudioCache(str(tmp_path), max_bytes=1000)
+    entry = cache.put("k", "audio/mpeg", b"clip")
+
+    def evicted(path, *args):
+        # Another worker removes the clip between the exists() check and the touch
+        os.remove(path)
+        raise FileNotFoundError(path)
+
+    monkeypatch.setattr(audio_cache.os, "utime", evicted)
+    assert cache.get("k") is None
+    assert cache.open("k") is None
+    assert cache.total == 0 and cache.stats["misses"] == 2
+    assert not os.path.exists(entry.path)
@@ -0,0 +1,85 @@
+"""Tests for the /chat response cache and single-flight coalescing."""
+import asyncio
+
+from cache import ResponseCache, TTLCache, cache_key, normalize_prompt
+
+
+def test_ttl_and_lru_eviction(clock):
+    cache = TTLCache(maxsize=2, ttl=10, clock=clock)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1
+    cache.set("c", 3)  # evicts "b", the least recently used
+    assert cache.get("b") is None
+    clock.now = 11
+    assert cache.get("a") is None
+    assert len(cache) == 1
+
+
+def test_normalized_keys_match():
+    a = cache_key(prompt=normalize_prompt("How long should I rest between sets?"), temperature=0.7)
+    b = cache_key(prompt=normalize_prompt("  how long should I   rest between sets "), temperature=0.7)
+    c = cache_key(prompt=normalize_prompt("How long should I rest between sets?"), temperature=0.2)
+    assert a == b != c
+
+
+def test_concurrent_requests_coalesce():
+    cache = ResponseCache(maxsize=10, ttl=60)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.01)
+        return "rest 60-90s"
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_fetch("k", fetch) for _ in range(10)))
+        assert {value for value, _ in results} == {"rest 60-90s"}
+        assert await cache.get_or_fetch("k", fetch) == ("rest 60-90s", "hit")
+        assert await cache.get_or_fetch("k", fetch, use_cache=False) == ("rest 60-90s", "bypass")
+
+    asyncio.run(main())
+    assert calls == 2
+    assert cache.snapshot() == {"hits": 1, "misses": 1, "coalesced": 9, "bypassed": 1, "size": 1}
+
+
+def test_errors_reach_every_waiter_and_are_not_cached():
+    cache = ResponseCache(maxsize=10, ttl=60)
+
+    async def fail():
+        await asyncio.sleep(0.01)
+        raise RuntimeError("upstream down")
+
+    async def main():
+        results = await asyncio.gather(*(cache.get_or_fetch("k", fail) for _ in range(3)), return_exceptions=True)
+        assert all(isinstance(r, RuntimeError) for r in results)
+
+    asyncio.run(main())
+    assert len(cache.cache) == 0
+
+
+def test_cancelled_leader_does_not_fail_followers():
+    cache = ResponseCache(maxsize=10, ttl=60)
+    calls = 0
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.02)
+        return "rest 60-90s"
+
+    async def main():
+        leader = asyncio.ensure_future(cache.get_or_fetch("k", fetch))
+        await asyncio.sleep(0)
+        followers = [asyncio.ensure_future(cache.get_or_fetch("k", fetch)) for _ in range(3)]
+        await asyncio.sleep(0)
+        # The first client disconnects mid-fetch
+        leader.cancel()
+        results = await asyncio.gather(*followers)
+        assert leader.cancelled()
+        assert results == [("rest 60-90s", "coalesced")] * 3
+        assert await cache.get_or_fetch("k", fetch) == ("rest 60-90s", "hit")
+
+    asyncio.run(main())
+    assert calls == 1
@@ -0,0 +1,108 @@
+"""Tests for streaming batch parsing and bulk validation."""
+import asyncio
+import json
+
+import pytest
+
+from ingest import ParseError, iter_json_array, iter_ndjson, validate_chunk
+
+
+async def chunked(data: bytes, size: int):
+    for i in range(0, len(data), size):
+        yield data[i:i + size]
+
+
+async def collect(gen):
+    return [item async for item in gen]
+
+
+RECORDS = [
+    {"uid": "u", "muscles": ["chest"], "effort": 7, "soreness": 3, "duration_min": 45},
+    {"uid": "u", "muscles": ["quads", "glutes"], "effort": 9, "soreness": 6, "duration_min": 60,
+     "ts": "2026-10-01T07:30:00+00:00", "note": "café"},
+    123,
+]
+
+
+@pytest.mark.parametrize("size", [1, 3, 7, 4096])
+def test_json_array_across_chunk_boundaries(size):
+    body = json.dumps(RECORDS, ensure_ascii=False).encode()
+    assert asyncio.run(collect(iter_json_array(chunked(body, size)))) == RECORDS
+
+
+@pytest.mark.parametrize("body", [
+    b'{"uid": "u"}', b'[{"uid": "u"}', b'[{"uid": ',
+    b'[,{"a": 1}]', b'[{"a": 1},,{"b": 2}]', b'[{"a": 1},]', b'[{"a": 1} {"b": 2}]', b'[1 2]',
+])
+def test_json_array_framing_errors(body):
+    with pytest.raises(ParseError):
+        asyncio.run(collect(iter_json_array(chunked(body, 4))))
+
+
+def test_json_array_escapes_and_scalars_split_across_chunks():
+    body = json.dumps([{"note": "a\\\"b\u00e9 ] }"}, "x\\", True, -12.5e3, None, [[], {}]]).encode()
+    assert asyncio.run(collect(iter_json_array(chunked(body, 1)))) == json.loads(body)
+
+
+def test_json_array_strings_split_at_every_chunk_size():
+    body = b'[{"uid":"a"}, "hello world", "x\\" ]", {"uid":"b"}]'
+    for size in range(1, len(body) + 1):
+        assert asyncio.run(collect(iter_json_array(chunked(body, size)))) == json.loads(body), size
+
+
+async def then_hang(data: bytes, size: int):
+    async for chunk in chunked(data, size):
+        yield chunk
+    raise AssertionError("read past the bad record")
+
+
+@pytest.mark.parametrize("bad", [b'{"uid": "u", oops}', b'{"uid": "u"]', b'nope,'])
+def test_json_array_rejects_a_malformed_element_without_reading_on(bad):
+    body = b'[{"uid": "ok"}, ' + bad + b' {"uid": "more"'
+
+    async def main():
+        seen = []
+        with pytest.raises(ParseError, match="Invalid JSON"):
+            async for item in iter_json_array(then_hang(body, 4)):
+                seen.append(item)
+        return seen
+
+    assert asyncio.run(main()) == [{"uid": "ok"}]
+
+
+def test_json_array_caps_buffered_element_size():
+    body = b'[{"uid": "ok"}, {"note": "' + b"x" * 1000
+
+    async def main():
+        with pytest.raises(ParseError, match="longer than 100"):
+            await collect(iter_json_array(then_hang(body, 16), max_record=100))
+
+    asyncio.run(main())
+
+
+def test_ndjson_skips_oversized_lines():
+    body = b'{"a": 1}\n{"note": "' + b"x" * 1000 + b'"}\n{"b": 2}\n' + b"y" * 200
+    items = asyncio.run(collect(iter_ndjson(chunked(body, 16), max_record=100)))
+    assert items[0] == {"a": 1} and items[2] == {"b": 2}
+    assert [str(i) for i in items[1::2]] == ["Record longer than 100 characters"] * 2
+    assert len(items) == 4
+
+
+def test_ndjson_reports_bad_lines_individually():
+    body = b'{"a": 1}\n\nnot json\n{"b": 2}'
+    items = asyncio.run(collect(iter_ndjson(chunked(body, 5))))
+    assert items[0] == {"a": 1} and items[2] == {"b": 2}
+    assert isinstance(items[1], ParseError)
+
+
+def test_validate_chunk_keeps_valid_records():
+    records = list(enumerate([
+        RECORDS[0],
+        {"uid": "u", "muscles": ["chest"], "effort": 11, "soreness": 3, "duration_min": 45},
+        RECORDS[1],
+        {"muscles": ["chest"]},
+    ]))
+    valid, errors = validate_chunk(records)
+    assert [log.effort for log in valid] == [7, 9]
+    assert [index for index, _ in errors] == [1, 3]
+    assert "effort" in errors[0][1]
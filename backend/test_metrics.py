@@ -0,0 +1,79 @@
+"""Tests for the metrics registry, middleware and sampled logging."""
+import io
+import json
+import threading
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import metrics
+from metrics import Collected, Counter, Histogram, MetricsMiddleware, Registry
+
+
+def test_render_prometheus_text():
+    registry = Registry()
+    hist = Histogram("t_seconds", "Test latency", ("route",), buckets=(0.1, 1.0), registry=registry)
+    for value in (0.05, 0.1, 0.5, 3.0):
+        hist.observe(value, "/x")
+    counter = Counter("t_total", "Test counter", ("kind",), registry=registry)
+    counter.inc("a")
+    counter.inc("a", amount=2)
+    Collected("t_size", "Test gauge", "gauge", lambda: 7, registry=registry)
+    text = registry.render()
+    assert '# TYPE t_seconds histogram' in text
+    assert 't_seconds_bucket{route="/x",le="0.1"} 2' in text
+    assert 't_seconds_bucket{route="/x",le="1"} 3' in text
+    assert 't_seconds_bucket{route="/x",le="+Inf"} 4' in text
+    assert 't_seconds_count{route="/x"} 4' in text
+    assert 't_total{kind="a"} 3' in text
+    assert 't_size 7' in text
+    assert hist.count("/x") == 4
+
+
+def test_middleware_labels_routes_by_template():
+    app = FastAPI()
+
+    @app.get("/items/{item_id}")
+    async def item(item_id: int):
+        return {"id": item_id}
+
+    app.add_middleware(MetricsMiddleware, routes=app.routes)
+    before = metrics.HTTP_SECONDS.count("GET", "/items/{item_id}", "200")
+    with TestClient(app) as client:
+        for i in range(3):
+            assert client.get(f"/items/{i}").status_code == 200
+        assert client.get("/nowhere").status_code == 404
+    assert metrics.HTTP_SECONDS.count("GET", "/items/{item_id}", "200") == before + 3
+    assert metrics.HTTP_SECONDS.count("GET", "unmatched", "404") >= 1
+    assert metrics.HTTP_IN_FLIGHT.values[("/items/{item_id}",)] == 0
+
+
+def test_log_events_are_sampled_and_structured(monkeypatch):
+    out = io.StringIO()
+    metrics.start_logging(out)
+    try:
+        monkeypatch.setattr(metrics, "LOG_SAMPLE", 0.0)
+        metrics.log_event("dropped")
+        metrics.log_event("kept", sample=1.0, upstream="tts")
+        metrics.log_event("failure", metrics.logging.WARNING, error="boom")
+    finally:
+        metrics.stop_logging()
+    events = [json.loads(line) for line in out.getvalue().splitlines()]
+    assert [e["event"] for e in events] == ["kept", "failure"]
+    assert events[0]["upstream"] == "tts"
+    assert events[1]["level"] == "warning" and events[1]["error"] == "boom"
+
+
+def test_histogram_observations_from_threads_are_not_lost():
+    hist = Histogram("t_threads_seconds", "Test latency", ("op",), buckets=(0.1, 1.0), registry=Registry())
+
+    def observe():
+        for i in range(5000):
+            hist.observe(0.05, f"op{i % 50}")
+
+    workers = [threading.Thread(target=observe) for _ in range(8)]
+    for w in workers:
+        w.start()
+    for w in workers:
+        w.join()
+    assert sum(hist.count(f"op{i}") for i in range(50)) == 8 * 5000
@@ -0,0 +1,56 @@
+"""Tests for the token-bucket rate limiter."""
+import pytest
+
+import metrics
+from ratelimit import RateLimit, RateLimiter
+
+
+def test_allows_burst_then_refills(clock):
+    limiter = RateLimiter({"chat": RateLimit(3, 10)}, clock=clock)
+    assert [limiter.check("chat", "u") for _ in range(3)] == [0.0, 0.0, 0.0]
+    retry_after = limiter.check("chat", "u")
+    assert 3.3 < retry_after <= 3.34
+    clock.now += retry_after
+    assert limiter.check("chat", "u") == 0.0
+    # Other keys and unknown endpoints are independent
+    assert limiter.check("chat", "other") == 0.0
+    assert limiter.check("unlimited", "u") == 0.0
+
+
+def test_idle_keys_are_evicted_lazily(clock):
+    limiter = RateLimiter({"chat": RateLimit(3, 10)}, clock=clock)
+    for i in range(1000):
+        limiter.check("chat", f"user{i}")
+        clock.now += 0.1
+    # Only keys used within the last 10s (plus a small eviction lag) remain
+    assert len(limiter) <= 110
+
+
+def test_max_keys_cap_fails_closed_for_new_keys(clock):
+    limiter = RateLimiter({"chat": RateLimit(3, 10)}, max_keys=50, clock=clock)
+    refused = metrics.RATE_KEYS_REFUSED.values.get(("chat",), 0)
+    results = [limiter.check("chat", f"user{i}") for i in range(1000)]
+    assert len(limiter) == 50
+    assert metrics.RATE_KEYS_REFUSED.values[("chat",)] == refused + 950
+    assert results[:50] == [0.0] * 50
+    # Every tracked bucket is still short a token, so new keys wait for the oldest to refill
+    assert all(r == pytest.approx(10 / 3) for r in results[50:])
+    clock.now += 10 / 3
+    assert limiter.check("chat", "late") == 0.0
+    assert len(limiter) <= 50
+
+
+def test_cycling_keys_cannot_reset_a_limited_key(clock):
+    limiter = RateLimiter({"chat": RateLimit(3, 10)}, max_keys=50, clock=clock)
+    for _ in range(3):
+        limiter.check("chat", "victim")
+    assert limiter.check("chat", "victim") > 0
+    for i in range(10000):
+        limiter.check("chat", f"attacker{i}")
+        clock.now += 0.0001
+    # The victim's empty bucket was kept, so it is still limited
+    assert limiter.check("chat", "victim") > 0
+
+
+def test_parse():
+    assert RateLimit.parse("3/10") == RateLimit(3, 10.0)
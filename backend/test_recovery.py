@@ -0,0 +1,170 @@
+"""Consistency tests for the incremental recovery summary."""
+import os
+import random
+import subprocess
+import sys
+from datetime import datetime, timedelta, timezone
+
+from recovery import (
+    COMMON_MUSCLES, MuscleSummary, calc_recovery, calc_recovery_decay, calc_recovery_from_summary,
+    from_epoch_micros, next_change_us, recommend_trainable,
+)
+from store import Store
+
+
+def full_scan(logs, now):
+    """Reference implementation: the original two-pass scan over every log."""
+    scores = {m: 100 for m in COMMON_MUSCLES}
+    last_trained = {m: None for m in COMMON_MUSCLES}
+    doms = {m: 0 for m in COMMON_MUSCLES}
+    for log in logs:
+        ts = log.get("ts")
+        if not ts:
+            continue
+        for m in log.get("muscles", []):
+            if last_trained[m] is None or ts > last_trained[m]:
+                last_trained[m] = ts
+            doms[m] = max(doms[m], log.get("soreness", 0))
+    for m in COMMON_MUSCLES:
+        if last_trained[m] and (now - last_trained[m]).total_seconds() < 24 * 3600:
+            scores[m] -= 40
+        scores[m] -= int(30 * (doms[m] / 10))
+        scores[m] = max(0, min(100, scores[m]))
+    return scores, recommend_trainable(scores, last_trained, now), last_trained
+
+
+def random_logs(n, now, seed=0):
+    rng = random.Random(seed)
+    logs = []
+    for _ in range(n):
+        logs.append({
+            "muscles": rng.sample(COMMON_MUSCLES, rng.randint(1, 4)),
+            "effort": rng.randint(1, 10),
+            "soreness": rng.randint(0, 10),
+            "duration_min": rng.randint(10, 90),
+            # Deliberately unordered timestamps spanning the 24h/48h boundaries
+            "ts": now - timedelta(hours=rng.uniform(0, 24 * 14)),
+        })
+    return logs
+
+
+def test_summary_matches_full_scan():
+    now = datetime.now(timezone.utc)
+    for seed in range(20):
+        logs = random_logs(50, now, seed)
+        store = Store()
+        for log in logs:
+            store.log_workout("u", log)
+        summary = store.get_recovery_summary("u")
+        scores, recommended, last_trained = full_scan(logs, now)
+        assert calc_recovery_from_summary(summary, now) == scores
+        assert calc_recovery(logs, now) == scores
+        assert summary.last_trained == last_trained
+        assert recommend_trainable(scores, summary.last_trained, now) == recommended
+
+
+def test_out_of_order_logs_keep_latest_timestamp():
+    now = datetime.now(timezone.utc)
+    summary = MuscleSummary()
+    summary.add({"muscles": ["chest"], "soreness": 2, "ts": now - timedelta(hours=1)})
+    summary.add({"muscles": ["chest"], "soreness": 7, "ts": now - timedelta(days=5)})
+    assert summary.last_trained["chest"] == now - timedelta(hours=1)
+    assert summary.doms["chest"] == 7
+
+
+def test_rebuild_from_logs():
+    now = datetime.now(timezone.utc)
+    store = Store()
+    for log in random_logs(100, now, seed=42):
+        store.log_workout("u", log)
+    before = store.get_recovery_summary("u")
+    rebuilt = store.rebuild_recovery_summary("u")
+    assert rebuilt.last_trained == before.last_trained
+    assert rebuilt.doms == before.doms
+
+
+def test_unknown_user_has_full_recovery():
+    now = datetime.now(timezone.utc)
+    scores = calc_recovery_from_summary(Store().get_recovery_summary("nobody"), now)
+    assert scores == {m: 100 for m in COMMON_MUSCLES}
+
+
+def decay_log(hours_ago, now, effort=8, soreness=6, duration=90, muscles=("quads",)):
+    return {"muscles": list(muscles), "effort": effort, "soreness": soreness,
+            "duration_min": duration, "ts": now - timedelta(hours=hours_ago)}
+
+
+def test_decay_model_recovers_over_time():
+    now = datetime.now(timezone.utc)
+    summary = MuscleSummary.from_logs([decay_log(1, now)])
+    fresh, _ = calc_recovery_decay(summary, now)
+    later, _ = calc_recovery_decay(summary, now + timedelta(days=2))
+    much_later, _ = calc_recovery_decay(summary, now + timedelta(days=30))
+    assert fresh["quads"] < later["quads"] < much_later["quads"] == 100
+    assert fresh["chest"] == 100
+
+
+def test_old_high_soreness_log_does_not_depress_forever():
+    now = datetime.now(timezone.utc)
+    summary = MuscleSummary.from_logs([decay_log(24 * 60, now, soreness=10)])
+    assert calc_recovery_from_summary(summary, now)["quads"] == 70
+    assert calc_recovery_decay(summary, now)[0]["quads"] == 100
+
+
+def test_decay_state_is_order_independent():
+    now = datetime.now(timezone.utc)
+    logs = random_logs(40, now, seed=3)
+    forward = MuscleSummary.from_logs(sorted(logs, key=lambda l: l["ts"]))
+    shuffled = MuscleSummary.from_logs(logs)
+    for a, b in zip(forward.load, shuffled.load):
+        assert abs(a - b) < 1e-9
+    assert calc_recovery_decay(forward, now) == calc_recovery_decay(shuffled, now)
+
+
+def test_forecast_matches_recommendation():
+    now = datetime.now(timezone.utc)
+    summary = MuscleSummary.from_logs([decay_log(30, now, effort=10, soreness=10, duration=180),
+                                       decay_log(2, now, muscles=("chest",), effort=2, duration=10)])
+    _, ready_at = calc_recovery_decay(summary, now)
+    for muscle in ("quads", "chest"):
+        ready = ready_at[muscle]
+        assert ready > now
+        before = ready - timedelta(minutes=1)
+        scores, _ = calc_recovery_decay(summary, before)
+        assert muscle not in recommend_trainable(scores, summary.last_trained, before)
+        scores, _ = calc_recovery_decay(summary, ready)
+        assert muscle in recommend_trainable(scores, summary.last_trained, ready)
+    assert ready_at["core"] == now
+
+
+def test_next_change_is_exact_for_step_model():
+    now = datetime.now(timezone.utc)
+    for seed in range(10):
+        summary = MuscleSummary.from_logs(random_logs(5, now, seed=seed))
+        change_us = next_change_us(summary, now, "step")
+        if change_us is None:
+            continue
+        change = from_epoch_micros(change_us)
+        just_before = change - timedelta(microseconds=1)
+
+        def result(at):
+            scores = calc_recovery_from_summary(summary, at)
+            return scores, recommend_trainable(scores, summary.last_trained, at)
+        assert result(now) == result(just_before)
+        assert result(just_before) != result(change)
+
+
+def test_next_change_for_decay_model():
+    now = datetime.now(timezone.utc)
+    summary = MuscleSummary.from_logs([decay_log(100, now, effort=10, soreness=10, duration=180)])
+    change = from_epoch_micros(next_change_us(summary, now, "decay"))
+    assert calc_recovery_decay(summary, change - timedelta(microseconds=1))[0] == calc_recovery_decay(summary, now)[0]
+    assert calc_recovery_decay(summary, change)[0]["quads"] == calc_recovery_decay(summary, now)[0]["quads"] + 1
+    assert next_change_us(MuscleSummary(), now) is None
+
+
+def test_unknown_default_model_fails_at_import():
+    env = {**os.environ, "VITALIS_RECOVERY_MODEL": "linear"}
+    result = subprocess.run([sys.executable, "-c", "import recovery"], env=env, capture_output=True, text=True)
+    assert result.returncode != 0
+    assert "VITALIS_RECOVERY_MODEL must be one of step, decay" in result.stderr
@@ -0,0 +1,24 @@
+"""The vectorized batch scorer must match the scalar recovery functions exactly."""
+from datetime import datetime, timezone
+
+import recovery_batch
+from recovery import calc_recovery_from_summary, recommend_trainable
+from sample_summaries import random_summaries
+
+
+def test_batch_matches_scalar():
+    now = datetime.now(timezone.utc)
+    summaries = random_summaries(2000, now)
+    for summary, (scores, recommended) in zip(summaries, recovery_batch.batch_recovery(summaries, now)):
+        expected = calc_recovery_from_summary(summary, now)
+        assert scores == expected
+        assert recommended == recommend_trainable(expected, summary.last_trained, now)
+
+
+def test_scalar_fallback_without_numpy(monkeypatch):
+    now = datetime.now(timezone.utc)
+    summaries = random_summaries(50, now, seed=1)
+    vectorized = recovery_batch.batch_recovery(summaries, now)
+    monkeypatch.setattr(recovery_batch, "np", None)
+    assert recovery_batch.batch_recovery(summaries, now) == vectorized
+    assert recovery_batch.batch_recovery([], now) == []
@@ -0,0 +1,230 @@
+"""Tests for the upstream scheduler: limits, queueing, shedding, retries and hedging."""
+import asyncio
+
+import httpx
+import pytest
+
+import scheduler as sched
+from scheduler import DeadlineExceeded, Overloaded, Scheduler, UpstreamPolicy
+
+
+def status_error(status: int, retry_after: str = None) -> httpx.HTTPStatusError:
+    request = httpx.Request("POST", "http://upstream/")
+    headers = {"retry-after": retry_after} if retry_after else {}
+    response = httpx.Response(status, request=request, headers=headers)
+    return httpx.HTTPStatusError(f"{status}", request=request, response=response)
+
+
+def make(concurrency=2, queue=2, deadline=1.0, attempts=3, hedge=False) -> Scheduler:
+    return Scheduler({"up": UpstreamPolicy(concurrency, queue, deadline, attempts, hedge)})
+
+
+@pytest.fixture(autouse=True)
+def fast_backoff(monkeypatch):
+    monkeypatch.setattr(sched, "BACKOFF_BASE", 0.001)
+
+
+def test_limits_concurrency_and_sheds_when_queue_is_full():
+    s = make(concurrency=2, queue=1)
+    running = 0
+    peak = 0
+
+    async def attempt():
+        nonlocal running, peak
+        running += 1
+        peak = max(peak, running)
+        await asyncio.sleep(0.05)
+        running -= 1
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(s.call("up", attempt) for _ in range(4)), return_exceptions=True)
+
+    results = asyncio.run(main())
+    assert peak == 2
+    assert results.count("ok") == 3
+    shed = [r for r in results if isinstance(r, Overloaded)]
+    assert len(shed) == 1 and shed[0].retry_after >= 1
+    assert s.snapshot()["up"] == {"queued": 0, "in_flight": 0, "limit": 2}
+
+
+def test_queued_call_is_shed_at_its_deadline():
+    s = make(concurrency=1, queue=4, deadline=0.05)
+
+    async def slow():
+        await asyncio.sleep(0.2)
+
+    async def main():
+        first = asyncio.ensure_future(s.call("up", slow))
+        await asyncio.sleep(0)
+        with pytest.raises(DeadlineExceeded):
+            await first
+
+    # The running call itself overruns its deadline
+    asyncio.run(main())
+
+    s = make(concurrency=1, queue=4, deadline=1.0)
+
+    async def main2():
+        lease = await s.limiters["up"].acquire(s.clock() + 1)
+        limiter = s.limiters["up"]
+        with pytest.raises(Overloaded):
+            await limiter.acquire(s.clock() + 0.02)
+        assert not limiter.waiters
+        lease.release()
+        assert limiter.in_flight == 0
+
+    asyncio.run(main2())
+
+
+def test_retries_429_then_succeeds_and_shrinks_limit_once_per_window():
+    s = make(concurrency=8)
+    calls = 0
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        if calls <= 4:
+            await asyncio.sleep(0.01)
+            raise status_error(429)
+        return "ok"
+
+    async def main():
+        return await asyncio.gather(*(s.call("up", attempt) for _ in range(4)))
+
+    assert asyncio.run(main()) == ["ok"] * 4
+    assert calls == 8
+    # All four 429s came from calls started before the first cut, so the limit is cut once
+    assert s.limiters["up"].limit == pytest.approx(8 * sched.DECREASE)
+
+
+def test_does_not_retry_client_errors_or_single_attempt_calls():
+    s = make()
+    calls = 0
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        raise status_error(400)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(s.call("up", attempt))
+    assert calls == 1
+
+    async def busy():
+        nonlocal calls
+        calls += 1
+        raise status_error(503)
+
+    with pytest.raises(httpx.HTTPStatusError):
+        asyncio.run(s.call("up", busy, attempts=1))
+    assert calls == 2
+
+
+def test_limit_grows_back_when_slots_are_full():
+    s = make(concurrency=4)
+    limiter = s.limiters["up"]
+    limiter.limit = 2.0
+
+    async def attempt():
+        await asyncio.sleep(0.001)
+
+    async def main():
+        for _ in range(20):
+            await asyncio.gather(*(s.call("up", attempt) for _ in range(4)))
+
+    asyncio.run(main())
+    assert limiter.limit == 4.0
+
+
+def test_hedge_wins_when_first_attempt_is_slow():
+    s = make(concurrency=4, hedge=True)
+    limiter = s.limiters["up"]
+    limiter.latencies.extend([0.01] * sched.HEDGE_MIN_SAMPLES)
+    calls = 0
+    discarded = []
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        await asyncio.sleep(0.5 if calls == 1 else 0.01)
+        return calls
+
+    async def discard(value):
+        discarded.append(value)
+
+    async def main():
+        value, lease = await s.open("up", attempt, hedge=True, discard=discard)
+        assert limiter.in_flight == 1
+        lease.release()
+        return value
+
+    assert asyncio.run(main()) == 2
+    assert limiter.in_flight == 0
+    assert sched.UPSTREAM_HEDGES.values[("up", "won")] >= 1
+
+
+def hedged(concurrency=4):
+    s = make(concurrency=concurrency, hedge=True)
+    s.limiters["up"].latencies.extend([0.01] * sched.HEDGE_MIN_SAMPLES)
+    return s, s.limiters["up"]
+
+
+def test_hedge_loser_that_also_completes_is_discarded():
+    s, limiter = hedged()
+    both_sent = asyncio.Event()
+    calls = 0
+    discarded = []
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        n = calls
+        if n == 2:
+            both_sent.set()
+        await both_sent.wait()
+        return f"response{n}"
+
+    async def discard(value):
+        discarded.append(value)
+
+    async def main():
+        value, lease = await s.open("up", attempt, hedge=True, discard=discard)
+        assert limiter.in_flight == 1
+        lease.release()
+        return value
+
+    assert asyncio.run(main()) == "response1"
+    assert discarded == ["response2"]
+    assert limiter.in_flight == 0
+
+
+def test_hedge_loser_finishing_as_it_is_cancelled_is_discarded():
+    s, limiter = hedged()
+    calls = 0
+    discarded = []
+
+    async def attempt():
+        nonlocal calls
+        calls += 1
+        if calls == 2:
+            await asyncio.sleep(0.01)
+            return "fast"
+        try:
+            await asyncio.sleep(0.5)
+        except asyncio.CancelledError:
+            # The response arrived just as the attempt was cancelled
+            await asyncio.sleep(0.01)
+            return "slow"
+
+    async def discard(value):
+        discarded.append(value)
+
+    async def main():
+        value, lease = await s.open("up", attempt, hedge=True, discard=discard)
+        lease.release()
+        return value
+
+    assert asyncio.run(main()) == "fast"
+    assert discarded == ["slow"]
+    assert limiter.in_flight == 0
@@ -0,0 +1,69 @@
+"""Tests for the cached secrets provider."""
+
+import pytest
+
+from secret_loader import SecretProvider
+
+SECRET_PY = '''
+AZURE_OPENAI_DEPLOYMENT = "gpt"
+AZURE_OPENAI_API_KEY = "{key}"
+AZURE_OPENAI_ENDPOINT = "https://example.openai.azure.com"
+AZURE_OPENAI_SPEECH_STT_DEPLOYMENT = "whisper"
+AZURE_OPENAI_SPEECH_TTS_DEPLOYMENT = "tts"
+'''
+
+
+def write_secret(path, key):
+    path.write_text(SECRET_PY.format(key=key))
+
+
+def test_cached_until_file_changes(tmp_path):
+    path = tmp_path / "secret.py"
+    write_secret(path, "key-1")
+    provider = SecretProvider(str(path), check_interval=0)
+    first = provider.get()
+    assert first.AZURE_OPENAI_API_KEY == "key-1"
+    assert provider.get() is first
+
+    write_secret(path, "key-two")
+    assert provider.get().AZURE_OPENAI_API_KEY == "key-two"
+
+
+def test_check_interval_skips_stat(tmp_path):
+    path = tmp_path / "secret.py"
+    write_secret(path, "key-1")
+    provider = SecretProvider(str(path), check_interval=3600)
+    provider.get()
+    write_secret(path, "key-two")
+    assert provider.get().AZURE_OPENAI_API_KEY == "key-1"
+    provider.invalidate()
+    assert provider.get().AZURE_OPENAI_API_KEY == "key-two"
+
+
+def test_env_overrides_file(tmp_path, monkeypatch):
+    path = tmp_path / "secret.py"
+    write_secret(path, "key-1")
+    monkeypatch.setenv("AZURE_OPENAI_API_KEY", "from-env")
+    assert SecretProvider(str(path)).get().AZURE_OPENAI_API_KEY == "from-env"
+
+
+def test_missing_file_without_env_fails(tmp_path):
+    with pytest.raises(RuntimeError, match="not found"):
+        SecretProvider(str(tmp_path / "missing.py")).get()
+
+
+def test_broken_edit_keeps_last_good(tmp_path):
+    path = tmp_path / "secret.py"
+    write_secret(path, "key-1")
+    provider = SecretProvider(str(path), check_interval=0)
+    provider.get()
+    path.write_text("AZURE_OPENAI_API_KEY = (")
+    assert provider.get().AZURE_OPENAI_API_KEY == "key-1"
+
+
+def test_secret_is_immutable(tmp_path):
+    path = tmp_path / "secret.py"
+    write_secret(path, "key-1")
+    secret = SecretProvider(str(path)).get()
+    with pytest.raises(AttributeError):
+        secret.AZURE_OPENAI_API_KEY = "x"
@@ -0,0 +1,284 @@
+"""Tests for the in-memory, journaled and SQLite stores."""
+from datetime import datetime, timedelta, timezone
+import asyncio
+import errno
+import multiprocessing
+import sqlite3
+import threading
+import time
+
+import pytest
+
+from journal import Journal, JournalError
+from ratelimit import RateLimit
+from recovery import calc_recovery_decay, calc_recovery_from_summary
+from store import CHAT_HISTORY_LIMIT, AsyncStore, DurableStore, SQLiteStore, Store, count_tokens
+
+
+def make_log(hours_ago, soreness=3):
+    return {
+        "uid": "u", "muscles": ["chest", "triceps"], "effort": 7, "soreness": soreness,
+        "duration_min": 45, "ts": datetime.now(timezone.utc) - timedelta(hours=hours_ago),
+    }
+
+
+def test_restart_replays_journal(tmp_path):
+    s = DurableStore(str(tmp_path))
+    s.append_chat("u", "user", "hi")
+    s.append_chat("u", "assistant", "hello!")
+    logs = [make_log(5), make_log(50, soreness=8)]
+    for log in logs:
+        s.log_workout("u", log)
+    s.close()
+
+    s2 = DurableStore(str(tmp_path))
+    assert s2.get_chat_history("u") == [
+        {"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello!"},
+    ]
+    assert s2.get_workouts("u") == logs
+    assert s2.get_recovery_summary("u").doms["chest"] == 8
+    s2.close()
+
+
+def test_snapshot_plus_tail(tmp_path):
+    s = DurableStore(str(tmp_path), snapshot_every=10)
+    logs = [make_log(i) for i in range(25)]
+    for log in logs:
+        s.log_workout("u", log)
+    s.close()
+    # Only the records after the last snapshot remain in the journal
+    state, tail = s.journal.replay()
+    assert len(state["workout_logs"]["u"]) == 20
+    assert len(tail) == 5
+
+    s2 = DurableStore(str(tmp_path), snapshot_every=10)
+    assert s2.get_workouts("u") == logs
+    s2.log_workout("u", make_log(1))
+    s2.close()
+    s3 = DurableStore(str(tmp_path))
+    assert len(s3.get_workouts("u")) == 26
+    s3.close()
+
+
+def test_snapshot_is_built_on_the_journal_thread(tmp_path):
+    s = DurableStore(str(tmp_path), snapshot_every=1000)
+    for i in range(3):
+        s.log_workout("u", make_log(i))
+    build = s._snapshot()
+    # Logs added after the capture are not part of it
+    s.log_workout("u", make_log(10))
+    assert len(build()["workout_logs"]["u"]) == 3
+
+    threads = []
+    capture = s._snapshot
+
+    def tracked():
+        inner = capture()
+
+        def build():
+            threads.append(threading.current_thread().name)
+            return inner()
+        return build
+    s._snapshot = tracked
+    s.snapshot_every = 1
+    s.log_workout("u", make_log(11))
+    s.close()
+    assert threads == ["journal-commit"]
+    state, tail = s.journal.replay()
+    assert len(state["workout_logs"]["u"]) == 5 and tail == []
+
+
+
+def test_snapshot_keeps_chat_history_as_captured(tmp_path):
+    s = DurableStore(str(tmp_path), snapshot_every=1000)
+    for i in range(3):
+        s.append_chat("u", "user", f"m{i}")
+    build = s._snapshot()
+    # Roll the whole capped history over before the journal thread builds it
+    for i in range(CHAT_HISTORY_LIMIT * 2):
+        s.append_chat("u", "user", f"late{i}")
+    assert [m["content"] for m in build()["chat_history"]["u"]] == ["m0", "m1", "m2"]
+    assert len(s.get_chat_history("u")) == CHAT_HISTORY_LIMIT * 2
+    s.close()
+
+def test_wait_durable(tmp_path):
+    s = DurableStore(str(tmp_path), wait_durable=True)
+    s.append_chat("u", "user", "hi")
+    with open(s.journal.journal_path, "rb") as f:
+        assert b'"content":"hi"' in f.read()
+    s.close()
+
+
+def test_commit_failure_is_raised_to_waiters_and_later_appends(tmp_path):
+    journal = Journal(str(tmp_path))
+    journal.replay()
+    journal.start()
+
+    def fail(lines):
+        raise OSError(errno.ENOSPC, "No space left on device")
+    journal._write = fail
+    seq = journal.append({"op": "chat"})
+    with pytest.raises(JournalError):
+        journal.wait(seq, timeout=5)
+    with pytest.raises(JournalError):
+        journal.append({"op": "chat"})
+    journal.close()
+
+
+def test_flush_awaits_durability_without_blocking(tmp_path):
+    s = DurableStore(str(tmp_path))
+
+    async def main():
+        s.log_workout("u", make_log(1))
+        await asyncio.wait_for(s.flush(), 5)
+        with open(s.journal.journal_path, "rb") as f:
+            assert b'"op":"workout"' in f.read()
+        # Failures reach async waiters too
+        def fail(lines):
+            raise OSError(errno.EIO, "I/O error")
+        s.journal._write = fail
+        s.append_chat("u", "user", "lost")
+        with pytest.raises(JournalError):
+            await asyncio.wait_for(s.flush(), 5)
+
+    asyncio.run(main())
+    s.close()
+
+
+def test_torn_tail_is_ignored(tmp_path):
+    s = DurableStore(str(tmp_path))
+    s.append_chat("u", "user", "kept")
+    s.close()
+    with open(s.journal.journal_path, "ab") as f:
+        f.write(b'{"op":"chat","uid":"u","ro')
+    s2 = DurableStore(str(tmp_path))
+    assert s2.get_chat_history("u") == [{"role": "user", "content": "kept"}]
+    s2.append_chat("u", "user", "after")
+    s2.close()
+    s3 = DurableStore(str(tmp_path))
+    assert [m["content"] for m in s3.get_chat_history("u")] == ["kept", "after"]
+    s3.close()
+
+
+def test_chat_context_respects_token_budget():
+    s = Store()
+    s.append_chat("u", "user", "x" * 4000)
+    for i in range(6):
+        s.append_chat("u", "assistant" if i % 2 else "user", f"short message {i}")
+    budget = sum(count_tokens(f"short message {i}") for i in range(6))
+    context = s.get_chat_context("u", budget)
+    assert [m["content"] for m in context] == [f"short message {i}" for i in range(6)]
+    # The latest message is always sent, even if it alone exceeds the budget
+    s.append_chat("u", "user", "y" * 4000)
+    assert [m["content"] for m in s.get_chat_context("u", 10)] == ["y" * 4000]
+    assert s.get_chat_context("nobody") == []
+
+
+def test_batch_is_one_journal_record(tmp_path):
+    s = DurableStore(str(tmp_path))
+    entries = [(f"u{i % 3}", make_log(i)) for i in range(30)]
+    s.log_workouts(entries)
+    s.close()
+    state, tail = s.journal.replay()
+    assert len(tail) == 1
+    s2 = DurableStore(str(tmp_path))
+    assert sum(len(s2.get_workouts(f"u{i}")) for i in range(3)) == 30
+    s2.close()
+
+
+def test_sqlite_store_matches_memory_store(tmp_path):
+    now = datetime.now(timezone.utc)
+    mem, db = Store(), SQLiteStore(str(tmp_path / "store.db"))
+    logs = [make_log(5), make_log(30, soreness=8), dict(make_log(2), muscles=["chest", "neck"])]
+    for s in (mem, db):
+        for i in range(CHAT_HISTORY_LIMIT * 2 + 5):
+            s.append_chat("u", "assistant" if i % 2 else "user", f"message {i} " * (i % 7))
+        s.log_workout("u", logs[0])
+        s.log_workouts([("u", logs[1]), ("v", logs[2])])
+    assert db.get_chat_history("u") == mem.get_chat_history("u")
+    assert db.get_chat_context("u", 40) == mem.get_chat_context("u", 40)
+    assert db.get_workouts("u") == mem.get_workouts("u")
+    assert db.get_workouts("v") == mem.get_workouts("v") == [logs[2]]
+    for uid in ("u", "v", "nobody"):
+        assert db.get_data_version(uid) == mem.get_data_version(uid)
+        summary = db.get_recovery_summary(uid)
+        assert calc_recovery_from_summary(summary, now) == calc_recovery_from_summary(mem.get_recovery_summary(uid), now)
+        assert calc_recovery_decay(summary, now) == calc_recovery_decay(mem.get_recovery_summary(uid), now)
+    assert calc_recovery_from_summary(db.rebuild_recovery_summary("u"), now) == calc_recovery_from_summary(
+        mem.get_recovery_summary("u"), now)
+    db.close()
+
+
+def test_sqlite_rate_limit_is_shared(tmp_path):
+    clock = [1000.0]
+    limits = {"chat": RateLimit(2, 10)}
+    a = SQLiteStore(str(tmp_path / "store.db"), limits, clock=lambda: clock[0])
+    b = SQLiteStore(str(tmp_path / "store.db"), limits, clock=lambda: clock[0])
+    assert a.check_rate("chat", "u") == 0.0
+    assert b.check_rate("chat", "u") == 0.0
+    assert a.check_rate("chat", "u") == 5.0
+    assert b.check_rate("other", "u") == 0.0
+    clock[0] += 5
+    assert b.check_rate("chat", "u") == 0.0
+    a.close()
+    b.close()
+
+
+def test_sqlite_rate_check_fails_open_quickly_under_lock_contention(tmp_path):
+    path = str(tmp_path / "store.db")
+    s = SQLiteStore(path, {"chat": RateLimit(1, 10)}, rate_busy_timeout=0.05)
+    other = sqlite3.connect(path, isolation_level=None)
+    other.execute("BEGIN IMMEDIATE")
+    start = time.perf_counter()
+    assert s.check_rate("chat", "u") == 0.0
+    assert time.perf_counter() - start < 1.0
+    other.execute("ROLLBACK")
+    other.close()
+    assert s.check_rate("chat", "u") == 0.0
+    assert s.check_rate("chat", "u") > 0
+    s.close()
+
+
+def test_async_store_runs_sqlite_calls_off_the_loop(tmp_path):
+    threads = []
+
+    class Recording(SQLiteStore):
+        def get_data_version(self, uid):
+            threads.append(threading.current_thread().name)
+            return super().get_data_version(uid)
+
+    async def main(store):
+        await store.log_workout("u", make_log(1))
+        return await store.get_data_version("u")
+
+    db = AsyncStore(Recording(str(tmp_path / "store.db")))
+    assert asyncio.run(main(db)) == 1
+    db.close()
+    mem = AsyncStore(Store())
+    assert asyncio.run(main(mem)) == 1
+    assert threads[0].startswith("store") and len(threads) == 1
+
+
+def _log_from_worker(path, worker, count):
+    s = SQLiteStore(path)
+    for i in range(count):
+        s.log_workout("shared", make_log(i))
+        s.append_chat(f"w{worker}", "user", str(i))
+    s.close()
+
+
+def test_sqlite_store_across_processes(tmp_path):
+    path = str(tmp_path / "store.db")
+    SQLiteStore(path).close()
+    ctx = multiprocessing.get_context("spawn")
+    procs = [ctx.Process(target=_log_from_worker, args=(path, w, 25)) for w in range(3)]
+    for p in procs:
+        p.start()
+    for p in procs:
+        p.join()
+        assert p.exitcode == 0
+    s = SQLiteStore(path)
+    assert len(s.get_workouts("shared")) == 75
+    assert s.get_data_version("shared") == 75
+    assert [m["content"] for m in s.get_chat_history("w1")] == [str(i) for i in range(25)]
+    s.close()
@@ -0,0 +1,125 @@
+"""Tests for the token coalescing, sentence splitting and ordered fan-out pipeline."""
+import asyncio
+
+import pytest
+
+from streaming import coalesce, pipelined, split_sentences, sse_event
+
+
+async def deltas(parts, delay=0.0):
+    for part in parts:
+        await asyncio.sleep(delay)
+        yield part
+
+
+async def collect(gen):
+    return [item async for item in gen]
+
+
+def test_first_delta_passes_through_then_coalesces_by_size():
+    parts = ["Hi"] + ["ab"] * 10
+    chunks = asyncio.run(collect(coalesce(deltas(parts), max_bytes=8, max_delay=10)))
+    assert chunks[0] == "Hi"
+    assert "".join(chunks) == "".join(parts)
+    assert all(len(c) == 8 for c in chunks[1:-1])
+
+
+def test_flushes_on_time_window():
+    parts = ["a", "b", "c", "d"]
+    chunks = asyncio.run(collect(coalesce(deltas(parts, delay=0.03), max_bytes=1000, max_delay=0.01)))
+    # Each delta arrives after the previous window has expired
+    assert chunks == parts
+
+
+def test_heartbeat_when_upstream_is_silent():
+    chunks = asyncio.run(collect(coalesce(deltas(["a", "b"], delay=0.05), heartbeat=0.02)))
+    assert None in chunks
+    assert "".join(c for c in chunks if c) == "ab"
+
+
+def test_upstream_error_flushes_then_raises():
+    async def failing():
+        yield "partial"
+        raise RuntimeError("boom")
+
+    async def main():
+        seen = []
+        with pytest.raises(RuntimeError):
+            async for chunk in coalesce(failing()):
+                seen.append(chunk)
+        return seen
+
+    assert asyncio.run(main()) == ["partial"]
+
+
+def test_closing_early_cancels_upstream():
+    closed = asyncio.Event()
+
+    async def endless():
+        try:
+            while True:
+                await asyncio.sleep(0.001)
+                yield "x"
+        finally:
+            closed.set()
+
+    async def main():
+        gen = coalesce(endless())
+        await gen.__anext__()
+        await gen.aclose()
+        return closed.is_set()
+
+    assert asyncio.run(main())
+
+
+def test_sse_event_framing():
+    assert sse_event("a\nb", "token") == "event: token\ndata: a\ndata: b\n\n"
+
+
+def test_split_sentences_waits_for_boundaries():
+    text = "Hi! Rest 2.5 minutes between sets. Keep going, you're doing great!\nNext: squats"
+    parts = [text[i:i + 3] for i in range(0, len(text), 3)]
+    sentences = asyncio.run(collect(split_sentences(deltas(parts), min_chars=12)))
+    assert sentences == [
+        "Hi! Rest 2.5 minutes between sets.", "Keep going, you're doing great!", "Next: squats",
+    ]
+
+
+def test_pipelined_runs_ahead_but_yields_in_order():
+    started = []
+
+    async def produce(item):
+        started.append(item)
+        # Later items finish first; output must still follow input order
+        await asyncio.sleep(0.05 if item == "a" else 0.01)
+        yield item.upper()
+        yield item.upper()
+
+    async def run():
+        out = []
+        async for item, chunks in pipelined(deltas(["a", "b", "c"]), produce, parallel=2):
+            out.append((item, [c async for c in chunks]))
+            if item == "a":
+                # b was started while a was still being produced
+                assert "b" in started
+        return out
+
+    assert asyncio.run(run()) == [("a", ["A", "A"]), ("b", ["B", "B"]), ("c", ["C", "C"])]
+
+
+def test_pipelined_raises_after_earlier_items():
+    async def items():
+        yield "a"
+        raise RuntimeError("chat failed")
+
+    async def produce(item):
+        yield item
+
+    async def run():
+        seen = []
+        with pytest.raises(RuntimeError):
+            async for item, chunks in pipelined(items(), produce, parallel=2):
+                seen.append([c async for c in chunks])
+        return seen
+
+    assert asyncio.run(run()) == [["a"]]
@@ -0,0 +1,44 @@
+"""Tests for the compact columnar workout log."""
+from datetime import datetime, timezone
+
+from recovery import COMMON_MUSCLES, MuscleSummary, calc_recovery_decay, calc_recovery_from_summary
+from test_recovery import random_logs
+from workout_log import WorkoutColumns
+
+
+def test_round_trip_and_size():
+    now = datetime.now(timezone.utc)
+    logs = random_logs(200, now, seed=3)
+    columns = WorkoutColumns("u")
+    columns.extend(logs)
+    assert columns.nbytes() == 14 * len(logs)
+    assert not columns.overflow and not columns.unknown_muscles
+    for log, decoded in zip(logs, columns.to_dicts()):
+        assert decoded == dict(log, uid="u", muscles=[m for m in COMMON_MUSCLES if m in log["muscles"]])
+
+
+def test_side_dicts_keep_what_does_not_fit():
+    ts = datetime(2026, 1, 1, 12, tzinfo=timezone.utc)
+    columns = WorkoutColumns("u")
+    columns.append({"uid": "u", "muscles": ["chest", "neck", "quads"], "effort": 7, "soreness": 2,
+                    "duration_min": 100000, "ts": ts, "note": "long ride"})
+    columns.append({"uid": "u", "muscles": ["back"], "effort": 5, "soreness": 0, "duration_min": 30, "ts": None})
+    assert columns.to_dict(0) == {"uid": "u", "muscles": ["quads", "chest", "neck"], "effort": 7, "soreness": 2,
+                                  "duration_min": 100000, "ts": ts, "note": "long ride"}
+    assert columns.to_dict(1)["ts"] is None
+    assert columns.row(0)[4] == 100000
+    copy = WorkoutColumns("u")
+    for i in range(len(columns)):
+        copy.append_raw(*columns.raw(i))
+    assert copy.to_dicts() == columns.to_dicts()
+
+
+def test_recovery_on_compact_rows_matches_dicts():
+    now = datetime.now(timezone.utc)
+    logs = random_logs(500, now, seed=5)
+    columns = WorkoutColumns("u")
+    columns.extend(logs)
+    compact, full = MuscleSummary.from_rows(columns.rows()), MuscleSummary.from_logs(logs)
+    assert compact.last_trained == full.last_trained
+    assert calc_recovery_from_summary(compact, now) == calc_recovery_from_summary(full, now)
+    assert calc_recovery_decay(compact, now) == calc_recovery_decay(full, now)
@@ -0,0 +1,154 @@
+"""Compact columnar storage for one user's workout logs."""
+from array import array
+from datetime import datetime
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+from recovery import COMMON_MUSCLES, MASK_INDICES, MUSCLE_INDEX, NEVER_US, epoch_micros, from_epoch_micros
+
+# Fields held in the columns; anything else a log carries goes to the overflow dict
+FIELDS = ("uid", "muscles", "effort", "soreness", "duration_min", "ts")
+# Defaults used by the recovery code when a log omits a field
+DEFAULTS = {"effort": 5, "soreness": 0, "duration_min": 30}
+
+_SMALL = (-128, 127)       # array('b')
+_DURATION = (-32768, 32767)  # array('h')
+
+
+def _fits(value: Any, bounds: Tuple[int, int]) -> bool:
+    return type(value) is int and bounds[0] <= value <= bounds[1]
+
+
+def _apply_overflow(row: tuple, extra: Dict[str, Any]) -> tuple:
+    ts_us, mask, effort, soreness, duration = row
+    return (
+        ts_us, mask, extra.get("effort", effort), extra.get("soreness", soreness),
+        extra.get("duration_min", duration),
+    )
+
+
+class WorkoutColumns:
+    """One user's workout logs as parallel typed arrays, about 14 bytes per log.
+
+    Each log is a row of: epoch-microsecond timestamp (NEVER_US if missing), a
+    bitmask over COMMON_MUSCLES, effort, soreness and duration. Muscle names
+    outside COMMON_MUSCLES are kept in `unknown_muscles`, and field values that
+    do not fit a column (or fields beyond WorkoutLog's) in `overflow`, both keyed
+    by row index, so to_dict returns what was logged. Timestamps come back as
+    UTC datetimes and known muscles in COMMON_MUSCLES order.
+    """
+    __slots__ = ("uid", "ts_us", "muscles", "effort", "soreness", "duration", "unknown_muscles", "overflow")
+
+    def __init__(self, uid: str):
+        self.uid = uid
+        self.ts_us = array("q")
+        self.muscles = array("H")
+        self.effort = array("b")
+        self.soreness = array("b")
+        self.duration = array("h")
+        self.unknown_muscles: Dict[int, List[str]] = {}
+        self.overflow: Dict[int, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self.ts_us)
+
+    def append(self, log: dict):
+        """Add one log (a WorkoutLog-shaped dict)."""
+        index = len(self.ts_us)
+        extra = {k: v for k, v in log.items() if k not in FIELDS}
+        if log.get("uid", self.uid) != self.uid:
+            extra["uid"] = log["uid"]
+        ts = log.get("ts")
+        if isinstance(ts, datetime):
+            self.ts_us.append(epoch_micros(ts))
+        else:
+            self.ts_us.append(NEVER_US)
+            if ts is not None:
+                extra["ts"] = ts
+        mask = 0
+        for m in log.get("muscles", ()):
+            i = MUSCLE_INDEX.get(m)
+            if i is None:
+                self.unknown_muscles.setdefault(index, []).append(m)
+            else:
+                mask |= 1 << i
+        self.muscles.append(mask)
+        for name, column, bounds in (
+            ("effort", self.effort, _SMALL),
+            ("soreness", self.soreness, _SMALL),
+            ("duration_min", self.duration, _DURATION),
+        ):
+            value = log.get(name, DEFAULTS[name])
+            if _fits(value, bounds):
+                column.append(value)
+            else:
+                column.append(0)
+                extra[name] = value
+        if extra:
+            self.overflow[index] = extra
+
+    def extend(self, logs: List[dict]):
+        for log in logs:
+            self.append(log)
+
+    def row(self, index: int) -> Tuple[int, int, int, int, int]:
+        """(ts_us, mask, effort, soreness, duration_min) of one log, for MuscleSummary.add_row."""
+        row = (self.ts_us[index], self.muscles[index], self.effort[index], self.soreness[index], self.duration[index])
+        extra = self.overflow.get(index)
+        return row if extra is None else _apply_overflow(row, extra)
+
+    def rows(self) -> Iterator[Tuple[int, int, int, int, int]]:
+        """row() for every log, in order."""
+        rows = zip(self.ts_us, self.muscles, self.effort, self.soreness, self.duration)
+        if not self.overflow:
+            return rows
+        return (self.row(index) if index in self.overflow else row for index, row in enumerate(rows))
+
+    def raw(self, index: int) -> tuple:
+        """Column values plus side-dict entries (or None) of one log, for external storage."""
+        return (
+            self.ts_us[index], self.muscles[index], self.effort[index], self.soreness[index], self.duration[index],
+            self.unknown_muscles.get(index), self.overflow.get(index),
+        )
+
+    def append_raw(self, ts_us: int, mask: int, effort: int, soreness: int, duration: int,
+                   unknown_muscles: Optional[List[str]] = None, overflow: Optional[Dict[str, Any]] = None):
+        """Inverse of raw()."""
+        index = len(self.ts_us)
+        self.ts_us.append(ts_us)
+        self.muscles.append(mask)
+        self.effort.append(effort)
+        self.soreness.append(soreness)
+        self.duration.append(duration)
+        if unknown_muscles:
+            self.unknown_muscles[index] = unknown_muscles
+        if overflow:
+            self.overflow[index] = overflow
+
+    def to_dict(self, index: int) -> dict:
+        """The log at `index` as a WorkoutLog-shaped dict."""
+        ts_us = self.ts_us[index]
+        log = {
+            "uid": self.uid,
+            "muscles": [COMMON_MUSCLES[i] for i in MASK_INDICES[self.muscles[index]]]
+            + self.unknown_muscles.get(index, []),
+            "effort": self.effort[index],
+            "soreness": self.soreness[index],
+            "duration_min": self.duration[index],
+            "ts": None if ts_us == NEVER_US else from_epoch_micros(ts_us),
+        }
+        extra = self.overflow.get(index)
+        if extra:
+            log.update(extra)
+        return log
+
+    def to_dicts(self, count: Optional[int] = None) -> List[dict]:
+        """to_dict() of the first `count` logs (all by default).
+
+        Rows are never changed once appended, so another thread may read a prefix
+        while logs are still being added.
+        """
+        return [self.to_dict(i) for i in range(len(self.ts_us) if count is None else count)]
+
+    def nbytes(self) -> int:
+        """Bytes used by the column buffers (side dicts excluded)."""
+        return sum(a.itemsize * len(a) for a in (self.ts_us, self.muscles, self.effort, self.soreness, self.duration))
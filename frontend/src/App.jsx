@@ -146,7 +146,7 @@ export default function App() {
         // Text-to-speech
         const ttsRes = await fetch('http://localhost:8000/text-to-speech', {
           method: 'POST', headers: { 'Content-Type': 'application/json' },
-          body: JSON.stringify({ text: response })
+          body: JSON.stringify({ text: response, format: 'audio' })
         });
         const aiBlob = await ttsRes.blob();
         const aiUrl = URL.createObjectURL(aiBlob);
@@ -7,17 +7,23 @@ const api = {
         });
         if (!res.body) throw new Error("No response body");
         const reader = res.body.getReader();
+        // One decoder for the whole body; stream: true keeps multi-byte characters split across chunks intact
+        const decoder = new TextDecoder();
         let done = false;
         while (!done) {
             const { value, done: doneReading } = await reader.read();
             done = doneReading;
             if (value) {
-                yield new TextDecoder().decode(value);
+                yield decoder.decode(value, { stream: true });
             }
         }
+        const tail = decoder.decode();
+        if (tail) yield tail;
     },
     async getRecovery(uid) {
-        const res = await fetch(`/recovery?uid=${uid}`);
+        // Always revalidate: the ETag turns an unchanged reply into a cheap 304, and a
+        // fresh log is never hidden behind max-age
+        const res = await fetch(`/recovery?uid=${uid}`, { cache: "no-cache" });
         if (!res.ok) throw new Error("Failed to fetch recovery");
         return res.json();
     },